@@ -5,5 +5,7 @@ __author__ = 'project-group-3'
 
 
 from .book import AddressBook, Record
+from .columnar_book import ColumnarAddressBook
+from .query import QueryTerm
 
-__all__ = ['AddressBook', 'Record']
+__all__ = ['AddressBook', 'ColumnarAddressBook', 'QueryTerm', 'Record']
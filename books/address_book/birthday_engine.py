@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized birthday engine for the large address books, requires numpy
+"""
+
+import datetime
+from collections.abc import Iterable
+
+try:
+    import numpy
+except ImportError:  # numpy is an optional dependency
+    numpy = None
+
+from .record import Record
+
+
+class BirthdayEngine:
+    """
+    Birthdays of the contact records kept as numpy arrays of the months and days, so the upcoming birthdays
+    of all contacts are computed by batched array operations. The birthdays and congratulation dates
+    of every year are computed once and reused by the following queries, e.g. the windows of every day of a quarter
+    """
+
+    epoch: datetime.date = datetime.date(1970, 1, 1)
+
+    def __init__(self, contacts: Iterable[Record]):
+        """ Initialize the engine with the birthdays of the contact records
+
+        :param contacts: contact records (iterable of Records, mandatory)
+        """
+        records: list[Record] = sorted(
+            (contact for contact in contacts if contact.birthday is not None),
+            key=lambda contact: contact.name,
+        )
+        dates: list[datetime.date] = [contact.birthday.date_of_birth() for contact in records]
+        self.__contacts = numpy.empty(len(records), dtype=object)
+        self.__contacts[:] = records
+        self.__months = numpy.array([i.month - 1 for i in dates], dtype=numpy.int64)
+        self.__days = numpy.array([i.day - 1 for i in dates], dtype=numpy.int64)
+        self.__years: dict[int, tuple[numpy.ndarray, numpy.ndarray]] = {}
+
+    def __year(self, year: int) -> tuple['numpy.ndarray', 'numpy.ndarray']:
+        """ Private method for the birthdays and the congratulation dates in the year as the days since the epoch.
+        February 29 birthdays fall on March 1 in the non-leap years, since the day offset overflows February.
+        The weekend congratulation dates are moved to the following Monday
+
+        :param year: the year (int, mandatory)
+        :return: the birthdays and the congratulation dates (tuple of numpy arrays)
+        """
+        if (cached := self.__years.get(year)) is None:
+            months = numpy.datetime64(f"{year:04d}-01", "M") + self.__months
+            birthdays = (months.astype("datetime64[D]") + self.__days).astype(numpy.int64)
+            # 1970-01-01 is Thursday, so Monday is 0
+            weekdays = (birthdays + 3) % 7
+            congratulations = birthdays + numpy.where(weekdays >= 5, 7 - weekdays, 0)
+            cached = self.__years[year] = (birthdays, congratulations)
+        return cached
+
+    def upcoming_birthdays_by_days(
+            self,
+            today: datetime.date,
+            upcoming_birthdays_period: int,
+    ) -> dict[datetime.date, list[Record]]:
+        """ Return the contacts whose birthday is within the next period, including today, grouped by
+        the congratulation date, the same way as AddressBook.upcoming_birthdays_by_days does
+
+        :param today: Today's date (date, mandatory)
+        :param upcoming_birthdays_period: the birthday congratulations days range (int, mandatory)
+        :return: contacts whose birthday is within the next period, grouped by date (dictionary)
+        """
+        today_days = (today - self.epoch).days
+        birthdays, congratulations = self.__year(today.year)
+        next_birthdays, next_congratulations = self.__year(today.year + 1)
+        this_year = birthdays >= today_days
+        hits = numpy.flatnonzero(numpy.where(this_year, birthdays, next_birthdays) - today_days <= upcoming_birthdays_period)
+        dates = numpy.where(this_year[hits], congratulations[hits], next_congratulations[hits])
+        order = numpy.argsort(dates, kind="stable")
+        contacts, dates = self.__contacts[hits[order]], dates[order]
+        starts = numpy.flatnonzero(numpy.diff(dates, prepend=dates[:1] - 1)).tolist()
+        return {
+            self.epoch + datetime.timedelta(days=int(dates[start])): contacts[start:end].tolist()
+            for start, end in zip(starts, starts[1:] + [len(dates)])
+        }
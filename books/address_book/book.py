@@ -5,16 +5,22 @@ Address Book class implementation
 """
 
 import datetime
+import heapq
 from typing import Optional
 from collections import UserDict, namedtuple, defaultdict
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor
 
 
+from books.commons import Observable, FieldChange, TrigramIndex, BucketIndex, SortedKeys, search_key, BKTree
 from .error import ContactNotFound, ContactAlreadyExist
-from .record import Record
+from .record import Record, Phone, Email
+from .birthday_engine import BirthdayEngine, numpy
+from .query import QueryTerm
+from .dedupe import DuplicateCandidate, find_duplicates
 
 
-class AddressBook(UserDict):
+class AddressBook(UserDict, Observable):
     def __init__(self, *args, upcoming_birthdays_period: int = 7):
         """ Initialize an Address Book with the specified Contacts and the birthday congratulations days range, if given
 
@@ -23,22 +29,407 @@ class AddressBook(UserDict):
         """
         super().__init__()
         self.__upcoming_birthdays_period = upcoming_birthdays_period or 7
+        self.__dirty: bool = False
+        self.__index: Optional[TrigramIndex] = None
+        self.__names: Optional[defaultdict[str, set[str]]] = None
+        self.__sorted_names: Optional[SortedKeys] = None
+        self.__fuzzy: Optional[tuple[BKTree, BucketIndex]] = None
+        self.__birthdays: Optional[BucketIndex] = None
+        self.__birthday_engine: Optional[BirthdayEngine] = None
+        self.__sorted: Optional[SortedKeys] = None
+        self.__phones: Optional[BucketIndex] = None
+        self.__emails: Optional[tuple[BucketIndex, BucketIndex, BucketIndex]] = None
         for contact in args:
             if str(contact.name) not in self:
                 self.add_record(contact)
 
     def __getstate__(self):
-        return self.__dict__.copy()
+        state = self.__dict__.copy()
+        state.pop('_observers', None)
+        state.pop('_AddressBook__dirty', None)
+        state.pop('_AddressBook__index', None)
+        state.pop('_AddressBook__names', None)
+        state.pop('_AddressBook__sorted_names', None)
+        state.pop('_AddressBook__fuzzy', None)
+        state.pop('_AddressBook__birthdays', None)
+        state.pop('_AddressBook__birthday_engine', None)
+        state.pop('_AddressBook__sorted', None)
+        state.pop('_AddressBook__phones', None)
+        state.pop('_AddressBook__emails', None)
+        return state
 
     def __setstate__(self, value):
         self.__dict__ = value
+        self.__dirty = False
+        self._forget_indexes()
+        for key, contact in self.data.items():
+            self._track(key, contact)
 
     def __iter__(self):
         """ Return an iterable object with the key (name) lexicographically sorted
 
         :return: lexicographically sorted keys (names) (iterable object)
         """
-        return iter(sorted(self.data))
+        return iter(list(self.__sorted_keys))
+
+    @property
+    def __sorted_keys(self) -> SortedKeys:
+        """ Private property with the lexicographically sorted keys (names), sorted on the first use
+
+        :return: the sorted keys (SortedKeys)
+        """
+        if self.__sorted is None:
+            self.__sorted = SortedKeys(self.data)
+        return self.__sorted
+
+    def range(self, start: Optional[str] = None, stop: Optional[str] = None) -> list[Record]:
+        """ Return the contact records with the names from the start (inclusive) to the stop (exclusive)
+        in the lexicographical order, for the alphabetical browsing
+
+        :param start: the first name, from the beginning by default (string, optional)
+        :param stop: the name to stop at, to the end by default (string, optional)
+        :return: the contact records (list of Records)
+        """
+        return [self.data[key] for key in self.__sorted_keys.irange(start, stop)]
+
+    def prefix(self, prefix: str) -> list[Record]:
+        """ Return the contact records with the names starting with the prefix in the lexicographical order
+
+        :param prefix: the name prefix (string, mandatory)
+        :return: the contact records (list of Records)
+        """
+        return [self.data[key] for key in self.__sorted_keys.prefix(prefix)]
+
+    @classmethod
+    def restore(cls, records: Iterable[tuple[str, Record]], upcoming_birthdays_period: int = 7) -> 'AddressBook':
+        """ Create the Address Book with the contact records loaded from the storage, skipping the checks
+
+        :param records: the contact records with their keys (iterable of tuple string, Record, mandatory)
+        :param upcoming_birthdays_period: the default birthday congratulations days range (int)
+        :return: the address book (AddressBook)
+        """
+        book = cls(upcoming_birthdays_period=upcoming_birthdays_period)
+        book._replace(records)
+        return book
+
+    def _replace(self, records: Iterable[tuple[str, Record]]) -> None:
+        """ Replace all contact records with the records loaded from the storage, skipping the checks
+
+        :param records: the contact records with their keys (iterable of tuple string, Record, mandatory)
+        """
+        self.data = {}
+        self._forget_indexes()
+        for key, contact in records:
+            self.data[key] = contact
+            self._track(key, contact)
+
+    def _restore_search_index(self, index: TrigramIndex) -> None:
+        """ Set the search index loaded from the storage together with the contact records, so the first search
+        does not build it. The index has to cover exactly the records of the book, it follows their changes
+
+        :param index: the search index of the contact records (TrigramIndex, mandatory)
+        """
+        self.__index = index
+
+    def _restore_fuzzy_index(self, tree: BKTree, words: BucketIndex) -> None:
+        """ Set the fuzzy search indexes loaded from the storage together with the contact records, so the first
+        fuzzy search does not build them. The indexes have to cover exactly the records of the book,
+        they follow their changes
+
+        :param tree: the BK-tree of the normalized contact name words (BKTree, mandatory)
+        :param words: the contact record keys by the name words (BucketIndex, mandatory)
+        """
+        self.__fuzzy = tree, words
+
+    def _fuzzy_tree(self) -> BKTree:
+        """ Return the BK-tree of the normalized contact name words for the storage, which keeps its shape,
+        so the tree is not rebuilt on every loading (see _restore_fuzzy_index)
+
+        :return: the name words tree (BKTree)
+        """
+        return self.__fuzzy_indexes[0]
+
+    def _forget_indexes(self) -> None:
+        """ Drop the search indexes, they are rebuilt on the next search. The storage backends call it
+        when they change the contact records bypassing the book methods
+        """
+        self.__index = None
+        self.__names = None
+        self.__sorted_names = None
+        self.__fuzzy = None
+        self.__birthdays = None
+        self.__birthday_engine = None
+        self.__sorted = None
+        self.__phones = None
+        self.__emails = None
+
+    @property
+    def upcoming_birthdays_period(self) -> int:
+        return self.__upcoming_birthdays_period
+
+    @property
+    def dirty(self) -> bool:
+        """ Return whether the book has been changed since it was loaded or saved
+
+        :return: the book changed flag (boolean)
+        """
+        return self.__dirty
+
+    def mark_clean(self) -> None:
+        """ Mark the book as saved, i.e. without unsaved changes
+        """
+        self.__dirty = False
+
+    def _notify(self, event: str, *details) -> None:
+        """ Notify the subscribed observers about the change and mark the book as changed
+
+        :param event: the change event name (string, mandatory)
+        :param details: the change event details (any types, optional)
+        """
+        super()._notify(event, *details)
+        self.__dirty = True
+        self.__birthday_engine = None
+
+    def _track(self, key: str, contact: Record) -> None:
+        """ Subscribe the book to the changes of the contact record stored under the key,
+        the storage backends call it for the records they load on demand
+
+        :param key: the contact record key (string, mandatory)
+        :param contact: contact record (Record, mandatory)
+        """
+        contact.subscribe(self.__record_changed, key, changes=True)
+
+    def __record_changed(self, key: str, event: str, *args, change: Optional[FieldChange] = None) -> None:
+        """ Private observer that forwards the contact record changes to the book observers and applies
+        the field-level deltas to the built indexes. The renamed record is moved under the new name,
+        unless the name is already taken, then the contact already exists exception is raised
+
+        :param key: the contact record key (string, mandatory)
+        :param event: the contact record change event (string, mandatory)
+        :param args: the contact record change details (any types, optional)
+        :param change: the field-level delta of the change (FieldChange, optional)
+        """
+        renamed: bool = change is not None and change.field == 'name' and change.new != key
+        if renamed and change.new in self.data:
+            raise ContactAlreadyExist()
+        self._notify('record', key, event, *args)
+        if change is None:
+            return
+        contact: Record = self.data[key]
+        if renamed:
+            self.__rekey(key, contact, change.old)
+            return
+        if self.__index is not None:
+            if change.old is not None:
+                self.__index.discard(key, [change.old], keep=self.__indexed_values(contact))
+            if change.new is not None:
+                self.__index.add(key, [change.new])
+        if self.__birthdays is not None and change.field == 'birthday':
+            self.__birthdays.put(key, self.__birthday_buckets(contact))
+        if self.__phones is not None and change.field == 'phones':
+            self.__phones.put(key, contact.phones)
+        if self.__emails is not None and change.field == 'emails':
+            self.__index_emails(key, contact)
+
+    def __rekey(self, key: str, contact: Record, old_name: str) -> None:
+        """ Private method for moving the renamed contact record under its new name
+
+        :param key: the contact record key (string, mandatory)
+        :param contact: the renamed contact record (Record, mandatory)
+        :param old_name: the name before the change (string, mandatory)
+        """
+        del self.data[key]
+        contact.unsubscribe(self.__record_changed)
+        self.__indexes_deleted(key, contact, [old_name, *self.__indexed_values(contact)[1:]])
+        self.data[contact.name] = contact
+        self._track(contact.name, contact)
+        self.__indexes_added([contact])
+
+    def __indexes_added(self, contacts: list[Record]) -> None:
+        """ Private method for adding the contact records, already stored in the book, to the built indexes
+
+        :param contacts: added contact records (list of Records, mandatory)
+        """
+        for contact in contacts:
+            key = str(contact.name)
+            if self.__index is not None:
+                self.__index.add(key, self.__indexed_values(contact))
+            if self.__names is not None:
+                self.__names[normalized := self._normalize_name(key)].add(key)
+                if self.__sorted_names is not None:
+                    self.__sorted_names.add(normalized)
+            if self.__fuzzy is not None:
+                self.__index_name_words(key)
+            if self.__birthdays is not None:
+                self.__birthdays.put(key, self.__birthday_buckets(contact))
+            if self.__phones is not None:
+                self.__phones.put(key, contact.phones)
+            if self.__emails is not None:
+                self.__index_emails(key, contact)
+        if self.__sorted is not None:
+            self.__sorted.update(str(contact.name) for contact in contacts)
+
+    def __indexes_deleted(self, key: str, contact: Record, values: Optional[list[str]] = None) -> None:
+        """ Private method for removing the contact record, already removed from the book, from the built indexes
+
+        :param key: the contact record key (string, mandatory)
+        :param contact: deleted contact record (Record, mandatory)
+        :param values: the indexed values, if they have been changed (list of strings, optional)
+        """
+        if self.__index is not None:
+            self.__index.discard(key, values or self.__indexed_values(contact))
+        if self.__names is not None and (keys := self.__names.get(normalized := self._normalize_name(key))):
+            keys.discard(key)
+            if not keys:
+                del self.__names[normalized]
+                if self.__sorted_names is not None:
+                    self.__sorted_names.discard(normalized)
+        if self.__fuzzy is not None:
+            tree, words = self.__fuzzy
+            words.discard(key)
+            for word in self._normalize_name(key).split():
+                if not words.keys(word):
+                    tree.discard(word)
+        if self.__birthdays is not None:
+            self.__birthdays.discard(key)
+        if self.__phones is not None:
+            self.__phones.discard(key)
+        if self.__emails is not None:
+            for index in self.__emails:
+                index.discard(key)
+        if self.__sorted is not None:
+            self.__sorted.discard(key)
+
+    @staticmethod
+    def __indexed_values(contact: Record) -> list[str]:
+        """ Private method for getting the contact record values covered by the search index
+
+        :param contact: contact record (Record, mandatory)
+        :return: the name, address, phone numbers and emails (list of strings)
+        """
+        return [contact.name, contact.address, *contact.phones, *contact.emails]
+
+    @property
+    def __search_index(self) -> TrigramIndex:
+        """ Private property with the search index of the contact records, built on the first search,
+        unless it has been loaded by the storage (see _restore_search_index)
+
+        :return: the search index (TrigramIndex)
+        """
+        if self.__index is None:
+            self.__index = TrigramIndex()
+            for key, contact in self.data.items():
+                self.__index.add(key, self.__indexed_values(contact))
+        return self.__index
+
+    @staticmethod
+    def _normalize_name(name: str) -> str:
+        """ Return the contact name in the form used for the case-insensitive lookup:
+        Unicode NFKC normalized, case-folded and with the whitespace collapsed
+
+        :param name: contact name (string, mandatory)
+        :return: normalized contact name (string)
+        """
+        return " ".join(search_key(name).split())
+
+    @property
+    def __name_keys(self) -> defaultdict[str, set[str]]:
+        """ Private property with the index of the normalized contact names to the contact record keys,
+        built on the first case-insensitive lookup from the keys only
+
+        :return: the normalized names index (dictionary)
+        """
+        if self.__names is None:
+            self.__names = defaultdict(set)
+            for key in self.data:
+                self.__names[self._normalize_name(key)].add(key)
+        return self.__names
+
+    def _keys_by_normalized_name(self, normalized: str) -> set[str]:
+        """ Return the keys of the contact records with the normalized name (see _normalize_name), taken from
+        the normalized names index, the storage backends can look them up their own way
+
+        :param normalized: the normalized contact name (string, mandatory)
+        :return: the contact record keys (set of strings)
+        """
+        return self.__name_keys.get(normalized, set())
+
+    def _keys_by_name_prefix(self, prefix: str, limit: int) -> list[str]:
+        """ Return the keys of the contact records with the normalized names starting with the normalized prefix,
+        but not equal to it, in the order of the normalized names, taken from the sorted normalized names,
+        the storage backends can look them up their own way
+
+        :param prefix: the normalized name prefix (string, mandatory)
+        :param limit: the maximum number of the returned keys (int, mandatory)
+        :return: the contact record keys (list of strings)
+        """
+        keys: list[str] = []
+        for normalized in self.__name_order.prefix(prefix):
+            if len(keys) >= limit:
+                break
+            if normalized != prefix:
+                keys.extend(sorted(self.__name_keys[normalized]))
+        return keys[:limit]
+
+    def __index_name_words(self, key: str) -> None:
+        """ Private method for putting the words of the contact name into the fuzzy search indexes
+
+        :param key: the contact record key (string, mandatory)
+        """
+        tree, words = self.__fuzzy
+        words.put(key, name_words := self._normalize_name(key).split())
+        for word in name_words:
+            tree.add(word)
+
+    @property
+    def __fuzzy_indexes(self) -> tuple[BKTree, BucketIndex]:
+        """ Private property with the BK-tree of the normalized contact name words and the index of the contact
+        record keys by the words, built on the first fuzzy search from the keys only, unless they have been loaded
+        by the storage (see _restore_fuzzy_index)
+
+        :return: the name words tree and the keys by the words index (tuple of BKTree, BucketIndex)
+        """
+        if self.__fuzzy is None:
+            self.__fuzzy = BKTree(), BucketIndex()
+            for key in self.data:
+                self.__index_name_words(key)
+        return self.__fuzzy
+
+    @property
+    def __name_order(self) -> SortedKeys:
+        """ Private property with the sorted normalized contact names, sorted on the first ranked search
+
+        :return: the sorted normalized names (SortedKeys)
+        """
+        if self.__sorted_names is None:
+            self.__sorted_names = SortedKeys(self.__name_keys)
+        return self.__sorted_names
+
+    @staticmethod
+    def __birthday_buckets(contact: Record) -> tuple[int, ...]:
+        """ Private method for getting the birthday index bucket of the contact record:
+        the birthday month * 100 + day number, as returned by _birthday_month_days
+
+        :param contact: contact record (Record, mandatory)
+        :return: the birthday bucket, if the birthday is set (tuple of int)
+        """
+        if contact.birthday is None:
+            return ()
+        date_of_birth: datetime.date = contact.birthday.date_of_birth()
+        return (date_of_birth.month * 100 + date_of_birth.day,)
+
+    @property
+    def __birthday_index(self) -> BucketIndex:
+        """ Private property with the index of the contact record keys by the birthday day of the year,
+        built on the first birthdays lookup
+
+        :return: the birthday index (BucketIndex)
+        """
+        if self.__birthdays is None:
+            self.__birthdays = BucketIndex()
+            for key, contact in self.data.items():
+                self.__birthdays.put(key, self.__birthday_buckets(contact))
+        return self.__birthdays
 
     def __congratulation_date(
             self,
@@ -70,17 +461,190 @@ class AddressBook(UserDict):
         except Exception as e:
             raise Exception("An unexpected error occurred: {error}.".format(error=repr(e)))
 
-    def find(self, name: str) -> Record:
-        """ Search and return the contact record, or raise the contact not found exception
+    @staticmethod
+    def _birthday_month_days(today: datetime.date, upcoming_birthdays_period: int) -> set[int]:
+        """ Return the birthday dates within the period as month * 100 + day numbers,
+        the storage backends use them for selecting the birthday candidates
+
+        :param today: Today's date (date, mandatory)
+        :param upcoming_birthdays_period: the birthday congratulations days range (int, mandatory)
+        :return: the month and day numbers (set of int)
+        """
+        month_days: set[int] = set()
+        for days in range(upcoming_birthdays_period + 1):
+            day = today + datetime.timedelta(days=days)
+            month_days.add(day.month * 100 + day.day)
+            if (day.month, day.day) == (3, 1) and (day - datetime.timedelta(days=1)).day != 29:
+                # February 29 birthdays are celebrated on March 1 in the non-leap years
+                month_days.add(229)
+        return month_days
+
+    def _birthday_candidates(self, today: datetime.date, upcoming_birthdays_period: int) -> Iterator[Record]:
+        """ Return the contact records that may have the birthday within the period, taken from the birthday
+        index buckets of the period days, the storage backends can narrow the candidates down their own way.
+        The exact check is done by the caller
+
+        :param today: Today's date (date, mandatory)
+        :param upcoming_birthdays_period: the birthday congratulations days range (int, mandatory)
+        :return: candidate contact records (Iterator of Records)
+        """
+        index: BucketIndex = self.__birthday_index
+        return iter([
+            self.data[key]
+            for month_day in self._birthday_month_days(today, upcoming_birthdays_period)
+            for key in sorted(index.keys(month_day))
+        ])
+
+    def find(self, name: str, ignore_case: bool = True) -> Record:
+        """ Search and return the contact record, or raise the contact not found exception.
+        If there is no contact with exactly this name, the contact whose name differs only in case,
+        Unicode normalization or whitespace is returned, unless there are several of them
 
         :param name: contact name (string, mandatory)
+        :param ignore_case: fall back to the case-insensitive lookup (boolean, optional)
         :return: contact record, if found (Record)
         """
-        contacts: list[Record] = self.search_by_name(name)
-        if (contact := next(filter(lambda i: i.name == name, contacts), None)) is not None:
-            return contact
+        try:
+            return self.data[name]
+        except KeyError:
+            pass
+        if ignore_case and len(keys := self._keys_by_normalized_name(self._normalize_name(name))) == 1:
+            return self.data[next(iter(keys))]
         raise ContactNotFound()
 
+    def _records_by_phones(self, phones: Iterable[str]) -> dict[str, list[Record]]:
+        """ Return the contact records having the sanitized phone numbers, taken from the phone numbers index
+        built on the first lookup, the storage backends can look the numbers up their own way
+
+        :param phones: sanitized phone numbers (iterable of strings, mandatory)
+        :return: the contact records sorted by the name, by the phone numbers found (dictionary)
+        """
+        if self.__phones is None:
+            self.__phones = BucketIndex()
+            for key, contact in self.data.items():
+                self.__phones.put(key, contact.phones)
+        return {
+            phone: [self.data[key] for key in sorted(keys)]
+            for phone in phones if (keys := self.__phones.keys(phone))
+        }
+
+    def find_by_phone(self, phone: str) -> list[Record]:
+        """ Return the contact records having the phone number, e.g. for the caller identification.
+        The number is sanitized the same way as the contact phone numbers, or the phone value exception is raised
+
+        :param phone: phone number (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        phone = Phone.prepare(phone)
+        return self._records_by_phones([phone]).get(phone, [])
+
+    def find_by_phones(self, phones: Iterable[str], executor: Optional[Executor] = None) -> dict[str, list[Record]]:
+        """ Return the contact records having the phone numbers, resolving many numbers in one batch.
+        The numbers are sanitized in parallel if the executor is given, the invalid ones have no records
+
+        :param phones: phone numbers (iterable of strings, mandatory)
+        :param executor: the executor for the parallel sanitization (Executor, optional)
+        :return: the contact records sorted by the name, by the given phone numbers (dictionary)
+        """
+        phones = list(phones)
+        prepared: list[Optional[str]] = Phone.prepare_many(phones, executor)
+        found = self._records_by_phones({i for i in prepared if i is not None})
+        return {phone: found.get(number, []) if number is not None else [] for phone, number in zip(phones, prepared)}
+
+    def __index_emails(self, key: str, contact: Record) -> None:
+        """ Private method for putting the contact record into the emails, email domains and local parts indexes
+
+        :param key: the contact record key (string, mandatory)
+        :param contact: contact record (Record, mandatory)
+        """
+        emails, domains, local_parts = self.__emails
+        folded: list[str] = [email.lower() for email in contact.emails]
+        emails.put(key, folded)
+        domains.put(key, [email.rpartition('@')[2] for email in folded])
+        local_parts.put(key, [email.rpartition('@')[0] for email in folded])
+
+    @property
+    def __email_indexes(self) -> tuple[BucketIndex, BucketIndex, BucketIndex]:
+        """ Private property with the indexes of the contact record keys by the case-folded emails,
+        by the email domains and by the email local parts, built on the first lookup
+
+        :return: the emails, the email domains and the local parts indexes (tuple of BucketIndex)
+        """
+        if self.__emails is None:
+            self.__emails = BucketIndex(), BucketIndex(), BucketIndex()
+            for key, contact in self.data.items():
+                self.__index_emails(key, contact)
+        return self.__emails
+
+    def _records_by_email(self, email: str) -> list[Record]:
+        """ Return the contact records having the case-folded email, the storage backends
+        can look it up their own way
+
+        :param email: the sanitized case-folded email (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return [self.data[key] for key in sorted(self.__email_indexes[0].keys(email))]
+
+    def _records_by_domain(self, domain: str) -> list[Record]:
+        """ Return the contact records having the emails at the case-folded domain, the storage backends
+        can look it up their own way
+
+        :param domain: the case-folded domain (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return [self.data[key] for key in sorted(self.__email_indexes[1].keys(domain))]
+
+    def _records_by_local_part(self, local_part: str) -> list[Record]:
+        """ Return the contact records having the emails with the case-folded local part, the storage backends
+        can look it up their own way
+
+        :param local_part: the case-folded local part (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return [self.data[key] for key in sorted(self.__email_indexes[2].keys(local_part))]
+
+    def _email_domains(self) -> dict[str, int]:
+        """ Return the numbers of the contact records by the case-folded email domains, the storage backends
+        can count them their own way
+
+        :return: the numbers of the contact records by the domains (dictionary)
+        """
+        return self.__email_indexes[1].counts()
+
+    def find_by_email(self, email: str) -> list[Record]:
+        """ Return the contact records having the email, ignoring the case.
+        The email is sanitized the same way as the contact emails, or the email value exception is raised
+
+        :param email: email (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return self._records_by_email(Email.prepare(email).lower())
+
+    def contacts_by_domain(self, domain: str) -> list[Record]:
+        """ Return the contact records having the emails at the domain, ignoring the case,
+        e.g. all contacts of a company
+
+        :param domain: the email domain, with or without the leading @ (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return self._records_by_domain(domain.strip().removeprefix('@').lower())
+
+    def contacts_by_local_part(self, local_part: str) -> list[Record]:
+        """ Return the contact records having the emails with the local part (before the @), ignoring the case,
+        e.g. all info@ or support@ mailboxes
+
+        :param local_part: the email local part, with or without the trailing @ (string, mandatory)
+        :return: the contact records sorted by the name (list of Records)
+        """
+        return self._records_by_local_part(local_part.strip().removesuffix('@').lower())
+
+    def email_domains(self) -> dict[str, int]:
+        """ Return the email domains with the numbers of their contacts, the most common first
+
+        :return: the numbers of the contact records by the case-folded domains (dictionary)
+        """
+        return dict(sorted(self._email_domains().items(), key=lambda i: (-i[1], i[0])))
+
     def add_record(self, contact: Record) -> None:
         """ Add the contact record, or raise the contact already exists exception
 
@@ -90,6 +654,31 @@ class AddressBook(UserDict):
             raise ContactAlreadyExist()
         
         self.data[str(contact.name)] = contact
+        self._track(str(contact.name), contact)
+        self.__indexes_added([contact])
+        self._notify('add_record', contact)
+
+    def add_records(self, contacts: Iterable[Record]) -> list[Record]:
+        """ Add the contact records in one batch, the changes observers are notified once.
+        The records whose names already exist in the book (or earlier in the batch) are skipped
+
+        :param contacts: contact records (iterable of Records, mandatory)
+        :return: skipped contact records (list of Records)
+        """
+        added: list[Record] = []
+        skipped: list[Record] = []
+        for contact in contacts:
+            key = str(contact.name)
+            if key in self:
+                skipped.append(contact)
+                continue
+            self.data[key] = contact
+            self._track(key, contact)
+            added.append(contact)
+        self.__indexes_added(added)
+        if added:
+            self._notify('add_records', added)
+        return skipped
 
     def delete_record(self, name: str) -> None:
         """ Remove the contact record, or raise the contact not found exception
@@ -99,25 +688,55 @@ class AddressBook(UserDict):
         if name not in self:
             raise ContactNotFound()
 
-        self.data.pop(name, None)
+        contact: Record = self.data.pop(name)
+        contact.unsubscribe(self.__record_changed)
+        self.__indexes_deleted(name, contact)
+        self._notify('delete_record', name)
+
+    def merge_records(self, name: str, duplicate: str) -> Record:
+        """ Merge the duplicate contact record into the contact record and delete it (see Record.merge),
+        or raise the contact not found exception
+
+        :param name: the kept contact name (string, mandatory)
+        :param duplicate: the duplicate contact name (string, mandatory)
+        :return: the merged contact record (Record)
+        """
+        contact, duplicate_contact = self.find(name), self.find(duplicate)
+        if contact is not duplicate_contact:
+            contact.merge(duplicate_contact)
+            self.delete_record(duplicate_contact.name)
+        return contact
+
+    def find_duplicates(self, min_score: float = 0.5, executor: Optional[Executor] = None) -> list[DuplicateCandidate]:
+        """ Find the contact records that may be the same person, compared within the blocks of the records
+        sharing a phone number, an email or a similar name (see dedupe.find_duplicates)
+
+        :param min_score: the minimum score of the returned candidates, from 0 to 1 (float, optional)
+        :param executor: the executor for the parallel scoring (Executor, optional)
+        :return: the duplicate candidates, the highest score first (list of DuplicateCandidates)
+        """
+        return find_duplicates(self.data, min_score, executor)
 
     def upcoming_birthdays(
             self,
             upcoming_birthdays_period: Optional[int] = None,
+            today: Optional[datetime.date] = None,
     ) -> Iterator[tuple[Record, datetime.date]]:
         """Return all contacts whose birthday is within the next period, including today,
         along with the congratulation date. If the birthday falls on a weekend, the congratulation date
         is moved to the following Monday.
 
         :param upcoming_birthdays_period: the birthday congratulations days range (int, optional)
+        :param today: Today's date, if not specified, is calculated as the current date (date, optional)
         :return: The next contacts whose birthday is within the next period, including today,
         along with the congratulation date (Iterator of tuple)
         """
 
         UpcomingBirthday = namedtuple('UpcomingBirthday', ['contact', 'congratulation_date'])
 
-        today: datetime.date = datetime.datetime.today().date()
-        for contact in self.data.values():
+        if today is None:
+            today = datetime.datetime.today().date()
+        for contact in self._birthday_candidates(today, upcoming_birthdays_period or self.__upcoming_birthdays_period):
             if (
                     congratulation_date := self.__congratulation_date(
                         contact,
@@ -130,31 +749,70 @@ class AddressBook(UserDict):
     def upcoming_birthdays_by_days(
             self,
             upcoming_birthdays_period: Optional[int] = None,
+            today: Optional[datetime.date] = None,
+            vectorized: bool = False,
     ) -> dict[datetime.date, list[Record]]:
         """Return all contacts whose birthday is within the next period, including today, grouped by date,
         along with the congratulation date. If the birthday falls on a weekend, the congratulation date
-        is moved to the following Monday.
+        is moved to the following Monday. The contacts of each date are sorted by the name.
+        The vectorized engine computes the dates of all contacts by numpy array operations, which pays off
+        for the large books queried for many dates, e.g. by the reports. Without numpy installed
+        the dates are computed per contact record
 
         :param upcoming_birthdays_period: the birthday congratulations days range (int, optional)
+        :param today: Today's date, if not specified, is calculated as the current date (date, optional)
+        :param vectorized: use the vectorized birthday engine (boolean, optional)
         :return: contacts whose birthday is within the next period, grouped by date (dictionary)
         """
 
+        if vectorized and numpy is not None:
+            if self.__birthday_engine is None:
+                self.__birthday_engine = BirthdayEngine(self.values())
+            return self.__birthday_engine.upcoming_birthdays_by_days(
+                today or datetime.datetime.today().date(),
+                upcoming_birthdays_period or self.__upcoming_birthdays_period,
+            )
+
         upcoming_birthdays: dict[datetime.date, list[Record]] = defaultdict(list)
-        for record, congratulation_date in self.upcoming_birthdays(upcoming_birthdays_period=upcoming_birthdays_period):
+        for record, congratulation_date in self.upcoming_birthdays(
+                upcoming_birthdays_period=upcoming_birthdays_period,
+                today=today,
+        ):
             upcoming_birthdays[congratulation_date].append(record)
-        return dict(sorted(upcoming_birthdays.items()))
+        return {
+            date: sorted(records, key=lambda record: record.name)
+            for date, records in sorted(upcoming_birthdays.items())
+        }
 
-    def __search_merge(self, *args) -> list[Record]:
-        """ Merge search result sets and return the contact records
+    def __search(self, keyword: str, *fields: str) -> list[Record]:
+        """ Private method for the search of the keyword/sequence in the contact record fields. The candidates
+        are taken from the search index, unless the keyword is too short, and verified by the substring check
+        of the cached search keys of the records (see Record.search_keys)
 
-        :param args: search result sets (set of string, optional)
-        :return: found contact records (list of Records)
+        :param keyword: search keyword or sequence (string, mandatory)
+        :param fields: the searched fields: name, address, phones, emails (strings, mandatory)
+        :return: found contact records sorted by the key (list of Records)
         """
-        found_keys: set[str] = set()
-        for result in args:
-            if isinstance(result, set):
-                found_keys.update(result)
-        return [value for key, value in self.items() if key in found_keys]
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        if len(keyword) < TrigramIndex.size:
+            candidates = self.data.keys()
+        else:
+            candidates = self.__search_index.candidates(keyword)
+        found_keys: list[str] = []
+        for key in candidates:
+            if (value := self.data.get(key)) is None:
+                continue
+            keys = value.search_keys
+            if (
+                    "name" in fields and keyword in keys.name
+                    or "address" in fields and keyword in keys.address
+                    or "phones" in fields and keyword in keys.phones
+                    or "emails" in fields and keyword in keys.emails
+            ):
+                found_keys.append(key)
+        return [self.data[key] for key in sorted(found_keys)]
 
     def search_by_name(self, keyword: str) -> list[Record]:
         """ Search and return the contact records by keyword/sequence in the name
@@ -162,8 +820,7 @@ class AddressBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found contact records (list of Records)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge({key for key, value in self.items() if keyword and keyword in value.name.lower()})
+        return self.__search(keyword, "name")
 
     def search_by_address(self, keyword: str) -> list[Record]:
         """ Search and return the contact records by keyword/sequence in the address
@@ -171,10 +828,7 @@ class AddressBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found contact records (list of Records)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {key for key, value in self.data.items() if keyword and keyword in value.address.lower()}
-        )
+        return self.__search(keyword, "address")
 
     def search_by_phone(self, keyword: str) -> list[Record]:
         """ Search and return the contact records by keyword/sequence in the phone numbers
@@ -182,10 +836,7 @@ class AddressBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found contact records (list of Records)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {key for key, value in self.items() if keyword and [i for i in value.phones if keyword in i.lower()]}
-        )
+        return self.__search(keyword, "phones")
 
     def search_by_email(self, keyword: str) -> list[Record]:
         """ Search and return the contact records by keyword/sequence in the emails
@@ -193,10 +844,7 @@ class AddressBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found contact records (list of Records)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {key for key, value in self.items() if keyword and [i for i in value.emails if keyword in i.lower()]}
-        )
+        return self.__search(keyword, "emails")
 
     def search(self, keyword: str) -> list[Record]:
         """ Search and return the contact records by keyword/sequence in the name, address, phone numbers and emails
@@ -204,10 +852,144 @@ class AddressBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found contact records (list of Records)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {key for key, value in self.items() if keyword and keyword in value.name.lower()},
-            {key for key, value in self.items() if keyword and keyword in value.address.lower()},
-            {key for key, value in self.items() if keyword and [i for i in value.phones if keyword in i.lower()]},
-            {key for key, value in self.items() if keyword and [i for i in value.emails if keyword in i.lower()]},
+        return self.__search(keyword, "name", "address", "phones", "emails")
+
+    def search_fuzzy(self, name: str, max_distance: int = 2) -> list[Record]:
+        """ Search and return the contact records with the names similar to the name, e.g. misspelled: every word
+        of the name has to be within the edit distance from a word of the contact name, ignoring the case,
+        and the sum of the distances must not exceed the maximum. The words are looked up in the BK-tree
+        of the contact name words, so only a small part of them is compared
+
+        :param name: contact name or its words (string, mandatory)
+        :param max_distance: the maximum edit distance (int, optional)
+        :return: found contact records, the closest first, ties sorted by the name (list of Records)
+        """
+        distances: Optional[dict[str, int]] = None
+        for word in self._normalize_name(name).split():
+            found = self._fuzzy_candidates(word, max_distance)
+            distances = found if distances is None else {
+                key: total for key, distance in distances.items()
+                if key in found and (total := distance + found[key]) <= max_distance
+            }
+            if not distances:
+                return []
+        return [self.data[key] for key in sorted(distances or (), key=lambda key: (distances[key], key))]
+
+    def _fuzzy_candidates(self, word: str, max_distance: int) -> dict[str, int]:
+        """ Return the keys of the contact records with a name word within the edit distance from the word,
+        the storage backends may look the words up without the built indexes
+
+        :param word: the normalized searched word (string, mandatory)
+        :param max_distance: the maximum edit distance (int, mandatory)
+        :return: the smallest edit distances by the contact record keys (dictionary)
+        """
+        tree, words = self.__fuzzy_indexes
+        found: dict[str, int] = {}
+        for name_word, distance in tree.search(word, max_distance).items():
+            for key in words.keys(name_word):
+                if distance < found.get(key, max_distance + 1):
+                    found[key] = distance
+        return found
+
+    @staticmethod
+    def __rank(keyword: str, contact: Record) -> Optional[int]:
+        """ Private method for the relevance rank of the contact record matching the keyword other than by the name
+        exact match or prefix: the name substring, then the address and then the phone numbers and emails exact match,
+        prefix and substring. The lower rank is the more relevant
+
+        :param keyword: the case-folded search keyword (string, mandatory)
+        :param contact: contact record (Record, mandatory)
+        :return: the rank, if the record matches the keyword (int, optional)
+        """
+        keys = contact.search_keys
+        if keyword in keys.name:
+            return 2
+        if keyword in keys.address:
+            return 3 if keys.address == keyword else 4 if keys.address.startswith(keyword) else 5
+        values = f"\0{keys.phones}\0{keys.emails}\0"
+        if keyword in values:
+            return 6 if f"\0{keyword}\0" in values else 7 if f"\0{keyword}" in values else 8
+        return None
+
+    def search_top(self, keyword: str, limit: int = 10) -> list[Record]:
+        """ Search and return the most relevant contact records by keyword/sequence in the name, address,
+        phone numbers and emails: the exact name first, then the names starting with the keyword, the names
+        containing it, and then the address, phone numbers and emails matches, ties sorted by the name.
+        The exact and prefix name matches are taken from the sorted names, the search stops once they fill
+        the limit, otherwise the best of the other matches are kept in a bounded heap
+
+        :param keyword: search keyword or sequence (string, mandatory)
+        :param limit: the maximum number of the returned records (int, optional)
+        :return: found contact records, the most relevant first (list of Records)
+        """
+        name = self._normalize_name(keyword)
+        if not name or limit < 1:
+            return []
+        found: list[str] = sorted(self._keys_by_normalized_name(name))
+        if len(found) < limit:
+            found.extend(self._keys_by_name_prefix(name, limit - len(found)))
+        records: list[Record] = [self.data[key] for key in found[:limit]]
+        if len(records) < limit:
+            keyword, skipped = search_key(keyword), set(found)
+            ranked = (
+                (rank, contact.search_keys.name, contact.name, contact)
+                for contact in self.search(keyword)
+                if contact.name not in skipped and (rank := self.__rank(keyword, contact)) is not None
+            )
+            records.extend(i[-1] for i in heapq.nsmallest(limit - len(records), ranked, key=lambda i: i[:3]))
+        return records
+
+    def __term_postings(self, term: QueryTerm) -> list[set[str]]:
+        """ Private method for the postings of the query term in the indexes: the birthday buckets of the range,
+        the email domain bucket, or the search index posting lists of the keyword trigrams
+
+        :param term: the query term (QueryTerm, mandatory)
+        :return: the sets of the keys, one of which contains every matching record, none if the term
+        has no index (list of sets)
+        """
+        if term.field == 'birthday':
+            index: BucketIndex = self.__birthday_index
+            return [set().union(*(index.keys(month_day) for month_day in term.month_days()))]
+        if (domain := term.domain) is not None:
+            return [self.__email_indexes[1].keys(domain)]
+        if len(term.keyword) < TrigramIndex.size:
+            return []
+        return self.__search_index.postings(term.keyword)
+
+    def _query_candidates(self, terms: list[QueryTerm]) -> Optional[Iterable[Record]]:
+        """ Return the contact records that may match all query terms, the intersection of the terms postings
+        in the indexes, the smallest first, or None if no term has an index and all records have to be checked.
+        The storage backends can narrow the candidates down their own way. The exact check is done by the caller
+
+        :param terms: the not negated query terms (list of QueryTerms, mandatory)
+        :return: candidate contact records (iterable of Records, optional)
+        """
+        postings: list[set[str]] = sorted((i for term in terms for i in self.__term_postings(term)), key=len)
+        if not postings:
+            return None
+        keys: set[str] = set(postings[0])
+        for posting in postings[1:]:
+            if not keys:
+                break
+            keys &= posting
+        return [self.data[key] for key in keys]
+
+    def query(self, terms: Iterable[QueryTerm]) -> list[Record]:
+        """ Search and return the contact records matching all query terms, e.g. the name, phone and birthday range
+        terms parsed from the search command. The candidates are taken from the most selective indexes
+        of the terms, only the terms without indexes are checked by the scan of all records
+
+        :param terms: the query terms (iterable of QueryTerms, mandatory)
+        :return: found contact records sorted by the name (list of Records)
+        """
+        terms = list(terms)
+        if not terms:
+            return []
+        candidates = self._query_candidates([term for term in terms if not term.negated])
+        return sorted(
+            (
+                record for record in (candidates if candidates is not None else self.values())
+                if all(term.matches(record) for term in terms)
+            ),
+            key=lambda record: record.name,
         )
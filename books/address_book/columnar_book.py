@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar Address Book class implementation for the very large books
+"""
+
+import datetime
+import weakref
+from array import array
+from typing import Any, Callable, Optional
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, MutableMapping
+
+from books.commons import search_key
+from .book import AddressBook
+from .query import QueryTerm, QUERY_FIELDS
+from .record import Record
+
+
+# Owner row of the dropped list column values
+NO_ROW = 0xFFFFFFFF
+# The columns are rebuilt without the deleted rows and the dropped values once there are more of them than this
+# and than the live rows
+COMPACTION_MIN_GARBAGE = 1024
+
+
+class _ListColumn:
+    """
+    Flat column of the list values of the rows (e.g. the phone numbers): the row has the offset and the number
+    of its values, and every value has its owner row and search key (see search_key), so the scans go over
+    the flat lists
+    """
+
+    def __init__(self):
+        self.values: list[Optional[str]] = []
+        self.search_keys: list[Optional[str]] = []
+        self.rows: array = array("I")
+        self.starts: array = array("I")
+        self.counts: array = array("I")
+
+    def append(self, row: int, values: list[str]) -> None:
+        """ Add the values of the new row
+
+        :param row: the row number (int, mandatory)
+        :param values: the values (list of strings, mandatory)
+        """
+        self.starts.append(len(self.values))
+        self.counts.append(len(values))
+        self.values.extend(values)
+        self.search_keys.extend(map(search_key, values))
+        self.rows.extend([row] * len(values))
+
+    def get(self, row: int) -> list[str]:
+        """ Return the values of the row
+
+        :param row: the row number (int, mandatory)
+        :return: the values (list of strings)
+        """
+        start = self.starts[row]
+        return self.values[start:start + self.counts[row]]
+
+    def put(self, row: int, values: list[str]) -> int:
+        """ Replace the values of the row, in place if they fit, otherwise they are moved to the end
+
+        :param row: the row number (int, mandatory)
+        :param values: the values (list of strings, mandatory)
+        :return: the number of the dropped values (int)
+        """
+        start, count = self.starts[row], self.counts[row]
+        if len(values) <= count:
+            self.values[start:start + len(values)] = values
+            self.search_keys[start:start + len(values)] = map(search_key, values)
+            self.__drop(start + len(values), start + count)
+            self.counts[row] = len(values)
+            return count - len(values)
+        self.__drop(start, start + count)
+        self.starts[row] = len(self.values)
+        self.counts[row] = len(values)
+        self.values.extend(values)
+        self.search_keys.extend(map(search_key, values))
+        self.rows.extend([row] * len(values))
+        return count
+
+    def __drop(self, start: int, stop: int) -> None:
+        """ Private method for dropping the values, their slots are kept until the compaction
+
+        :param start: the first value position (int, mandatory)
+        :param stop: the position after the last value (int, mandatory)
+        """
+        for position in range(start, stop):
+            self.values[position] = None
+            self.search_keys[position] = None
+            self.rows[position] = NO_ROW
+
+    def find(self, match: Callable[[str], bool]) -> set[int]:
+        """ Return the rows having any value matching the predicate
+
+        :param match: the value predicate (callable, mandatory)
+        :return: the row numbers (set of int)
+        """
+        return {self.rows[position] for position, value in enumerate(self.values) if value is not None and match(value)}
+
+    def search(self, keyword: str) -> set[int]:
+        """ Return the rows having any value whose search key contains the keyword
+
+        :param keyword: the keyword search key (string, mandatory)
+        :return: the row numbers (set of int)
+        """
+        rows = self.rows
+        return {rows[position] for position, key in enumerate(self.search_keys) if key is not None and keyword in key}
+
+
+class ColumnarRecords(MutableMapping):
+    """
+    Contact records mapping (key -> Record) kept as columns: the keys, the addresses, the birthdays
+    as the day ordinals, and the phone numbers and emails as the flat lists with the offsets of the rows.
+    The search keys (see search_key) of the names, addresses, phone numbers and emails are kept in the columns too,
+    so the search scans them without normalizing the values.
+    The Record objects are only the facades built on access and kept while they are referenced,
+    their changes are written back to the columns. The loaded records are passed to the track callback,
+    so their owner book can follow their changes
+    """
+
+    def __init__(self, track: Callable[[str, Record], None]):
+        """ Initialize the empty columns
+
+        :param track: the callback for the built records (callable, mandatory)
+        """
+        self.__track = track
+        self.__rows: dict[str, int] = {}
+        self.__keys: list[Optional[str]] = []
+        self.__addresses: list[Optional[str]] = []
+        self.__name_keys: list[Optional[str]] = []
+        self.__address_keys: list[Optional[str]] = []
+        self.__birthdays: array = array("i")
+        self.__phones: _ListColumn = _ListColumn()
+        self.__emails: _ListColumn = _ListColumn()
+        self.__garbage: int = 0
+        self.__facades: weakref.WeakValueDictionary[str, Record] = weakref.WeakValueDictionary()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_ColumnarRecords__facades', None)
+        return state
+
+    def __setstate__(self, value):
+        self.__dict__ = value
+        self.__facades = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__rows)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__rows
+
+    def __getitem__(self, key: str) -> Record:
+        if (record := self.__facades.get(key)) is not None:
+            return record
+        return self.__load(key, self.__rows[key])
+
+    def __setitem__(self, key: str, record: Record) -> None:
+        if (row := self.__rows.get(key)) is None:
+            self.__append(key, record)
+        else:
+            self.__write(row, record)
+        self.__follow(key, record)
+
+    def __delitem__(self, key: str) -> None:
+        row = self.__rows.pop(key)
+        self.__keys[row] = None
+        self.__addresses[row] = None
+        self.__name_keys[row] = None
+        self.__address_keys[row] = None
+        self.__birthdays[row] = 0
+        self.__garbage += 1 + self.__phones.put(row, []) + self.__emails.put(row, [])
+        if (record := self.__facades.pop(key, None)) is not None:
+            record.unsubscribe(self.__write_back)
+        if self.__garbage > max(len(self.__rows), COMPACTION_MIN_GARBAGE):
+            self.__compact()
+
+    def insert(self, records: Iterable[tuple[str, Record]]) -> None:
+        """ Add many new contact records to the columns, the records themselves are not kept
+
+        :param records: the contact records with their keys (iterable of tuple string, Record, mandatory)
+        """
+        for key, record in records:
+            self.__append(key, record)
+
+    def __append(self, key: str, record: Record) -> None:
+        """ Private method for adding the row of the contact record
+
+        :param key: the contact record key (string, mandatory)
+        :param record: contact record (Record, mandatory)
+        """
+        row = self.__rows[key] = len(self.__keys)
+        self.__keys.append(key)
+        self.__addresses.append(record.address or None)
+        self.__name_keys.append(search_key(key))
+        self.__address_keys.append(search_key(record.address) if record.address else None)
+        self.__birthdays.append(record.birthday.value.toordinal() if record.birthday is not None else 0)
+        self.__phones.append(row, record.phones)
+        self.__emails.append(row, record.emails)
+
+    def __write(self, row: int, record: Record) -> None:
+        """ Private method for writing the contact record values to its row
+
+        :param row: the row number (int, mandatory)
+        :param record: contact record (Record, mandatory)
+        """
+        self.__addresses[row] = record.address or None
+        self.__address_keys[row] = search_key(record.address) if record.address else None
+        self.__birthdays[row] = record.birthday.value.toordinal() if record.birthday is not None else 0
+        self.__garbage += self.__phones.put(row, record.phones) + self.__emails.put(row, record.emails)
+
+    def __compact(self) -> None:
+        """ Private method for rebuilding the columns without the deleted rows and the dropped values
+        """
+        rows = [
+            (
+                key, self.__addresses[row], self.__name_keys[row], self.__address_keys[row], self.__birthdays[row],
+                self.__phones.get(row), self.__emails.get(row),
+            )
+            for key, row in self.__rows.items()
+        ]
+        self.__rows = {}
+        self.__keys, self.__addresses, self.__birthdays = [], [], array("i")
+        self.__name_keys, self.__address_keys = [], []
+        self.__phones, self.__emails = _ListColumn(), _ListColumn()
+        self.__garbage = 0
+        for key, address, name_key, address_key, birthday, phones, emails in rows:
+            row = self.__rows[key] = len(self.__keys)
+            self.__keys.append(key)
+            self.__addresses.append(address)
+            self.__name_keys.append(name_key)
+            self.__address_keys.append(address_key)
+            self.__birthdays.append(birthday)
+            self.__phones.append(row, phones)
+            self.__emails.append(row, emails)
+
+    def __load(self, key: str, row: int) -> Record:
+        """ Private method for building the facade record of the row
+
+        :param key: the contact record key (string, mandatory)
+        :param row: the row number (int, mandatory)
+        :return: contact record (Record)
+        """
+        birthday = self.__birthdays[row]
+        record = Record.restore(
+            key,
+            address=self.__addresses[row],
+            birthday=datetime.date.fromordinal(birthday) if birthday else None,
+            phones=self.__phones.get(row),
+            emails=self.__emails.get(row),
+        )
+        self.__follow(key, record)
+        self.__track(key, record)
+        return record
+
+    def __follow(self, key: str, record: Record) -> None:
+        """ Private method for keeping the facade record and writing its changes back
+
+        :param key: the contact record key (string, mandatory)
+        :param record: contact record (Record, mandatory)
+        """
+        record.unsubscribe(self.__write_back)
+        record.subscribe(self.__write_back, key)
+        self.__facades[key] = record
+
+    def __write_back(self, key: str, event: str, *args) -> None:
+        """ Private observer that writes the changed facade record to its row. The renamed record
+        is moved by its owner book, which deletes the old key and sets the new one
+
+        :param key: the contact record key (string, mandatory)
+        :param event: the contact record change event (string, mandatory)
+        :param args: the contact record change details (any types, optional)
+        """
+        record = self.__facades.get(key)
+        if record is not None and record.name == key and (row := self.__rows.get(key)) is not None:
+            self.__write(row, record)
+
+    def select(self, rows: Iterable[int]) -> list[Record]:
+        """ Return the contact records of the rows sorted by the key
+
+        :param rows: the row numbers (iterable of int, mandatory)
+        :return: contact records (list of Records)
+        """
+        return [self[key] for key in sorted(self.__keys[row] for row in rows)]
+
+    def search_rows(self, keyword: str, fields: tuple[str, ...]) -> set[int]:
+        """ Return the rows that contain the keyword in the search keys (see search_key) of any of the fields
+        ("name", "address", "phones", "emails"), scanning the search keys columns only
+
+        :param keyword: the keyword search key (string, mandatory)
+        :param fields: the searched fields (tuple of strings, mandatory)
+        :return: the row numbers (set of int)
+        """
+        rows: set[int] = set()
+        if "name" in fields:
+            rows.update(row for row, key in enumerate(self.__name_keys) if key is not None and keyword in key)
+        if "address" in fields:
+            rows.update(row for row, key in enumerate(self.__address_keys) if key is not None and keyword in key)
+        if "phones" in fields:
+            rows |= self.__phones.search(keyword)
+        if "emails" in fields:
+            rows |= self.__emails.search(keyword)
+        return rows
+
+    def birthday_rows(self, month_days: set[int]) -> Iterator[int]:
+        """ Yield the rows with the birthday month * 100 + day in the given set
+
+        :param month_days: the birthday month and day numbers (set of int, mandatory)
+        :return: the row numbers (Iterator of int)
+        """
+        ordinals: dict[int, bool] = {0: False}
+        for row, birthday in enumerate(self.__birthdays):
+            if (matched := ordinals.get(birthday)) is None:
+                day = datetime.date.fromordinal(birthday)
+                matched = ordinals[birthday] = day.month * 100 + day.day in month_days
+            if matched:
+                yield row
+
+    def phone_rows(self, phones: set[str]) -> dict[str, set[int]]:
+        """ Return the rows having the sanitized phone numbers
+
+        :param phones: sanitized phone numbers (set of strings, mandatory)
+        :return: the row numbers by the phone numbers found (dictionary)
+        """
+        found: defaultdict[str, set[int]] = defaultdict(set)
+        for position, phone in enumerate(self.__phones.values):
+            if phone in phones:
+                found[phone].add(self.__phones.rows[position])
+        return dict(found)
+
+    def email_rows(self, match: Callable[[str], bool]) -> set[int]:
+        """ Return the rows having any case-folded email matching the predicate
+
+        :param match: the case-folded email predicate (callable, mandatory)
+        :return: the row numbers (set of int)
+        """
+        return self.__emails.find(lambda email: match(email.lower()))
+
+    def email_domains(self) -> dict[str, int]:
+        """ Return the numbers of the rows by the case-folded email domains
+
+        :return: the numbers of the rows by the domains (dictionary)
+        """
+        rows: defaultdict[str, set[int]] = defaultdict(set)
+        for position, email in enumerate(self.__emails.values):
+            if email is not None:
+                rows[email.rpartition('@')[2].lower()].add(self.__emails.rows[position])
+        return {domain: len(i) for domain, i in rows.items()}
+
+
+class ColumnarAddressBook(AddressBook):
+    """
+    Address book for the very large books, that keeps the contact records in the columns (ColumnarRecords).
+    The search, the birthdays and the phone and email lookups scan the columns instead of the records,
+    the records are built only for the results
+    """
+
+    def __init__(self, *args, upcoming_birthdays_period: int = 7):
+        """ Initialize a Columnar Address Book with the specified Contacts and the birthday congratulations
+        days range, if given
+
+        :param args: the contact records (Record, optional)
+        :param upcoming_birthdays_period: the default birthday congratulations days range (int)
+        """
+        super().__init__(upcoming_birthdays_period=upcoming_birthdays_period)
+        self.data: ColumnarRecords = ColumnarRecords(self._track)
+        for contact in args:
+            if str(contact.name) not in self:
+                self.add_record(contact)
+
+    def __setstate__(self, value):
+        self.__dict__ = value
+        self.mark_clean()
+        self._forget_indexes()
+
+    def _replace(self, records: Iterable[tuple[str, Record]]) -> None:
+        """ Replace all contact records with the records loaded from the storage, skipping the checks.
+        Only the values of the records are kept in the columns
+
+        :param records: the contact records with their keys (iterable of tuple string, Record, mandatory)
+        """
+        self.data = ColumnarRecords(self._track)
+        self._forget_indexes()
+        self.data.insert(records)
+
+    def _birthday_candidates(self, today: datetime.date, upcoming_birthdays_period: int) -> Iterator[Record]:
+        month_days = self._birthday_month_days(today, upcoming_birthdays_period)
+        return iter(self.data.select(self.data.birthday_rows(month_days)))
+
+    def _records_by_phones(self, phones: Iterable[str]) -> dict[str, list[Record]]:
+        return {phone: self.data.select(rows) for phone, rows in self.data.phone_rows(set(phones)).items()}
+
+    def _records_by_email(self, email: str) -> list[Record]:
+        return self.data.select(self.data.email_rows(email.__eq__))
+
+    def _records_by_domain(self, domain: str) -> list[Record]:
+        return self.data.select(self.data.email_rows(lambda email: email.rpartition('@')[2] == domain))
+
+    def _records_by_local_part(self, local_part: str) -> list[Record]:
+        return self.data.select(self.data.email_rows(lambda email: email.rpartition('@')[0] == local_part))
+
+    def _email_domains(self) -> dict[str, int]:
+        return self.data.email_domains()
+
+    def _query_candidates(self, terms: list[QueryTerm]) -> Optional[Iterable[Record]]:
+        rows: Optional[set[int]] = None
+        for term in terms:
+            if term.field == 'birthday':
+                found = set(self.data.birthday_rows(set(term.month_days())))
+            elif (domain := term.domain) is not None:
+                found = self.data.email_rows(lambda email: email.rpartition('@')[2] == domain)
+            else:
+                found = self.data.search_rows(term.keyword, QUERY_FIELDS[term.field])
+            rows = found if rows is None else rows & found
+            if not rows:
+                break
+        return self.data.select(rows) if rows is not None else None
+
+    def __search(self, keyword: str, *fields: str) -> list[Record]:
+        """ Private method for the search in the columns, the records are built only for the found rows
+
+        :param keyword: search keyword or sequence (string, mandatory)
+        :param fields: the searched fields: name, address, phones, emails (strings, mandatory)
+        :return: found contact records sorted by the key (list of Records)
+        """
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        return self.data.select(self.data.search_rows(keyword, fields))
+
+    def search_by_name(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name")
+
+    def search_by_address(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "address")
+
+    def search_by_phone(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "phones")
+
+    def search_by_email(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "emails")
+
+    def search(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name", "address", "phones", "emails")
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Duplicate contact records detection for the Address Book
+"""
+
+import re
+from itertools import combinations, repeat
+from collections import namedtuple, defaultdict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Executor
+from typing import Optional
+
+from books.commons import BKTree, search_key
+from .record import Record
+
+
+# Pair of the contact records that may be the same person: the record keys in order, the score from 0 to 1,
+# and the reasons (the matching fields: name, phone, email)
+DuplicateCandidate = namedtuple('DuplicateCandidate', ['first', 'second', 'score', 'reasons'])
+
+# The contact record values compared by the workers, plain and picklable, the name is case-folded with the words sorted
+_Contact = namedtuple('_Contact', ['key', 'name', 'phones', 'emails'])
+
+# Score weights of the name similarity and of the shared phone number and email
+NAME_WEIGHT: float = 0.5
+PHONE_WEIGHT: float = 0.3
+EMAIL_WEIGHT: float = 0.2
+# The name similarity (1 - edit distance / length) from which the names are reported as matching
+NAME_SIMILARITY: float = 0.8
+
+_vowels = re.compile(r'(?<=\w)[aeiouyаеєиіїоуюяыэё]|[^\w\s]')
+_repeats = re.compile(r'(\w)\1+')
+
+
+def name_key(name: str) -> str:
+    """ Return the blocking key of the contact name, the same for the names differing in case, words order,
+    vowels and doubled letters, e.g. the most common misspellings: the words of the case-folded name
+    without the vowels (but the first letter) and repeated letters, sorted
+
+    :param name: contact name (string, mandatory)
+    :return: the name key (string)
+    """
+    return ' '.join(sorted(_repeats.sub(r'\1', _vowels.sub('', search_key(name))).split()))
+
+
+def _blocking_keys(contacts: Sequence[_Contact]) -> list[set[str]]:
+    """ Private function for the blocking keys of the chunk of the contact records, done by the find_duplicates
+    workers: the E.164 phone numbers, the case-folded emails and the name key, only the records sharing a key
+    are compared
+
+    :param contacts: the contact records values (sequence of _Contacts, mandatory)
+    :return: the blocking keys of every record (list of sets of strings)
+    """
+    blocking_keys: list[set[str]] = []
+    for contact in contacts:
+        keys = {f'phone:{phone}' for phone in contact.phones} | {f'email:{email}' for email in contact.emails}
+        if name := name_key(contact.name):
+            keys.add(f'name:{name}')
+        blocking_keys.append(keys)
+    return blocking_keys
+
+
+def _score(first: _Contact, second: _Contact, min_score: float) -> Optional[DuplicateCandidate]:
+    """ Private function for scoring the pair of the contact records. The names edit distance is computed
+    only if the pair can reach the minimum score, the names of very different lengths cannot
+
+    :param first: the first contact record values (_Contact, mandatory)
+    :param second: the second contact record values (_Contact, mandatory)
+    :param min_score: the minimum score of the returned candidate (float, mandatory)
+    :return: the duplicate candidate, if scored at least the minimum (DuplicateCandidate, optional)
+    """
+    score, reasons = 0.0, []
+    if not first.phones.isdisjoint(second.phones):
+        score += PHONE_WEIGHT
+        reasons.append('phone')
+    if not first.emails.isdisjoint(second.emails):
+        score += EMAIL_WEIGHT
+        reasons.append('email')
+    longest = max(len(first.name), len(second.name)) or 1
+    max_distance = int((1 - (min_score - score) / NAME_WEIGHT) * longest + 1e-9)
+    if first.name == second.name:
+        distance = 0
+    elif max_distance < max(abs(len(first.name) - len(second.name)), 1):
+        return None
+    elif (distance := BKTree.distance(first.name, second.name)) > max_distance:
+        return None
+    similarity = 1 - distance / longest
+    if similarity >= NAME_SIMILARITY:
+        reasons.insert(0, 'name')
+    return DuplicateCandidate(
+        *sorted((first.key, second.key)), round(score + NAME_WEIGHT * similarity, 3), tuple(reasons)
+    )
+
+
+def _score_pairs(pairs: Sequence[tuple[_Contact, _Contact]], min_score: float) -> list[DuplicateCandidate]:
+    """ Private function for scoring the chunk of the contact record pairs, done by the find_duplicates workers
+
+    :param pairs: the contact records values pairs (sequence of tuples, mandatory)
+    :param min_score: the minimum score of the returned candidates (float, mandatory)
+    :return: the duplicate candidates scored at least the minimum (list of DuplicateCandidates)
+    """
+    return [candidate for first, second in pairs if (candidate := _score(first, second, min_score)) is not None]
+
+
+def find_duplicates(
+        records: Mapping[str, Record],
+        min_score: float = 0.5,
+        executor: Optional[Executor] = None,
+        max_block_size: int = 100,
+        chunk_size: int = 5000,
+) -> list[DuplicateCandidate]:
+    """ Find the contact records that may be the same person, e.g. stored under slightly different names.
+    The records are grouped into the blocks by the phone numbers, the emails and the name keys (see name_key),
+    and only the records within a block are compared, so the time is near-linear in the number of the records.
+    The blocks larger than the maximum (e.g. a shared office phone number) are skipped. The pairs are scored
+    by the name similarity and the shared phone numbers and emails. The blocking keys and the scores are computed
+    in chunks sent to the executor workers (e.g. ProcessPoolExecutor), if given, so it scales with the number of cores
+
+    :param records: the contact records by the keys, e.g. the address book (mapping, mandatory)
+    :param min_score: the minimum score of the returned candidates (float, optional)
+    :param executor: the executor for the parallel scoring (Executor, optional)
+    :param max_block_size: the maximum number of the records compared within a block (int, optional)
+    :param chunk_size: the number of the records or pairs sent to a worker at once (int, optional)
+    :return: the duplicate candidates, the highest score first, ties sorted by the keys (list of DuplicateCandidates)
+    """
+    contacts: list[_Contact] = [
+        _Contact(
+            key, ' '.join(sorted(search_key(record.name).split())),
+            frozenset(record.phones), frozenset(email.lower() for email in record.emails),
+        )
+        for key, record in records.items()
+    ]
+    mapper = executor.map if executor is not None else map
+    blocks: defaultdict[str, list[int]] = defaultdict(list)
+    chunks = mapper(_blocking_keys, [contacts[i:i + chunk_size] for i in range(0, len(contacts), chunk_size)])
+    for i, keys in enumerate(key for chunk in chunks for key in chunk):
+        for key in keys:
+            blocks[key].append(i)
+    indexes: set[tuple[int, int]] = {
+        pair for block in blocks.values() if 1 < len(block) <= max_block_size for pair in combinations(block, 2)
+    }
+    pairs: list[tuple[_Contact, _Contact]] = [(contacts[i], contacts[j]) for i, j in indexes]
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    results = mapper(_score_pairs, chunks, repeat(min_score))
+    return sorted(
+        (candidate for chunk in results for candidate in chunk),
+        key=lambda candidate: (-candidate.score, candidate.first, candidate.second),
+    )
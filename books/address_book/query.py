@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+Contact query terms for the Address Book multi-term search
+"""
+
+from collections import namedtuple
+from typing import Optional
+
+from books.commons import search_key
+from .record import Record
+
+
+# The query term field -> the searched record fields (see Record.search_keys), None is any of them
+QUERY_FIELDS: dict[Optional[str], tuple[str, ...]] = {
+    None: ('name', 'address', 'phones', 'emails'),
+    'name': ('name',),
+    'address': ('address',),
+    'phone': ('phones',),
+    'email': ('emails',),
+}
+
+
+class QueryTerm(namedtuple('QueryTerm', ['field', 'value', 'negated'])):
+    """
+    Term of the contact query, all terms of the query must match the contact record.
+    The name, address, phone and email terms (and the terms without a field, matching any of them) match
+    the records containing the value, compared by the search keys (see search_key), except an email term
+    of the form @domain, which matches the emails at the domain. The birthday term value is the range
+    of the birthday days as (first, last) month * 100 + day numbers, inclusive, and wraps around the year end
+    if the first day is later than the last one.
+    The negated term matches the records the term does not match
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, field: Optional[str], value: str | tuple[int, int], negated: bool = False):
+        """ Create the query term
+
+        :param field: the field: name, address, phone, email, birthday, or None for any (string, optional)
+        :param value: the searched value, or the birthday days range (string or tuple of int, mandatory)
+        :param negated: the term excludes the matching records (boolean, optional)
+        :return: the query term (QueryTerm)
+        """
+        if field != 'birthday' and field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown query field: {field}")
+        return super().__new__(cls, field, value if field == 'birthday' else search_key(value), negated)
+
+    @property
+    def domain(self) -> Optional[str]:
+        """ Return the case-folded domain of the @domain email term
+
+        :return: the domain, if it is the email domain term (string, optional)
+        """
+        return self.value[1:] if self.field == 'email' and self.value.startswith('@') else None
+
+    @property
+    def keyword(self) -> Optional[str]:
+        """ Return the case-folded value of the substring term
+
+        :return: the keyword, if it is the substring term (string, optional)
+        """
+        return None if self.field == 'birthday' or self.domain is not None else self.value
+
+    def month_days(self) -> list[int]:
+        """ Return the birthday days within the range of the birthday term as month * 100 + day numbers
+
+        :return: the month and day numbers (list of int)
+        """
+        return [
+            month * 100 + day
+            for month in range(1, 13) for day in range(1, 32)
+            if self.__in_range(month * 100 + day)
+        ]
+
+    def __in_range(self, month_day: int) -> bool:
+        """ Private method for checking the birthday day against the range of the birthday term
+
+        :param month_day: the month * 100 + day number (int, mandatory)
+        :return: whether the day is within the range (boolean)
+        """
+        first, last = self.value
+        return first <= month_day <= last if first <= last else month_day >= first or month_day <= last
+
+    def matches(self, record: Record) -> bool:
+        """ Check the contact record against the term, taking the negation into account
+
+        :param record: contact record (Record, mandatory)
+        :return: whether the record matches the term (boolean)
+        """
+        if self.field == 'birthday':
+            date_of_birth = record.birthday.date_of_birth() if record.birthday is not None else None
+            found = date_of_birth is not None and self.__in_range(date_of_birth.month * 100 + date_of_birth.day)
+        elif (domain := self.domain) is not None:
+            found = any(email.rpartition('@')[2].lower() == domain for email in record.emails)
+        else:
+            keys = record.search_keys
+            found = any(self.value in getattr(keys, field) for field in QUERY_FIELDS[self.field])
+        return found != self.negated
@@ -4,6 +4,6 @@ __title__ = 'Address book record'
 __author__ = 'project-group-3'
 
 
-from .record import Record
+from .record import Record, Phone, Email
 
-__all__ = ['Record']
+__all__ = ['Record', 'Phone', 'Email']
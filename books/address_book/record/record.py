@@ -7,12 +7,17 @@ Record class for address book implementation
 import re
 import datetime
 import phonenumbers
+from itertools import repeat
 from typing import Optional
+from collections import namedtuple
+from concurrent.futures import Executor
+from collections.abc import Iterable, Sequence
 
 
-from books.commons import Field
+from books.commons import Field, Observable, FieldChange, NormalizationCache, search_key
 from ..error import (
     ContactNameMandatory,
+    ContactAlreadyExist,
     ContactPhoneNotFound,
     ContactPhoneAlreadyExist,
     ContactPhoneValueError,
@@ -25,8 +30,19 @@ from ..error import (
     ContactAddressCannotBeEmpty,
 )
 
+# Normalized phones and emails, shared by the fields, so the repeated lookups and edits of the same values
+# skip the validation. The size can be changed with normalization_cache.resize()
+NORMALIZATION_CACHE_SIZE = 4096
+normalization_cache = NormalizationCache(NORMALIZATION_CACHE_SIZE)
+
+# Search keys (see search_key) of the record values, the phones and emails are joined with the \0 separator,
+# so a keyword is checked against all of them at once
+SearchKeys = namedtuple('SearchKeys', ['name', 'address', 'phones', 'emails'])
+
 
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Name field with the specified value
 
@@ -38,6 +54,8 @@ class Name(Field):
 
 
 class Birthday(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Birthday field with the specified value
 
@@ -85,6 +103,8 @@ class Birthday(Field):
 
 
 class Phone(Field):
+    __slots__ = ()
+
     strict: bool = False
     value_clear_pattern = re.compile(r"\D")
 
@@ -96,22 +116,35 @@ class Phone(Field):
         super().__init__(self.prepare(value))
 
     @classmethod
-    def prepare(cls, value: str) -> str:
+    def prepare(cls, value: str, strict: Optional[bool] = None) -> str:
         """ Phone number validation and sanitization
 
         :param value: phone number (string, mandatory)
+        :param strict: accept only the valid numbers, not just the possible ones, the class flag by default (boolean, optional)
         :return: sanitized phone number (string)
         """
 
+        if strict is None:
+            strict = cls.strict
         if not value:
             raise ContactPhoneValueError()
+        return normalization_cache.get((cls.__name__, value, strict), lambda: cls.__normalize(value, strict))
+
+    @classmethod
+    def __normalize(cls, value: str, strict: bool) -> str:
+        """ Private method for the phone number validation and sanitization, bypassing the cache
+
+        :param value: phone number (string, mandatory)
+        :param strict: accept only the valid numbers (boolean, mandatory)
+        :return: sanitized phone number (string)
+        """
         value = '+' + re.sub(cls.value_clear_pattern, '', value)
         try:
             phone_number = phonenumbers.parse(value)
             if (
                     not phonenumbers.is_valid_number(phone_number)
                     and
-                    (cls.strict or not phonenumbers.is_possible_number(phone_number))
+                    (strict or not phonenumbers.is_possible_number(phone_number))
             ):
                 raise ContactPhoneValueError()
             value = phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
@@ -119,8 +152,46 @@ class Phone(Field):
             raise ContactPhoneValueError()
         return value
 
+    @classmethod
+    def prepare_many(
+            cls,
+            values: Sequence[str],
+            executor: Optional[Executor] = None,
+            chunk_size: int = 500,
+    ) -> list[Optional[str]]:
+        """ Phone numbers batch validation and sanitization. The batch is split into chunks normalized
+        by the executor workers (e.g. ProcessPoolExecutor), if given, so it scales with the number of cores
+
+        :param values: phone numbers (sequence of strings, mandatory)
+        :param executor: the executor for the parallel normalization (Executor, optional)
+        :param chunk_size: the number of phones sent to a worker at once (int, optional)
+        :return: sanitized phone numbers in the same order, None for the invalid ones (list of strings)
+        """
+        chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+        results = (executor.map if executor is not None else map)(_prepare_phones, chunks, repeat(cls.strict))
+        return [phone for chunk in results for phone in chunk]
+
+
+def _prepare_phones(values: Sequence[str], strict: bool) -> list[Optional[str]]:
+    """ Phone numbers chunk normalization done by the Phone.prepare_many workers, the invalid phone numbers
+    are returned as None, since the exceptions would have to be sent between the processes
+
+    :param values: phone numbers (sequence of strings, mandatory)
+    :param strict: accept only the valid numbers (boolean, mandatory)
+    :return: sanitized phone numbers, None for the invalid ones (list of strings)
+    """
+    phones: list[Optional[str]] = []
+    for value in values:
+        try:
+            phones.append(Phone.prepare(value, strict))
+        except ContactPhoneValueError:
+            phones.append(None)
+    return phones
+
 
 class Email(Field):
+    __slots__ = ()
+
     value_clear_pattern = re.compile(r"\s")
     value_match_pattern = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
 
@@ -141,6 +212,15 @@ class Email(Field):
 
         if not value:
             raise ContactEmailValueError()
+        return normalization_cache.get((cls.__name__, value), lambda: cls.__normalize(value))
+
+    @classmethod
+    def __normalize(cls, value: str) -> str:
+        """ Private method for the email validation and sanitization, bypassing the cache
+
+        :param value: email (string, mandatory)
+        :return: sanitized email (string)
+        """
         value = re.sub(cls.value_clear_pattern, '', value)
         if not re.match(cls.value_match_pattern, value):
             raise ContactEmailValueError()
@@ -148,6 +228,8 @@ class Email(Field):
 
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Address field with the specified value
 
@@ -158,13 +240,23 @@ class Address(Field):
         super().__init__(str(value))
 
 
-class Record:
+class Record(Observable):
+    """
+    Contact record. The values are kept in slots as the plain sanitized strings (the phones and the emails
+    as tuples of them), the birthday as the Birthday field, and the fields are created from them on demand.
+    The search keys of the values are cached until the record is changed
+    """
+
+    __slots__ = (
+        '__name', '__address', '__birthday', '__phones', '__emails', '__search_keys', '_observers', '__weakref__',
+    )
+
     def __init__(
             self,
             name: str,
             address: Optional[str] = None,
             birthday: Optional[str] = None,
-            phones: Optional[list[str]] = None,
+            phones: Optional[list[str | Phone]] = None,
             emails: Optional[list[str]] = None,
     ):
         """ Initialize the Contact record for the specified Name and with the Address, Birthday, Phone numbers
@@ -173,27 +265,87 @@ class Record:
         :param name: the name value (string, mandatory)
         :param address: the address value (string, optional)
         :param birthday: the birthday value (string, optional)
-        :param phones: the phone numbers (list of strings, optional)
+        :param phones: the phone numbers or the already validated Phone fields (list of strings or Phones, optional)
         :param emails: the emails (list of strings, optional)
         """
-        self.__name: Name = Name(name)
-        self.__address: Optional[Address] = None
+        self._observers = ()
+        self.__search_keys: Optional[SearchKeys] = None
+        self.__name: str = Name(name).value
+        self.__address: Optional[str] = None
         self.__birthday: Optional[Birthday] = None
-        self.__phones: list[Phone] = []
-        self.__emails: list[Email] = []
+        self.__phones: tuple[str, ...] = ()
+        self.__emails: tuple[str, ...] = ()
         if isinstance(address, str) and address:
             self.edit_address(address)
         if isinstance(birthday, str) and birthday:
             self.edit_birthday(birthday)
         if isinstance(phones, list):
             for phone in phones:
-                if self.__find_phone(phone) is None:
-                    self.add_phone(phone)
+                phone = phone.value if isinstance(phone, Phone) else Phone(phone).value
+                if phone not in self.__phones:
+                    self.__phones += (phone,)
         if isinstance(emails, list):
             for email in emails:
                 if self.__find_email(email) is None:
                     self.add_email(email)
 
+    @classmethod
+    def restore(
+            cls,
+            name: str,
+            address: Optional[str] = None,
+            birthday: Optional[datetime.date] = None,
+            phones: Iterable[str] = (),
+            emails: Iterable[str] = (),
+    ) -> 'Record':
+        """ Create the Contact record with the already validated values (e.g. loaded from the storage),
+            skipping the validation
+
+        :param name: the name value (string, mandatory)
+        :param address: the address value (string, optional)
+        :param birthday: the birthday date (date, optional)
+        :param phones: the sanitized phone numbers (iterable of strings, optional)
+        :param emails: the sanitized emails (iterable of strings, optional)
+        :return: the contact record (Record)
+        """
+        record = cls.__new__(cls)
+        record._observers = ()
+        record.__search_keys = None
+        record.__name = name
+        record.__address = address or None
+        record.__birthday = Birthday.restore(birthday) if birthday else None
+        record.__phones = tuple(phones)
+        record.__emails = tuple(emails)
+        return record
+
+    def __getstate__(self):
+        return {
+            '_Record__name': self.__name,
+            '_Record__address': self.__address,
+            '_Record__birthday': self.__birthday,
+            '_Record__phones': self.__phones,
+            '_Record__emails': self.__emails,
+        }
+
+    def __setstate__(self, state):
+        # The records pickled before the slots were introduced keep the values as the fields and the lists of them
+        self._observers = ()
+        self.__search_keys = None
+        self.__name = self.__plain(state['_Record__name'])
+        self.__address = self.__plain(state['_Record__address'])
+        self.__birthday = state['_Record__birthday']
+        self.__phones = tuple(self.__plain(i) for i in state['_Record__phones'])
+        self.__emails = tuple(self.__plain(i) for i in state['_Record__emails'])
+
+    @staticmethod
+    def __plain(value: Optional[str | Field]) -> Optional[str]:
+        """ Private method for the plain string value of the field restored from the legacy state
+
+        :param value: the value or the field (string or Field, optional)
+        :return: the value (string, optional)
+        """
+        return value.value if isinstance(value, Field) else value
+
     def __str__(self) -> str:
         """ Create a readable string for the class instance
 
@@ -204,57 +356,111 @@ class Record:
         if self.__birthday is not None:
             readable_string += f", birthday: {str(self.birthday)}"
         if self.__phones:
-            readable_string += ", phones: {phones}".format(phones="; ".join(i for i in self.phones))
+            readable_string += ", phones: {phones}".format(phones="; ".join(self.__phones))
         if self.__emails:
-            readable_string += ", emails: {emails}".format(emails="; ".join(i for i in self.emails))
+            readable_string += ", emails: {emails}".format(emails="; ".join(self.__emails))
         if self.__address:
             readable_string += f", address: {self.address}"
         return readable_string
 
     @property
     def name(self) -> str:
-        return str(self.__name)
+        return self.__name
 
     @property
     def address(self) -> str:
-        return str(self.__address) if self.__address is not None else ''
+        return self.__address or ''
 
     @property
-    def birthday(self) -> Optional[datetime.date]:
+    def birthday(self) -> Optional[Birthday]:
         return self.__birthday
 
     @property
     def phones(self) -> list[str]:
-        return [str(i) for i in self.__phones]
+        return list(self.__phones)
 
     @property
     def emails(self) -> list[str]:
-        return [str(i) for i in self.__emails]
+        return list(self.__emails)
 
-    def __find_phone(self, phone: str) -> Optional[Phone]:
+    @property
+    def search_keys(self) -> SearchKeys:
+        """ Return the search keys of the name, address, phone numbers and emails, computed on the first search
+        after the record change
+
+        :return: the search keys (SearchKeys)
+        """
+        if self.__search_keys is None:
+            self.__search_keys = SearchKeys(
+                search_key(self.__name),
+                search_key(self.__address or ''),
+                search_key("\0".join(self.__phones)),
+                search_key("\0".join(self.__emails)),
+            )
+        return self.__search_keys
+
+    def _notify(self, event: str, *details, change: Optional[FieldChange] = None) -> None:
+        """ Drop the cached search keys and notify the subscribed observers about the change
+
+        :param event: the change event name (string, mandatory)
+        :param details: the change event details (any types, optional)
+        :param change: the field-level delta of the change (FieldChange, optional)
+        """
+        self.__search_keys = None
+        super()._notify(event, *details, change=change)
+
+    def __find_phone(self, phone: str | Phone) -> Optional[str]:
         """ Private method for searching the phone number
 
-        :param phone: phone number (string, mandatory)
-        :return: phone field, if found (Phone, optional)
+        :param phone: phone number or phone field (string or Phone, mandatory)
+        :return: sanitized phone number, if found (string, optional)
         """
-        phone = Phone.prepare(phone)
-        return next((p for p in self.__phones if p.value == phone), None)
+        phone = phone.value if isinstance(phone, Phone) else Phone.prepare(phone)
+        return phone if phone in self.__phones else None
 
-    def __find_email(self, email: str) -> Optional[Email]:
+    def __find_email(self, email: str) -> Optional[str]:
         """ Private method for searching the email
 
         :param email: email (string, mandatory)
-        :return: email field, if found (Email, optional)
+        :return: sanitized email, if found (string, optional)
         """
         email = Email.prepare(email)
-        return next((p for p in self.__emails if p.value == email), None)
+        return email if email in self.__emails else None
+
+    @staticmethod
+    def __replace(values: tuple[str, ...], old: str, new: Optional[str] = None) -> tuple[str, ...]:
+        """ Private method for replacing or, if the new value is not given, removing the value of the tuple
+
+        :param values: the values (tuple of strings, mandatory)
+        :param old: the existing value (string, mandatory)
+        :param new: the new value (string, optional)
+        :return: the changed values (tuple of strings)
+        """
+        index = values.index(old)
+        return values[:index] + ((new,) if new is not None else ()) + values[index + 1:]
+
+    @staticmethod
+    def __str(field: Optional[Field]) -> Optional[str]:
+        """ Private method for the field value string of the change delta
+
+        :param field: the field (Field, optional)
+        :return: readable string, if the field is set (string, optional)
+        """
+        return str(field) if field is not None else None
 
     def edit_name(self, name: str) -> None:
-        """ Edit the name, or raise the name value mandatory exception
+        """ Edit the name, or raise the name value mandatory exception. The owning book moves the record
+        under the new name, or raises the contact already exists exception, then the name is not changed
 
         :param name: contact`s name (string, mandatory)
         """
-        self.__name = Name(name)
+        old_name, self.__name = self.__name, Name(name).value
+        try:
+            self._notify('edit_name', name, change=FieldChange('name', old_name, self.__name))
+        except ContactAlreadyExist:
+            self.__name = old_name
+            self.__search_keys = None
+            raise
 
     def add_address(self, address: str) -> None:
         """ Add the address to the Contact record, or raise the address already exists exception
@@ -270,12 +476,14 @@ class Record:
 
         :param address: address string (string, mandatory)
         """
-        self.__address = Address(address)
+        old_address, self.__address = self.__address, Address(address).value
+        self._notify('edit_address', address, change=FieldChange('address', old_address, self.__address))
 
     def delete_address(self) -> None:
         """ Delete the address from the Contact record
         """
-        self.__address = None
+        old_address, self.__address = self.__address, None
+        self._notify('delete_address', change=FieldChange('address', old_address, None))
 
     def add_birthday(self, birthday: str) -> None:
         """ Add the birthday to the Contact record, or raise the birthday already exists exception
@@ -291,12 +499,16 @@ class Record:
 
         :param birthday: birthday (string, mandatory)
         """
-        self.__birthday = Birthday(birthday)
+        old_birthday, self.__birthday = self.__birthday, Birthday(birthday)
+        self._notify(
+            'edit_birthday', birthday, change=FieldChange('birthday', self.__str(old_birthday), str(self.__birthday))
+        )
 
     def delete_birthday(self) -> None:
         """ Delete the birthday from the Contact record
         """
-        self.__birthday = None
+        old_birthday, self.__birthday = self.__birthday, None
+        self._notify('delete_birthday', change=FieldChange('birthday', self.__str(old_birthday), None))
 
     def next_birthday(self, today: datetime.date) -> Optional[datetime.date]:
         """Return the next birthday of contact. If the birthday is on February 29 and today's year is not a leap year,
@@ -320,26 +532,30 @@ class Record:
         :param phone: phone number (string, mandatory)
         :return: phone field, if found (Phone)
         """
-        phone_object: Optional[Phone] = self.__find_phone(phone)
-        if phone_object is None:
+        value: Optional[str] = self.__find_phone(phone)
+        if value is None:
             raise ContactPhoneNotFound()
-        return phone_object
+        return Phone.restore(value)
 
-    def add_phone(self, phone: str) -> None:
+    def add_phone(self, phone: str | Phone) -> None:
         """ Add the phone number, or raise the phone number already exists exception
 
-        :param phone: phone number (string, mandatory)
+        :param phone: phone number or the already validated phone field (string or Phone, mandatory)
         """
-        if self.__find_phone(phone):
+        value: str = phone.value if isinstance(phone, Phone) else Phone(phone).value
+        if value in self.__phones:
             raise ContactPhoneAlreadyExist()
-        self.__phones.append(Phone(phone))
+        self.__phones += (value,)
+        self._notify('add_phone', phone, change=FieldChange('phones', None, value))
 
     def remove_phone(self, phone: str) -> None:
         """ Remove the phone number, or raise the phone number not found exception
 
         :param phone: phone number (string, mandatory)
         """
-        self.__phones.remove(self.find_phone(phone))
+        value: str = self.find_phone(phone).value
+        self.__phones = self.__replace(self.__phones, value)
+        self._notify('remove_phone', phone, change=FieldChange('phones', value, None))
 
     def edit_phone(self, existing_phone: str, phone: str) -> None:
         """ Edit the phone number, or raise the phone number not found exception
@@ -347,7 +563,10 @@ class Record:
         :param existing_phone: phone number (string, mandatory)
         :param phone: new phone number (string, mandatory)
         """
-        self.__phones[self.__phones.index(self.find_phone(existing_phone))] = Phone(phone)
+        value: str = self.find_phone(existing_phone).value
+        new_value: str = Phone(phone).value
+        self.__phones = self.__replace(self.__phones, value, new_value)
+        self._notify('edit_phone', existing_phone, phone, change=FieldChange('phones', value, new_value))
 
     def find_email(self, email: str) -> Email:
         """ Search and return the email, or raise the email not found exception
@@ -355,10 +574,10 @@ class Record:
         :param email: email (string, mandatory)
         :return: email field, if found (Email)
         """
-        email_object: Optional[Email] = self.__find_email(email)
-        if email_object is None:
+        value: Optional[str] = self.__find_email(email)
+        if value is None:
             raise ContactEmailNotFound()
-        return email_object
+        return Email.restore(value)
 
     def add_email(self, email: str) -> None:
         """ Add the email, or raise the email already exists exception
@@ -367,14 +586,17 @@ class Record:
         """
         if self.__find_email(email):
             raise ContactEmailAlreadyExist()
-        self.__emails.append(Email(email))
+        self.__emails += (value := Email(email).value,)
+        self._notify('add_email', email, change=FieldChange('emails', None, value))
 
     def remove_email(self, email: str) -> None:
         """ Remove the email, or raise the email not found exception
 
         :param email: email (string, mandatory)
         """
-        self.__emails.remove(self.find_email(email))
+        value: str = self.find_email(email).value
+        self.__emails = self.__replace(self.__emails, value)
+        self._notify('remove_email', email, change=FieldChange('emails', value, None))
 
     def edit_email(self, existing_email: str, email: str) -> None:
         """ Edit the email, or raise the email not found exception
@@ -382,4 +604,26 @@ class Record:
         :param existing_email: email (string, mandatory)
         :param email: new email (string, mandatory)
         """
-        self.__emails[self.__emails.index(self.find_email(existing_email))] = Email(email)
+        value: str = self.find_email(existing_email).value
+        new_value: str = Email(email).value
+        self.__emails = self.__replace(self.__emails, value, new_value)
+        self._notify('edit_email', existing_email, email, change=FieldChange('emails', value, new_value))
+
+    def merge(self, other: 'Record') -> None:
+        """ Merge the duplicate contact record into this one: add its phone numbers and emails missing here,
+        and its address and birthday, if this record has none, the emails are compared ignoring the case.
+        The other record is not changed
+
+        :param other: the duplicate contact record (Record, mandatory)
+        """
+        for phone in other.phones:
+            if phone not in self.__phones:
+                self.add_phone(phone)
+        emails = {email.lower() for email in self.__emails}
+        for email in other.emails:
+            if email.lower() not in emails:
+                self.add_email(email)
+        if self.__address is None and other.address:
+            self.add_address(other.address)
+        if self.__birthday is None and other.birthday is not None:
+            self.add_birthday(str(other.birthday))
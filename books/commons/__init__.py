@@ -5,5 +5,15 @@ __author__ = 'project-group-3'
 
 from .exceptions import ObjectNotFound, ObjectAlreadyExist, ObjectValueError
 from .field import Field
+from .observable import Observable, FieldChange
+from .cache import NormalizationCache, CacheInfo
+from .trigram_index import TrigramIndex
+from .bucket_index import BucketIndex
+from .sorted_keys import SortedKeys
+from .search_key import search_key
+from .bk_tree import BKTree
 
-__all__ = ['ObjectNotFound', 'ObjectAlreadyExist', 'ObjectValueError', 'Field']
+__all__ = [
+    'ObjectNotFound', 'ObjectAlreadyExist', 'ObjectValueError', 'Field', 'Observable', 'FieldChange',
+    'NormalizationCache', 'CacheInfo', 'TrigramIndex', 'BucketIndex', 'SortedKeys', 'search_key', 'BKTree',
+]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+BK-tree for the book classes fuzzy (edit distance) lookups
+"""
+
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of the words by the Levenshtein edit distance. Every child of a node is at
+    a distinct distance from the node word, so by the triangle inequality the words within the distance
+    from the searched word are only under the children at the distances close to the node distance,
+    and a lookup compares the searched word with a small part of the words.
+    The removed words are only marked, so the tree shape is kept, and they are revived if added back.
+    The tree loaded from the storage keeps the stored shape, so the loading computes no distances
+    """
+
+    def __init__(self, words: Iterable[str] = ()):
+        """ Initialize the tree with the words
+
+        :param words: the words (iterable of strings, optional)
+        """
+        # The node is [word, live flag, {distance: child node}]
+        self.__root: Optional[list] = None
+        self.__words: set[str] = set()
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return len(self.__words)
+
+    @classmethod
+    def restore(cls, nodes: Iterable[tuple[str, bool, int, int, int]]) -> 'BKTree':
+        """ Create the tree with the nodes loaded from the storage in the breadth-first order (see nodes),
+        skipping the distances computation
+
+        :param nodes: the node words, live flags, distances from the parent words, first child numbers
+        and numbers of the children (iterable of tuples, mandatory)
+        :return: the tree (BKTree)
+        """
+        tree = cls()
+        nodes = list(nodes)
+        built = [[word, live, {}] for word, live, *_ in nodes]
+        for node, (_, _, _, first, count) in zip(built, nodes):
+            node[2].update((nodes[child][2], built[child]) for child in range(first, first + count))
+        tree.__root = built[0] if built else None
+        tree.__words = {node[0] for node in built if node[1]}
+        return tree
+
+    def nodes(self) -> Iterator[tuple[str, bool, int, int, int]]:
+        """ Return the nodes in the breadth-first order, so the children of a node are numbered consecutively:
+        the node word, live flag, distance from the parent word (0 for the root), first child number
+        and number of the children
+
+        :return: the nodes (iterator of tuples)
+        """
+        queue: list[tuple[list, int]] = [(self.__root, 0)] if self.__root is not None else []
+        i = 0
+        while i < len(queue):
+            (word, live, children), distance = queue[i]
+            yield word, live, distance, len(queue), len(children)
+            queue.extend((child, child_distance) for child_distance, child in children.items())
+            i += 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.__words
+
+    @staticmethod
+    def distance(first: str, second: str) -> int:
+        """ Return the Levenshtein edit distance: the number of the inserted, deleted or replaced characters.
+        The column of the distances is kept as the bit vectors of its +1 and -1 vertical deltas (Myers' algorithm),
+        so a character of the longer word is handled by a few integer operations
+
+        :param first: the first word (string, mandatory)
+        :param second: the second word (string, mandatory)
+        :return: the edit distance (int)
+        """
+        if len(first) < len(second):
+            first, second = second, first
+        if not second:
+            return len(first)
+        positions: dict[str, int] = {}
+        for i, char in enumerate(second):
+            positions[char] = positions.get(char, 0) | (1 << i)
+        mask, last = (1 << len(second)) - 1, 1 << (len(second) - 1)
+        plus, minus, score = mask, 0, len(second)
+        for char in first:
+            equal = positions.get(char, 0)
+            vertical = equal | minus
+            horizontal = (((equal & plus) + plus) ^ plus) | equal
+            horizontal_plus = minus | ~(horizontal | plus)
+            horizontal_minus = plus & horizontal
+            if horizontal_plus & last:
+                score += 1
+            elif horizontal_minus & last:
+                score -= 1
+            horizontal_plus = (horizontal_plus << 1) | 1
+            horizontal_minus <<= 1
+            plus = (horizontal_minus | ~(vertical | horizontal_plus)) & mask
+            minus = horizontal_plus & vertical
+        return score
+
+    def __find(self, word: str) -> Optional[list]:
+        """ Private method for searching the node of the word
+
+        :param word: the word (string, mandatory)
+        :return: the node, if the word has been added (list, optional)
+        """
+        node = self.__root
+        while node is not None and (distance := self.distance(word, node[0])) != 0:
+            node = node[2].get(distance)
+        return node
+
+    def add(self, word: str) -> None:
+        """ Add the word, if it is not in the tree
+
+        :param word: the word (string, mandatory)
+        """
+        if word in self.__words:
+            return
+        self.__words.add(word)
+        if self.__root is None:
+            self.__root = [word, True, {}]
+            return
+        node = self.__root
+        while (distance := self.distance(word, node[0])) != 0:
+            if (child := node[2].get(distance)) is None:
+                node[2][distance] = [word, True, {}]
+                return
+            node = child
+        node[1] = True
+
+    def discard(self, word: str) -> None:
+        """ Remove the word, if it is in the tree
+
+        :param word: the word (string, mandatory)
+        """
+        if word in self.__words:
+            self.__words.discard(word)
+            self.__find(word)[1] = False
+
+    def search(self, word: str, max_distance: int) -> dict[str, int]:
+        """ Return the words within the edit distance from the word
+
+        :param word: the searched word (string, mandatory)
+        :param max_distance: the maximum edit distance (int, mandatory)
+        :return: the edit distances by the found words (dictionary)
+        """
+        found: dict[str, int] = {}
+        nodes = [self.__root] if self.__root is not None else []
+        while nodes:
+            node_word, live, children = nodes.pop()
+            distance = self.distance(word, node_word)
+            if live and distance <= max_distance:
+                found[node_word] = distance
+            nodes.extend(
+                child for child_distance, child in children.items()
+                if distance - max_distance <= child_distance <= distance + max_distance
+            )
+        return found
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bucket index for the book classes lookups by a derived value
+"""
+
+from collections import defaultdict
+from collections.abc import Hashable, Iterable
+from typing import Optional
+
+
+class BucketIndex:
+    """
+    Index of the object keys grouped by the values derived from the objects (e.g. the birthday day of the year),
+    so the objects with the given value are found without a scan. An object may be in several buckets
+    """
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.__buckets: defaultdict[Hashable, set[Hashable]] = defaultdict(set)
+        self.__buckets_of: Optional[dict[Hashable, tuple[Hashable, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__key_buckets)
+
+    @classmethod
+    def restore(cls, buckets: Iterable[tuple[Hashable, Iterable[Hashable]]]) -> 'BucketIndex':
+        """ Create the index with the buckets loaded from the storage, skipping the buckets computation.
+        The buckets of every key are collected on the first change
+
+        :param buckets: the buckets with their keys (iterable of tuple hashable, iterable, mandatory)
+        :return: the index (BucketIndex)
+        """
+        index = cls()
+        for bucket, keys in buckets:
+            if keys := set(keys):
+                index.__buckets[bucket] = keys
+        index.__buckets_of = None
+        return index
+
+    @property
+    def __key_buckets(self) -> dict[Hashable, tuple[Hashable, ...]]:
+        """ Private property with the buckets by the keys, collected on the first use if the index has been
+        loaded from the storage
+
+        :return: the buckets by the keys (dictionary)
+        """
+        if self.__buckets_of is None:
+            buckets_of: defaultdict[Hashable, list[Hashable]] = defaultdict(list)
+            for bucket, keys in self.__buckets.items():
+                for key in keys:
+                    buckets_of[key].append(bucket)
+            self.__buckets_of = {key: tuple(key_buckets) for key, key_buckets in buckets_of.items()}
+        return self.__buckets_of
+
+    def put(self, key: Hashable, buckets: Iterable[Hashable]) -> None:
+        """ Put the key into the buckets, removing it from the buckets it was in before
+
+        :param key: the object key (hashable, mandatory)
+        :param buckets: the object buckets (iterable of hashable, mandatory)
+        """
+        self.discard(key)
+        if buckets := tuple(set(buckets)):
+            self.__key_buckets[key] = buckets
+            for bucket in buckets:
+                self.__buckets[bucket].add(key)
+
+    def discard(self, key: Hashable) -> None:
+        """ Remove the key from all its buckets
+
+        :param key: the object key (hashable, mandatory)
+        """
+        for bucket in self.__key_buckets.pop(key, ()):
+            keys = self.__buckets[bucket]
+            keys.discard(key)
+            if not keys:
+                del self.__buckets[bucket]
+
+    def keys(self, bucket: Hashable) -> set[Hashable]:
+        """ Return the keys in the bucket
+
+        :param bucket: the bucket (hashable, mandatory)
+        :return: the object keys (set)
+        """
+        return set(self.__buckets.get(bucket, ()))
+
+    def counts(self) -> dict[Hashable, int]:
+        """ Return the numbers of the keys in the buckets
+
+        :return: the numbers of the keys by the buckets (dictionary)
+        """
+        return {bucket: len(keys) for bucket, keys in self.__buckets.items()}
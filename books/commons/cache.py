@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bounded LRU cache for the field values normalization
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Hashable
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class NormalizationCache:
+    """
+    Least recently used cache of the normalized field values, bounded by the number of entries.
+    Only the successful normalizations are cached, the invalid values raise their exceptions every time
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        """ Initialize the cache with the specified maximum number of entries
+
+        :param maxsize: the maximum number of entries, 0 disables the cache (int, optional)
+        """
+        self.__maxsize: int = maxsize
+        self.__entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def maxsize(self) -> int:
+        return self.__maxsize
+
+    def get(self, key: Hashable, normalize: Callable[[], Any]) -> Any:
+        """ Return the cached normalized value, or normalize the value and cache the result
+
+        :param key: the cache key, including everything the result depends on (hashable, mandatory)
+        :param normalize: the normalization callback (callable, mandatory)
+        :return: the normalized value (any types)
+        """
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return self.__entries[key]
+            self.misses += 1
+        value = normalize()
+        if self.__maxsize > 0:
+            with self.__lock:
+                self.__entries[key] = value
+                if len(self.__entries) > self.__maxsize:
+                    self.__entries.popitem(last=False)
+        return value
+
+    def resize(self, maxsize: int) -> None:
+        """ Change the maximum number of entries, dropping the least recently used ones over it
+
+        :param maxsize: the maximum number of entries, 0 disables the cache (int, mandatory)
+        """
+        with self.__lock:
+            self.__maxsize = maxsize
+            while len(self.__entries) > max(maxsize, 0):
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """ Drop all entries and reset the counters
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """ Return the cache statistics
+
+        :return: hits, misses, maximum and current number of entries (CacheInfo)
+        """
+        return CacheInfo(self.hits, self.misses, self.__maxsize, len(self.__entries))
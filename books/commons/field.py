@@ -9,9 +9,12 @@ from typing import Any
 
 class Field:
     """
-    Immutable class that can be used in Set and Dict key
+    Immutable class that can be used in Set and Dict key.
+    The value is kept in a slot, the subclasses declare empty __slots__, so the fields have no instance dictionary
     """
 
+    __slots__ = ('_protected_value',)
+
     def __init__(self, value: Any):
         """ Initialize the field with the specified value
 
@@ -19,6 +22,17 @@ class Field:
         """
         super().__setattr__('_protected_value', value)
 
+    @classmethod
+    def restore(cls, value: Any):
+        """ Create the field with the already validated value (e.g. loaded from the storage), skipping the validation
+
+        :param value: the value (any types, mandatory)
+        :return: the field (Field)
+        """
+        field = cls.__new__(cls)
+        object.__setattr__(field, '_protected_value', value)
+        return field
+
     def __str__(self) -> str:
         """ Create a readable string for the class instance
 
@@ -29,6 +43,13 @@ class Field:
     def __setattr__(self, key, value):
         raise AttributeError("Class is immutable")
 
+    def __getstate__(self):
+        return {'_protected_value': self._protected_value}
+
+    def __setstate__(self, state):
+        # The fields pickled before the slots were introduced have the same dictionary state
+        object.__setattr__(self, '_protected_value', state['_protected_value'])
+
     def __hash__(self):
         return hash(self.value)
 
@@ -37,5 +58,5 @@ class Field:
 
     @property
     def value(self) -> Any:
-        return super().__getattribute__('_protected_value')
+        return self._protected_value
 
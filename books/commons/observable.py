@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Observable mixin for the book classes implementation
+"""
+
+from collections import namedtuple
+from typing import Any, Callable, Optional
+
+
+# Field-level delta of a change: the field name and its old and new values, None when there is no value.
+# For the list fields (e.g. phones) the values are the removed and the added item
+FieldChange = namedtuple('FieldChange', ['field', 'old', 'new'])
+
+
+class Observable:
+    """
+    Mixin that notifies the subscribed observers about the object changes.
+    The observers are runtime only and are never serialized together with the object
+    """
+
+    __slots__ = ()
+
+    _observers: tuple[tuple[Callable[..., None], tuple, bool], ...] = ()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_observers', None)
+        return state
+
+    def subscribe(self, observer: Callable[..., None], *args, changes: bool = False) -> None:
+        """ Subscribe the observer to the object changes. The observer is called as observer(*args, event, *details),
+        and, if it subscribes to the field changes, with the field-level delta as the change keyword argument
+
+        :param observer: the change callback (callable, mandatory)
+        :param args: the leading arguments for the callback (any types, optional)
+        :param changes: pass the field-level delta of the change (boolean, optional)
+        """
+        self._observers = self._observers + ((observer, args, changes),)
+
+    def unsubscribe(self, observer: Callable[..., None]) -> None:
+        """ Unsubscribe the observer from the object changes
+
+        :param observer: the change callback (callable, mandatory)
+        """
+        self._observers = tuple(i for i in self._observers if i[0] != observer)
+
+    def _notify(self, event: str, *details: Any, change: Optional[FieldChange] = None) -> None:
+        """ Notify the subscribed observers about the change
+
+        :param event: the change event name (string, mandatory)
+        :param details: the change event details (any types, optional)
+        :param change: the field-level delta of the change (FieldChange, optional)
+        """
+        for observer, args, changes in self._observers:
+            if changes:
+                observer(*args, event, *details, change=change)
+            else:
+                observer(*args, event, *details)
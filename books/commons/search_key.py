@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+"""
+Search key normalization for the book classes implementation
+"""
+
+import unicodedata
+
+
+def search_key(value: str) -> str:
+    """ Return the value in the form used for the case-insensitive search: Unicode NFKC normalized and case-folded.
+    The value itself is returned when the normalization does not change it, so the cached keys of e.g. the phone
+    numbers take no extra memory
+
+    :param value: the value (string, mandatory)
+    :return: the search key (string)
+    """
+    key = unicodedata.normalize("NFKC", value).casefold()
+    return value if key == value else key
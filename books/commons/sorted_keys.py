@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sorted keys container for the book classes ordered iteration
+"""
+
+import bisect
+from itertools import chain, islice, takewhile
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+
+
+class SortedKeys:
+    """
+    Keys kept sorted in a list of blocks, so a key is added or removed by the binary searches and a short block
+    insertion, the sorted iteration is linear, and the keys of a range are found in logarithmic time
+    """
+
+    block_size: int = 1000
+
+    def __init__(self, keys: Iterable[Any] = ()):
+        """ Initialize the container with the keys
+
+        :param keys: the keys (iterable, optional)
+        """
+        self.__blocks: list[list[Any]] = []
+        self.__maxes: list[Any] = []
+        self.__len: int = 0
+        self.__load(sorted(set(keys)))
+
+    def __load(self, keys: list[Any]) -> None:
+        """ Private method for replacing the content with the sorted keys
+
+        :param keys: the sorted unique keys (list, mandatory)
+        """
+        self.__blocks = [keys[i:i + self.block_size] for i in range(0, len(keys), self.block_size)]
+        self.__maxes = [block[-1] for block in self.__blocks]
+        self.__len = len(keys)
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self.__blocks)
+
+    def __contains__(self, key: Any) -> bool:
+        i = bisect.bisect_left(self.__maxes, key)
+        return i < len(self.__maxes) and (block := self.__blocks[i])[bisect.bisect_left(block, key)] == key
+
+    def add(self, key: Any) -> None:
+        """ Add the key, if it is not in the container
+
+        :param key: the key (any comparable type, mandatory)
+        """
+        if not self.__blocks:
+            self.__blocks.append([key])
+            self.__maxes.append(key)
+            self.__len = 1
+            return
+        i = min(bisect.bisect_left(self.__maxes, key), len(self.__maxes) - 1)
+        block = self.__blocks[i]
+        j = bisect.bisect_left(block, key)
+        if j < len(block) and block[j] == key:
+            return
+        block.insert(j, key)
+        self.__maxes[i] = block[-1]
+        self.__len += 1
+        if len(block) > 2 * self.block_size:
+            self.__blocks[i:i + 1] = [block[:self.block_size], block[self.block_size:]]
+            self.__maxes[i:i + 1] = [block[self.block_size - 1], block[-1]]
+
+    def update(self, keys: Iterable[Any]) -> None:
+        """ Add the keys, large batches are merged by one sort
+
+        :param keys: the keys (iterable, mandatory)
+        """
+        keys = list(keys)
+        if len(keys) > self.block_size:
+            self.__load(sorted(set(chain(self, keys))))
+        else:
+            for key in keys:
+                self.add(key)
+
+    def discard(self, key: Any) -> None:
+        """ Remove the key, if it is in the container
+
+        :param key: the key (any comparable type, mandatory)
+        """
+        i = bisect.bisect_left(self.__maxes, key)
+        if i == len(self.__maxes):
+            return
+        block = self.__blocks[i]
+        j = bisect.bisect_left(block, key)
+        if block[j] != key:
+            return
+        del block[j]
+        self.__len -= 1
+        if block:
+            self.__maxes[i] = block[-1]
+        else:
+            del self.__blocks[i], self.__maxes[i]
+
+    def irange(self, start: Optional[Any] = None, stop: Optional[Any] = None) -> Iterator[Any]:
+        """ Return the keys from the start (inclusive) to the stop (exclusive) in the sorted order
+
+        :param start: the first key, from the beginning by default (any comparable type, optional)
+        :param stop: the key to stop at, to the end by default (any comparable type, optional)
+        :return: the keys (iterator)
+        """
+        i = bisect.bisect_left(self.__maxes, start) if start is not None else 0
+        if i == len(self.__blocks):
+            return iter(())
+        j = bisect.bisect_left(self.__blocks[i], start) if start is not None else 0
+        keys = chain(islice(self.__blocks[i], j, None), chain.from_iterable(islice(self.__blocks, i + 1, None)))
+        return keys if stop is None else takewhile(lambda key: key < stop, keys)
+
+    def prefix(self, prefix: str) -> Iterator[str]:
+        """ Return the string keys starting with the prefix in the sorted order
+
+        :param prefix: the keys prefix (string, mandatory)
+        :return: the keys (iterator)
+        """
+        return takewhile(lambda key: key.startswith(prefix), self.irange(prefix))
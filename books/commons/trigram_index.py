@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Trigram inverted index for the book classes substring search
+"""
+
+from collections.abc import Hashable, Iterable
+from typing import Optional
+
+from .search_key import search_key
+
+
+class TrigramIndex:
+    """
+    Inverted index from the case-folded trigrams (three character sequences) of the values to the keys
+    of the objects containing them. A keyword of at least three characters can only occur in the values
+    whose keys are in the posting lists of all its trigrams, so the intersection of the lists narrows
+    the substring search down to a few candidates, which are verified by the caller.
+    The posting lists loaded from the storage are kept as they are until their trigrams are used,
+    so the loading does not depend on the size of the index
+    """
+
+    size: int = 3
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.__postings: dict[str, set[Hashable]] = {}
+        self.__stored: dict[str, Iterable[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__postings) + len(self.__stored)
+
+    @classmethod
+    def restore(cls, postings: Iterable[tuple[str, Iterable[Hashable]]]) -> 'TrigramIndex':
+        """ Create the index with the posting lists loaded from the storage, skipping the values trigrams computation.
+        The lists are iterated once, on the first use of their trigrams
+
+        :param postings: the trigrams with the keys containing them (iterable of tuple string, iterable, mandatory)
+        :return: the index (TrigramIndex)
+        """
+        index = cls()
+        index.__stored.update(postings)
+        return index
+
+    def __keys(self, trigram: str) -> Optional[set[Hashable]]:
+        """ Private method for the posting list of the trigram, converted into the set on the first use
+        if it has been loaded from the storage
+
+        :param trigram: the trigram (string, mandatory)
+        :return: the keys of the objects containing the trigram, if any (set, optional)
+        """
+        if (keys := self.__postings.get(trigram)) is None and (stored := self.__stored.pop(trigram, None)) is not None:
+            keys = self.__postings[trigram] = set(stored)
+        return keys
+
+    @classmethod
+    def trigrams(cls, *values: str) -> set[str]:
+        """ Return the trigrams of the values search keys (see search_key). The values are joined with a separator,
+        the trigrams across the values only add the candidates filtered out by the verification
+
+        :param values: the values (strings, mandatory)
+        :return: the values trigrams (set of strings)
+        """
+        value = search_key("\0".join(values))
+        return {value[i:i + cls.size] for i in range(len(value) - cls.size + 1)}
+
+    def add(self, key: Hashable, values: Iterable[str]) -> None:
+        """ Add the key to the posting lists of the values trigrams
+
+        :param key: the object key (hashable, mandatory)
+        :param values: the object values (iterable of strings, mandatory)
+        """
+        postings = self.__postings
+        for trigram in self.trigrams(*values):
+            if (keys := self.__keys(trigram)) is None:
+                keys = postings[trigram] = set()
+            keys.add(key)
+
+    def discard(self, key: Hashable, values: Iterable[str], keep: Iterable[str] = ()) -> None:
+        """ Remove the key from the posting lists of the values trigrams, except the trigrams of the kept values,
+        e.g. the other values of the changed object
+
+        :param key: the object key (hashable, mandatory)
+        :param values: the removed object values (iterable of strings, mandatory)
+        :param keep: the remaining object values (iterable of strings, optional)
+        """
+        postings = self.__postings
+        for trigram in self.trigrams(*values) - self.trigrams(*keep):
+            if (keys := self.__keys(trigram)) is not None:
+                keys.discard(key)
+                if not keys:
+                    del postings[trigram]
+
+    def postings(self, keyword: str) -> list[set[Hashable]]:
+        """ Return the posting lists of the keyword trigrams, the smallest first, e.g. for intersecting them
+        with the postings of the other keywords. The lists are the index internals and must not be changed
+
+        :param keyword: search keyword or sequence (string, mandatory)
+        :return: the posting lists, none if the keyword is too short (list of sets)
+        """
+        return sorted((self.__keys(i) or set() for i in self.trigrams(keyword)), key=len)
+
+    def candidates(self, keyword: str) -> Optional[set[Hashable]]:
+        """ Return the keys of the objects that may contain the keyword, or None if the keyword
+        is too short to be looked up and all objects have to be checked
+
+        :param keyword: search keyword or sequence (string, mandatory)
+        :return: the candidate keys (set, optional)
+        """
+        if len(keyword) < self.size:
+            return None
+        postings = self.postings(keyword)
+        return postings[0].intersection(*postings[1:]) if postings[0] else set()
@@ -6,12 +6,14 @@ Note Book class implementation
 
 import enum
 from collections import UserDict
+from collections.abc import Iterable
 
+from books.commons import Observable, search_key
 from .error import NoteNotFound, NoteAlreadyExist
 from .note import Note
 
 
-class NoteBook(UserDict):
+class NoteBook(UserDict, Observable):
 
     class SortOrder(enum.Enum):
         index = enum.auto()
@@ -26,15 +28,88 @@ class NoteBook(UserDict):
         """
         super().__init__()
         self.__unique_titles: bool = unique_titles
+        self.__dirty: bool = False
         for note in args:
             if not self.__unique_titles or note.title not in self.__titles():
                 self.add_note(note)
 
     def __getstate__(self):
-        return self.__dict__.copy()
+        state = self.__dict__.copy()
+        state.pop('_observers', None)
+        state.pop('_NoteBook__dirty', None)
+        return state
 
     def __setstate__(self, value):
         self.__dict__ = value
+        self.__dirty = False
+        for index, note in self.data.items():
+            self._track(index, note)
+
+    @classmethod
+    def restore(cls, notes: Iterable[tuple[int, Note]], unique_titles: bool = False) -> 'NoteBook':
+        """ Create the Note Book with the notes loaded from the storage, skipping the checks
+
+        :param notes: the note records with their indices (iterable of tuple int, Note, mandatory)
+        :param unique_titles: the note title must be unique (boolean, optional)
+        :return: the note book (NoteBook)
+        """
+        book = cls(unique_titles=unique_titles)
+        book._replace(notes)
+        return book
+
+    def _replace(self, notes: Iterable[tuple[int, Note]]) -> None:
+        """ Replace all notes with the notes loaded from the storage, skipping the checks
+
+        :param notes: the note records with their indices (iterable of tuple int, Note, mandatory)
+        """
+        self.data = {}
+        for index, note in notes:
+            self.data[index] = note
+            self._track(index, note)
+
+    @property
+    def unique_titles(self) -> bool:
+        return self.__unique_titles
+
+    @property
+    def dirty(self) -> bool:
+        """ Return whether the book has been changed since it was loaded or saved
+
+        :return: the book changed flag (boolean)
+        """
+        return self.__dirty
+
+    def mark_clean(self) -> None:
+        """ Mark the book as saved, i.e. without unsaved changes
+        """
+        self.__dirty = False
+
+    def _notify(self, event: str, *details) -> None:
+        """ Notify the subscribed observers about the change and mark the book as changed
+
+        :param event: the change event name (string, mandatory)
+        :param details: the change event details (any types, optional)
+        """
+        super()._notify(event, *details)
+        self.__dirty = True
+
+    def _track(self, index: int, note: Note) -> None:
+        """ Subscribe the book to the changes of the note stored under the index,
+        the storage backends call it for the notes they load on demand
+
+        :param index: note index (int, mandatory)
+        :param note: note record (Note, mandatory)
+        """
+        note.subscribe(self.__note_changed, index)
+
+    def __note_changed(self, index: int, event: str, *args) -> None:
+        """ Private observer that forwards the note record changes to the book observers
+
+        :param index: the note record index (int, mandatory)
+        :param event: the note record change event (string, mandatory)
+        :param args: the note record change details (any types, optional)
+        """
+        self._notify('note', index, event, *args)
 
     def __next_note_index(self) -> int:
         """ Return the next Note index
@@ -74,8 +149,11 @@ class NoteBook(UserDict):
         """
         if self.__unique_titles and note.title in self.__titles():
             raise NoteAlreadyExist()
-        self.data[self.__next_note_index()] = note
-        return next(reversed(self.data))
+        index: int = self.__next_note_index()
+        self.data[index] = note
+        self._track(index, note)
+        self._notify('add_note', note)
+        return index
 
     def get_note(self, index: int) -> tuple[int, Note]:
         """ Get the note record, or raise the note not found exception
@@ -98,21 +176,32 @@ class NoteBook(UserDict):
         if index <= 0:
             raise NoteNotFound()
         try:
-            self.data.pop(index)
+            self.data.pop(index).unsubscribe(self.__note_changed)
         except KeyError:
             raise NoteNotFound()
+        self._notify('delete_note', index)
 
-    def __search_merge(self, *args) -> list[tuple[int, Note]]:
-        """ Merge search result sets and return the notes with indices
+    def __search(self, keyword: str, *fields: str) -> list[tuple[int, Note]]:
+        """ Private method for the search of the keyword/sequence in the note fields,
+        checked against the cached search keys of the notes (see Note.search_keys)
 
-        :param args: search result sets (set of string, optional)
+        :param keyword: search keyword or sequence (string, mandatory)
+        :param fields: the searched fields: title, text, tags (strings, mandatory)
         :return: found notes (list of tuple int, Note)
         """
-        found_keys: set[str] = set()
-        for result in args:
-            if isinstance(result, set):
-                found_keys.update(result)
-        return [(idx, note) for idx, note in self.data.items() if idx in found_keys]
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        found: list[tuple[int, Note]] = []
+        for idx, note in self.data.items():
+            keys = note.search_keys
+            if (
+                    "title" in fields and keyword in keys.title
+                    or "text" in fields and keyword in keys.text
+                    or "tags" in fields and keyword in keys.tags
+            ):
+                found.append((idx, note))
+        return found
 
     def search_by_title(self, keyword: str) -> list[tuple[int, Note]]:
         """ Search and return the notes with indices by keyword/sequence in the title
@@ -120,10 +209,7 @@ class NoteBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found notes (list of tuple int, Note)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {idx for idx, note in self.data.items() if keyword and keyword in note.title.lower()}
-        )
+        return self.__search(keyword, "title")
 
     def search_by_text(self, keyword: str) -> list[tuple[int, Note]]:
         """ Search and return the notes with indices by keyword/sequence in the text
@@ -131,10 +217,7 @@ class NoteBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found notes (list of tuple int, Note)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {idx for idx, note in self.data.items() if keyword and keyword in note.text.lower()}
-        )
+        return self.__search(keyword, "text")
 
     def search_by_tag(self, keyword: str) -> list[tuple[int, Note]]:
         """ Search and return the notes with indices by keyword/sequence in the tags
@@ -142,10 +225,7 @@ class NoteBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found notes (list of tuple int, Note)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {idx for idx, note in self.data.items() if keyword and keyword in note.tags.lower()}
-        )
+        return self.__search(keyword, "tags")
 
     def search(self, keyword: str) -> list[tuple[int, Note]]:
         """ Search and return the notes with indices by keyword/sequence in the title, text and tags
@@ -153,9 +233,4 @@ class NoteBook(UserDict):
         :param keyword: search keyword or sequence (string, mandatory)
         :return: found notes (list of tuple int, Note)
         """
-        keyword = keyword.lower() or ""
-        return self.__search_merge(
-            {idx for idx, note in self.data.items() if keyword and keyword in note.title.lower()},
-            {idx for idx, note in self.data.items() if keyword and keyword in note.text.lower()},
-            {idx for idx, note in self.data.items() if keyword and keyword in note.tags.lower()},
-        )
+        return self.__search(keyword, "title", "text", "tags")
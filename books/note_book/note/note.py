@@ -8,13 +8,16 @@ from __future__ import annotations
 
 import re
 from typing import Optional, Any
-from collections.abc import Iterator
+from collections import namedtuple
+from collections.abc import Iterable, Iterator
 
-from books.commons import Field
+from books.commons import Field, Observable, search_key
 from ..error import NoteTitleMandatory, NoteTextMandatory, TagValueCannotBeEmpty
 
 
 class Title(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Title field with the specified value
 
@@ -26,6 +29,8 @@ class Title(Field):
 
 
 class Text(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Text field with the specified value
 
@@ -37,6 +42,8 @@ class Text(Field):
 
 
 class Tag(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         """ Initialize the Tag field with the specified value
 
@@ -140,7 +147,14 @@ class Tags:
         return next((tag for tag in self if str(tag) == str(value)), None)
 
 
-class Note:
+# Search keys (see search_key) of the note title, text and tags string
+SearchKeys = namedtuple('SearchKeys', ['title', 'text', 'tags'])
+
+
+class Note(Observable):
+    # Cached until the note is changed, the notes pickled without it have none
+    __search_keys: Optional[SearchKeys] = None
+
     def __init__(self, title: str, text: str, tags: Optional[list[Any]] = None, hashtags: bool = True):
         """ Initialize the Note record for the specified Title and with the Text, and Tags (if given)
 
@@ -158,6 +172,27 @@ class Note:
             self.__tags += Tags(*self.__class__.parse_text_for_hashtags(text))
 
 
+    @classmethod
+    def restore(cls, title: str, text: str, tags: Iterable[str] = ()) -> Note:
+        """ Create the Note record with the already validated values (e.g. loaded from the storage),
+            skipping the validation and the text parsing for hashtags
+
+        :param title: the title of the note (string, mandatory)
+        :param text: the text of the note (string, mandatory)
+        :param tags: the tags of the note (iterable of strings, optional)
+        :return: the note record (Note)
+        """
+        note = cls.__new__(cls)
+        note.__title = Title.restore(title)
+        note.__text = Text.restore(text)
+        note.__tags = Tags(*tags)
+        return note
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_Note__search_keys', None)
+        return state
+
     def __str__(self) -> str:
         """ Create a readable string for the class instance
 
@@ -189,6 +224,25 @@ class Note:
         """ Always returns a sorted list of string tags """
         return sorted([str(tag) for tag in self.__tags])
 
+    @property
+    def search_keys(self) -> SearchKeys:
+        """ Return the search keys of the title, text and tags, computed on the first search after the note change
+
+        :return: the search keys (SearchKeys)
+        """
+        if self.__search_keys is None:
+            self.__search_keys = SearchKeys(search_key(self.title), search_key(self.text), search_key(self.tags))
+        return self.__search_keys
+
+    def _notify(self, event: str, *details) -> None:
+        """ Drop the cached search keys and notify the subscribed observers about the change
+
+        :param event: the change event name (string, mandatory)
+        :param details: the change event details (any types, optional)
+        """
+        self.__search_keys = None
+        super()._notify(event, *details)
+
     @property
     def tags_number(self) -> int:
         """ Return the number of the existing tags
@@ -213,6 +267,7 @@ class Note:
         :return: all tags lexicographically sorted in string representation (string)
         """
         self.__tags += Tags(*args)
+        self._notify('add_tags', *args)
         return self.tags
 
     def delete_tags(self, *args) -> str:
@@ -222,6 +277,7 @@ class Note:
         :return: all tags lexicographically sorted in string representation (string)
         """
         self.__tags -= Tags(*args)
+        self._notify('delete_tags', *args)
         return self.tags
 
     def replace_tags(self, *args) -> str:
@@ -231,6 +287,7 @@ class Note:
         :return: all tags lexicographically sorted in string representation (string)
         """
         self.__tags = Tags(*args)
+        self._notify('replace_tags', *args)
         return self.tags
 
     def is_tag_exist(self, value: Any) -> bool:
@@ -247,12 +304,15 @@ class Note:
         :param title: the title of the note (string, mandatory)
         """
         self.__title = Title(title)
+        self._notify('edit_title', title)
 
     def edit_text(self, text: str) -> None:
         """ Replace the Note record Text with the specified one
 
         :param text: the text of the note (string, mandatory)
         """
-        self.delete_tags(*self.__class__.parse_text_for_hashtags(self.__text.value))
-        self.__text = Text(text)
-        self.add_tags(*self.__class__.parse_text_for_hashtags(self.__text.value))
+        new_text = Text(text)
+        self.__tags -= Tags(*self.__class__.parse_text_for_hashtags(self.__text.value))
+        self.__text = new_text
+        self.__tags += Tags(*self.__class__.parse_text_for_hashtags(self.__text.value))
+        self._notify('edit_text', text)
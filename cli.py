@@ -10,7 +10,7 @@ from contact_commands import handle_contact_command
 from note_commands import handle_note_command
 from guess_command.guess_command import handle_command_with_guess
 from guess_command.possible_commands import CONTACT_COMMANDS, NOTE_COMMANDS, GENERAL_COMMANDS
-from storage import init_books_data
+from storage import init_books_data, refresh_data
 
 
 # Ініціалізація кольорового виводу для CLI
@@ -51,8 +51,12 @@ def print_help():
   show contact <name>
   delete contact <name>
   show all contacts
+  show contacts <prefix>
   show birthdays <days>
-  search contact <keyword>
+  search contact <keyword | field:value ...>
+  import contacts <file.csv|file.vcf>
+  show duplicates
+  merge contacts
 
 [НОТАТКИ]
   add note "<title>" "<text>"
@@ -88,6 +92,8 @@ def run_mode(mode_name, prompt, valid_commands, handler, book):
     try:
         while True:
             command = input(prompt).strip()
+            # Зміни, збережені іншими запущеними копіями помічника, підтягуються перед кожною командою
+            refresh_data()
             result = handle_command_with_guess(
                 command, valid_commands + GENERAL_COMMANDS, handler, book, general_command_callback=general_handler
             )
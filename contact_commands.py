@@ -1,7 +1,18 @@
 from colorama import Fore
 from books import AddressBook, Record, address_book_errors
+from books.address_book import QueryTerm
+from contact_import import import_contacts
 
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+# The number of the most relevant contacts shown for the search by a keyword
+SEARCH_RESULTS_LIMIT = 20
+# The address book size from which the duplicate contacts are scored by a pool of processes
+DEDUPE_PARALLEL_SIZE = 10000
+# The search query part: a text in double quotes, a word, a lone double quote or a whitespace
+_QUERY_PART = re.compile(r'"([^"]*)"|([^\s"]+|")|(\s+)')
 
 def _find_record_exact(book: AddressBook, name: str):
     try:
@@ -61,6 +72,59 @@ def _parse_days(parts):
         days = 7
     return days
 
+def _parse_month_day(value: str, last: bool) -> int:
+    match = re.fullmatch(r"(?:(\d{1,2})\.)?(\d{1,2})", value)
+    if not match:
+        raise ValueError(f"Некоректний день народження: {value} (очікується ММ або ДД.ММ)")
+    month = int(match.group(2))
+    day = int(match.group(1)) if match.group(1) else (31 if last else 1)
+    if not 1 <= month <= 12 or not 1 <= day <= 31:
+        raise ValueError(f"Некоректний день народження: {value} (очікується ММ або ДД.ММ)")
+    return month * 100 + day
+
+def _split_query(text: str) -> list[str]:
+    """
+    Розбиває запит пошуку на слова за пробілами. Текст у парних подвійних лапках
+    входить до слова разом із пробілами, а апострофи та непарні лапки — звичайні символи.
+    """
+    tokens = []
+    token = None
+    for match in _QUERY_PART.finditer(text):
+        quoted, word, space = match.groups()
+        if space is not None:
+            if token is not None:
+                tokens.append(token)
+            token = None
+        else:
+            token = (token or "") + (quoted if quoted is not None else word)
+    if token is not None:
+        tokens.append(token)
+    return tokens
+
+def _parse_query(text: str) -> list[QueryTerm]:
+    """
+    Розбирає запит пошуку контактів на умови: слово без поля шукається в усіх полях,
+    поле:значення (name, address, phone, email, birthday) — лише в одному полі,
+    мінус перед умовою виключає контакти, що їй відповідають.
+    """
+    tokens = _split_query(text)
+    terms = []
+    for token in tokens:
+        negated = token.startswith("-") and len(token) > 1
+        if negated:
+            token = token[1:]
+        field, separator, value = token.partition(":")
+        field = field.lower()
+        if not separator or field not in ("name", "address", "phone", "email", "birthday"):
+            field, value = None, token
+        if not value:
+            raise ValueError(f"Порожнє значення умови: {token}")
+        if field == "birthday":
+            first, _, last = value.partition("..")
+            value = (_parse_month_day(first, False), _parse_month_day(last or first, True))
+        terms.append(QueryTerm(field, value, negated))
+    return terms
+
 def handle_contact_command(command: str, book: AddressBook) -> None:
     parts = command.strip().split()
     if not parts:
@@ -132,8 +196,8 @@ def handle_contact_command(command: str, book: AddressBook) -> None:
             print(Fore.RED + f"❌ Контакт з ім'ям '{name}' не знайдено.")
             return
         try:
-            book.delete_record(name)
-            print(Fore.GREEN + f"🗑️ Контакт '{name}' видалено.")
+            book.delete_record(record.name)
+            print(Fore.GREEN + f"🗑️ Контакт '{record.name}' видалено.")
         except Exception as e:
             print(Fore.RED + f"❌ Помилка: {e}")
 
@@ -155,6 +219,17 @@ def handle_contact_command(command: str, book: AddressBook) -> None:
         else:
             print(Fore.YELLOW + "Адресна книга порожня.")
 
+    elif action == "show" and len(parts) >= 2 and parts[1] == "contacts":
+        prefix = " ".join(parts[2:]) if len(parts) > 2 else input(Fore.CYAN + "Введіть початок імені контакта: ").strip()
+        if not prefix:
+            print(Fore.RED + "⚠️ Початок імені не може бути порожнім.")
+            return
+        records: list[Record] = book.prefix(prefix)
+        if records:
+            _print_contacts_table(records)
+        else:
+            print(Fore.YELLOW + f"Немає контактів, ім'я яких починається з '{prefix}'.")
+
     elif parts[0] == "show" and parts[1] == "birthdays":
         days = _parse_days(parts)
         records: list[Record] = [
@@ -166,14 +241,78 @@ def handle_contact_command(command: str, book: AddressBook) -> None:
         else:
             print(Fore.YELLOW + "Немає контактів із днями народження у цей період.")
 
+    elif action == "show" and len(parts) >= 2 and parts[1] == "duplicates":
+        workers = os.cpu_count() or 1
+        executor = ProcessPoolExecutor(workers) if workers > 1 and len(book) >= DEDUPE_PARALLEL_SIZE else None
+        try:
+            candidates = book.find_duplicates(executor=executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if not candidates:
+            print(Fore.YELLOW + "Схожих контактів не знайдено.")
+            return
+        print(Fore.CYAN + "Можливі дублікати (оцінка, контакти, збіги):")
+        for candidate in candidates:
+            print(f"  {candidate.score:.2f}  {candidate.first} ↔ {candidate.second}  ({', '.join(candidate.reasons)})")
+        print(Fore.YELLOW + "Об'єднати контакти можна командою merge contacts.")
+
+    elif action == "merge" and len(parts) >= 2 and parts[1] == "contacts":
+        name = input(Fore.CYAN + "Введіть ім'я контакта, який залишиться: ").strip()
+        duplicate = input(Fore.CYAN + "Введіть ім'я дубліката: ").strip()
+        if not name or not duplicate:
+            print(Fore.RED + "⚠️ Ім'я не може бути порожнім.")
+            return
+        try:
+            record = book.merge_records(name, duplicate)
+        except address_book_errors.ContactNotFound:
+            print(Fore.RED + "❌ Контакт не знайдено.")
+            return
+        print(Fore.GREEN + f"✅ Контакти об'єднано у '{record.name}'.")
+        _print_contacts_table([record])
+
+    elif action == "import" and len(parts) >= 2 and parts[1] == "contacts":
+        path = " ".join(parts[2:]) if len(parts) > 2 else input(Fore.CYAN + "Введіть шлях до файлу CSV або vCard: ").strip()
+        if not path:
+            print(Fore.RED + "⚠️ Шлях не може бути порожнім.")
+            return
+        rejected_path = path + ".rejected.csv"
+        try:
+            report = import_contacts(book, path, rejected_path=rejected_path)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + f"❌ Помилка: {e}")
+            return
+        print(Fore.GREEN + f"✅ Імпортовано контактів: {report.imported}")
+        if report.rejected_count:
+            print(Fore.YELLOW + f"⚠️ Відхилено рядків: {report.rejected_count}")
+            for error, count in report.rejected.most_common():
+                print(Fore.YELLOW + f"  {error}: {count}")
+            for row in report.sample:
+                print(f"  рядок {row.line}: {row.name} — {row.error}")
+            print(Fore.YELLOW + f"Усі відхилені рядки записано у файл {rejected_path}")
+
     elif parts[0] == "search" and parts[1] == "contact":
         keyword = " ".join(parts[2:]) if len(parts) > 2 else input(Fore.CYAN + "Введіть фразу для пошуку: ").strip()
         if not keyword:
             print(Fore.RED + "⚠️ Пошуковий запит не може бути порожнім.")
             return
-        records: list[Record] = book.search(keyword)
+        try:
+            terms = _parse_query(keyword)
+        except ValueError as e:
+            print(Fore.RED + f"⚠️ {e}")
+            return
+        ranked = all(term.field is None and not term.negated for term in terms)
+        if ranked:
+            phrase = " ".join(term.value for term in terms)
+            records: list[Record] = book.search_top(phrase, SEARCH_RESULTS_LIMIT)
+            if not records and (records := book.search_fuzzy(phrase)[:SEARCH_RESULTS_LIMIT]):
+                print(Fore.YELLOW + "Точних збігів немає, схожі імена:")
+        else:
+            records = book.query(terms)
         if records:
             _print_contacts_table(records)
+            if ranked and len(records) == SEARCH_RESULTS_LIMIT:
+                print(Fore.YELLOW + f"Показано {SEARCH_RESULTS_LIMIT} найвідповідніших контактів, уточніть запит.")
         else:
             print(Fore.YELLOW + "Контактів не знайдено.")
 
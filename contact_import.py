@@ -0,0 +1,245 @@
+"""
+Bulk import of contacts from CSV and vCard files.
+
+The files are read as a stream: the rows are turned into validated Record objects in chunks,
+and every chunk is added to the address book in one batch, so the memory used by the import
+does not depend on the file size. The rejected rows are counted, and can be written to a CSV report.
+"""
+
+import os
+import re
+import csv
+import math
+import datetime
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from collections import Counter, namedtuple
+from collections.abc import Iterable, Iterator
+from typing import Optional, TextIO
+
+from books import AddressBook, Record, address_book_errors
+from books.address_book.record import Phone
+from books.commons import ObjectValueError
+
+
+CHUNK_SIZE = 1000
+# Number of the rejected rows kept in the report for displaying, all of them go to the report file
+REJECTED_SAMPLE_SIZE = 10
+
+# CSV column names (lowercase) of the contact fields, the Ukrainian ones match the contacts table of the CLI
+CSV_COLUMNS = {
+    "name": "name", "full name": "name", "ім'я": "name",
+    "phone": "phones", "phones": "phones", "телефон": "phones",
+    "email": "emails", "emails": "emails",
+    "address": "address", "адреса": "address",
+    "birthday": "birthday", "дн": "birthday",
+}
+# Several phones or emails in one CSV cell are separated by commas or semicolons
+CSV_LIST_SEPARATOR = re.compile(r"\s*[;,]\s*")
+
+VCARD_ESCAPES = re.compile(r"\\(.)")
+VCARD_BIRTHDAY_FORMATS = ("%Y-%m-%d", "%Y%m%d", "%d.%m.%Y")
+
+# A contact read from the file: the line it starts on and the raw field values
+ContactRow = namedtuple("ContactRow", ["line", "name", "address", "birthday", "phones", "emails"])
+RejectedRow = namedtuple("RejectedRow", ["line", "name", "error"])
+
+
+class ImportReport:
+    """Result of the import: the number of the added contacts and the rejected rows by their errors"""
+
+    def __init__(self):
+        self.imported: int = 0
+        self.rejected: Counter[str] = Counter()
+        self.sample: list[RejectedRow] = []
+
+    @property
+    def rejected_count(self) -> int:
+        return sum(self.rejected.values())
+
+    def reject(self, row: ContactRow, error: Exception) -> RejectedRow:
+        rejected = RejectedRow(row.line, row.name, str(error))
+        self.rejected[type(error).__name__] += 1
+        if len(self.sample) < REJECTED_SAMPLE_SIZE:
+            self.sample.append(rejected)
+        return rejected
+
+
+def _split(value: Optional[str]) -> list[str]:
+    return [i for i in CSV_LIST_SEPARATOR.split(value.strip()) if i] if value else []
+
+
+def read_csv(file: TextIO) -> Iterator[ContactRow]:
+    """Reads the contacts from the CSV file with a header row, the unknown columns are ignored"""
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [CSV_COLUMNS.get(i.strip().lower()) for i in header]
+    if "name" not in columns:
+        raise ValueError("The CSV file must have the name column")
+    for values in reader:
+        if not any(values):
+            continue
+        fields: dict[str, str] = {}
+        for column, value in zip(columns, values):
+            if column is not None and value.strip():
+                fields[column] = f"{fields[column]};{value}" if column in fields else value
+        yield ContactRow(
+            reader.line_num,
+            fields.get("name", "").strip(),
+            fields.get("address", "").strip() or None,
+            fields.get("birthday", "").strip() or None,
+            _split(fields.get("phones")),
+            _split(fields.get("emails")),
+        )
+
+
+def _vcard_lines(file: TextIO) -> Iterator[tuple[int, str]]:
+    """Private generator of the unfolded vCard content lines with their numbers"""
+    number, current = 0, None
+    for line_number, line in enumerate(file, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield number, current
+        number, current = line_number, line
+    if current is not None:
+        yield number, current
+
+
+def _vcard_value(value: str) -> str:
+    return VCARD_ESCAPES.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _vcard_birthday(value: str) -> str:
+    """Converts the vCard birthday into the DD.MM.YYYY format of the address book, keeping an unknown one as is"""
+    for date_format in VCARD_BIRTHDAY_FORMATS:
+        try:
+            return datetime.datetime.strptime(value[:10], date_format).strftime("%d.%m.%Y")
+        except ValueError:
+            continue
+    return value
+
+
+def read_vcard(file: TextIO) -> Iterator[ContactRow]:
+    """Reads the contacts from the vCard (.vcf) file: the FN (or N), TEL, EMAIL, ADR and BDAY properties"""
+    card: Optional[dict] = None
+    for line_number, line in _vcard_lines(file):
+        prop, _, value = line.partition(":")
+        name = prop.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {"line": line_number, "name": "", "n": "", "address": None, "birthday": None, "phones": [], "emails": []}
+        elif card is None:
+            continue
+        elif name == "END":
+            yield ContactRow(
+                card["line"],
+                card["name"] or card["n"],
+                card["address"],
+                card["birthday"],
+                card["phones"],
+                card["emails"],
+            )
+            card = None
+        elif name == "FN":
+            card["name"] = _vcard_value(value).strip()
+        elif name == "N":
+            # family;given;additional;prefixes;suffixes
+            parts = [_vcard_value(i).strip() for i in re.split(r"(?<!\\);", value)]
+            card["n"] = " ".join(i for i in parts[1:2] + parts[0:1] if i)
+        elif name == "TEL" and value.strip():
+            card["phones"].append(value.strip().removeprefix("tel:"))
+        elif name == "EMAIL" and value.strip():
+            card["emails"].append(value.strip())
+        elif name == "ADR" and card["address"] is None:
+            parts = [_vcard_value(i).strip() for i in re.split(r"(?<!\\);", value)]
+            card["address"] = ", ".join(i for i in parts if i) or None
+        elif name == "BDAY" and value.strip():
+            card["birthday"] = _vcard_birthday(value.strip())
+
+
+def _build_records(
+        rows: list[ContactRow],
+        report: ImportReport,
+        rejected: list[RejectedRow],
+        executor: Optional[Executor] = None,
+        workers: int = 1,
+) -> list[tuple[ContactRow, Record]]:
+    """Private method for validating the contact rows, the invalid ones are added to the report.
+    The phone numbers of all rows are normalized in one batch, in parallel if the executor is given.
+    """
+    raw_phones = [phone for row in rows for phone in row.phones]
+    phones = iter(Phone.prepare_many(raw_phones, executor, chunk_size=max(math.ceil(len(raw_phones) / workers), 1)))
+    records = []
+    for row in rows:
+        row_phones = [next(phones) for _ in row.phones]
+        try:
+            if None in row_phones:
+                raise address_book_errors.ContactPhoneValueError()
+            record = Record(
+                row.name,
+                address=row.address,
+                birthday=row.birthday,
+                phones=[Phone.restore(i) for i in row_phones],
+                emails=row.emails,
+            )
+        except ObjectValueError as e:
+            rejected.append(report.reject(row, e))
+            continue
+        records.append((row, record))
+    return records
+
+
+def _chunks(rows: Iterable[ContactRow], size: int) -> Iterator[list[ContactRow]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_contacts(
+        book: AddressBook,
+        path: Path,
+        rejected_path: Optional[Path] = None,
+        chunk_size: int = CHUNK_SIZE,
+        workers: Optional[int] = None,
+) -> ImportReport:
+    """Imports the contacts from the CSV or vCard (.vcf, .vcard) file into the address book.
+    The contacts with invalid values and the duplicates of the existing names are rejected,
+    and, if the report file path is given, written there with the line numbers and the errors.
+    The phone numbers are normalized by a pool of the given number of processes, one per core by default.
+    """
+    path = Path(path)
+    report = ImportReport()
+    reader = read_vcard if path.suffix.lower() in (".vcf", ".vcard") else read_csv
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    report_file = None
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as file:
+            for chunk in _chunks(reader(file), chunk_size):
+                rejected: list[RejectedRow] = []
+                records = _build_records(chunk, report, rejected, executor, workers)
+                skipped = {id(i) for i in book.add_records(record for _, record in records)}
+                for row, record in records:
+                    if id(record) in skipped:
+                        rejected.append(report.reject(row, address_book_errors.ContactAlreadyExist()))
+                report.imported += len(records) - len(skipped)
+                if rejected and rejected_path is not None:
+                    if report_file is None:
+                        report_file = open(rejected_path, "w", encoding="utf-8", newline="")
+                        csv.writer(report_file).writerow(RejectedRow._fields)
+                    csv.writer(report_file).writerows(sorted(rejected))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if report_file is not None:
+            report_file.close()
+    return report
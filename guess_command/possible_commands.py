@@ -4,8 +4,12 @@ CONTACT_COMMANDS = [
     "show contact",
     "delete contact",
     "show all contacts",
+    "show contacts",
     "show birthdays",
     "search contact",
+    "import contacts",
+    "show duplicates",
+    "merge contacts",
 ]
 
 NOTE_COMMANDS = [
@@ -0,0 +1,819 @@
+"""
+SQLite storage backend for the address book and the note book.
+
+Contacts, phones, emails, notes and tags are kept in indexed tables of a local SQLite file.
+The books keep their mapping API, but the records are hydrated only when a command touches them,
+and every change of a hydrated record is written back immediately.
+"""
+
+import sqlite3
+import datetime
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Optional
+from contextlib import contextmanager
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, MutableMapping, ItemsView, ValuesView
+
+from books import AddressBook, Record, NoteBook, Note
+from books.commons import search_key, BKTree
+from books.address_book import QueryTerm
+from books.address_book.query import QUERY_FIELDS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    address TEXT,
+    birthday TEXT,
+    birthday_md INTEGER,
+    name_folded TEXT NOT NULL,
+    address_folded TEXT NOT NULL DEFAULT '',
+    emails_folded TEXT NOT NULL DEFAULT '',
+    name_normalized TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS contacts_name_folded ON contacts(name_folded);
+CREATE INDEX IF NOT EXISTS contacts_birthday_md ON contacts(birthday_md) WHERE birthday_md IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS phones (
+    contact TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (contact, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS phones_phone ON phones(phone);
+
+CREATE TABLE IF NOT EXISTS emails (
+    contact TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    email_folded TEXT NOT NULL,
+    domain TEXT NOT NULL DEFAULT '',
+    local_part TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (contact, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS emails_email_folded ON emails(email_folded);
+
+CREATE TABLE IF NOT EXISTS name_words (
+    word TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    PRIMARY KEY (word, contact)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS name_words_contact ON name_words(contact);
+
+CREATE TABLE IF NOT EXISTS word_tree (
+    word TEXT PRIMARY KEY,
+    parent TEXT,
+    distance INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS word_tree_parent ON word_tree(parent, distance);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    title_folded TEXT NOT NULL,
+    text_folded TEXT NOT NULL,
+    tags_folded TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS notes_title ON notes(title);
+
+CREATE TABLE IF NOT EXISTS note_tags (
+    note INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (note, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags(tag);
+"""
+
+# Version of the schema and of the search keys stored in the *_folded columns, see migrate()
+SCHEMA_VERSION = 4
+
+# Indexes of the columns added by the migration, created after the columns exist, see migrate()
+MIGRATED_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS contacts_name_normalized ON contacts(name_normalized)",
+    "CREATE INDEX IF NOT EXISTS emails_domain ON emails(domain)",
+    "CREATE INDEX IF NOT EXISTS emails_local_part ON emails(local_part)",
+)
+
+# Trigram full-text index for the substring search, used when the SQLite build has FTS5
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+    name, address, phones, emails, tokenize = 'trigram case_sensitive 1'
+);
+"""
+
+SELECT_CONTACTS = """
+SELECT c.name, c.address, c.birthday,
+    (SELECT group_concat(phone, char(10)) FROM (
+        SELECT phone FROM phones WHERE contact = c.name ORDER BY position)),
+    (SELECT group_concat(email, char(10)) FROM (
+        SELECT email FROM emails WHERE contact = c.name ORDER BY position))
+FROM contacts c
+"""
+
+SELECT_NOTES = """
+SELECT n.id, n.title, n.text, (SELECT group_concat(tag, char(10)) FROM note_tags WHERE note = n.id)
+FROM notes n
+"""
+
+# The search field name -> contacts table column with the search key (see search_key) of the value
+SEARCH_FIELDS = {
+    "name": "c.name_folded",
+    "address": "c.address_folded",
+    "phones": "(SELECT group_concat(phone, char(10)) FROM phones WHERE contact = c.name)",
+    "emails": "c.emails_folded",
+}
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Opens the SQLite database file and creates the schema, if needed"""
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    with connection:
+        connection.executescript(SCHEMA)
+        try:
+            connection.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # No FTS5 or trigram tokenizer in this SQLite build, the search falls back to the table scan
+            pass
+        if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            migrate(connection)
+    return connection
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Upgrades the database created by the previous versions: adds the missing columns
+    and recomputes the stored search keys, which were lower-cased before
+    """
+    contact_columns = {row[1] for row in connection.execute("PRAGMA table_info(contacts)")}
+    for column in ("emails_folded", "name_normalized"):
+        if column not in contact_columns:
+            connection.execute(f"ALTER TABLE contacts ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+    email_columns = {row[1] for row in connection.execute("PRAGMA table_info(emails)")}
+    for column in ("domain", "local_part"):
+        if column not in email_columns:
+            connection.execute(f"ALTER TABLE emails ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+    for statement in MIGRATED_INDEXES:
+        connection.execute(statement)
+    connection.create_function("search_key", 1, search_key, deterministic=True)
+    connection.create_function("email_part", 2, email_part, deterministic=True)
+    connection.create_function("normalize_name", 1, normalize_name, deterministic=True)
+    connection.execute(
+        "UPDATE contacts SET name_folded = search_key(name), name_normalized = normalize_name(name), "
+        "address_folded = search_key(coalesce(address, '')), "
+        "emails_folded = search_key(coalesce((SELECT group_concat(email, char(10)) FROM ("
+        "SELECT email FROM emails WHERE contact = contacts.name ORDER BY position)), ''))"
+    )
+    connection.execute(
+        "UPDATE emails SET domain = email_part(email, 2), local_part = email_part(email, 0)"
+    )
+    fill_name_words(connection)
+    connection.execute(
+        "UPDATE notes SET title_folded = search_key(title), text_folded = search_key(text), "
+        "tags_folded = search_key(tags)"
+    )
+    if has_fts(connection):
+        connection.execute("DELETE FROM contacts_fts")
+        connection.execute(
+            "INSERT INTO contacts_fts (rowid, name, address, phones, emails) "
+            "SELECT c.rowid, c.name_folded, c.address_folded, "
+            f"coalesce({SEARCH_FIELDS['phones']}, ''), c.emails_folded FROM contacts c"
+        )
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def fill_name_words(connection: sqlite3.Connection) -> None:
+    """Rebuilds the contact name words and their BK-tree (see BKTree) from the contact names.
+    The tree nodes are stored with their parent words and distances, the nodes of the removed words are kept
+    for the tree shape, like in BKTree, and their words have no contacts
+    """
+    connection.execute("DELETE FROM name_words")
+    connection.execute("DELETE FROM word_tree")
+    tree = BKTree()
+    words: list[tuple[str, str]] = []
+    for (name,) in connection.execute("SELECT name FROM contacts"):
+        for word in set(normalize_name(name).split()):
+            words.append((word, name))
+            tree.add(word)
+    connection.executemany("INSERT INTO name_words (word, contact) VALUES (?, ?)", words)
+    nodes = list(tree.nodes())
+    parents: list[Optional[str]] = [None] * len(nodes)
+    for word, _, _, first, count in nodes:
+        parents[first:first + count] = [word] * count
+    connection.executemany(
+        "INSERT INTO word_tree (word, parent, distance) VALUES (?, ?, ?)",
+        [(word, parent, distance) for (word, _, distance, _, _), parent in zip(nodes, parents)],
+    )
+
+
+def normalize_name(name: str) -> str:
+    """Returns the contact name in the form of the case-insensitive lookup, see AddressBook._normalize_name"""
+    return " ".join(search_key(name).split())
+
+
+def prefix_stop(prefix: str) -> Optional[str]:
+    """Returns the smallest string greater than all strings starting with the prefix, None if there is none"""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+def email_part(email: str, part: int) -> str:
+    """Returns the lower-cased local part (0) or domain (2) of the email"""
+    return email.lower().rpartition("@")[part]
+
+
+def has_fts(connection: sqlite3.Connection) -> bool:
+    """Checks whether the trigram full-text index is available"""
+    return connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'"
+    ).fetchone() is not None
+
+
+class SQLiteRecords(MutableMapping):
+    """Contact records mapping (name -> Record) backed by the SQLite tables.
+
+    The records are hydrated on access and cached while they are referenced, so the same
+    Record object is returned for repeated lookups and its changes are written back.
+    The hydrated records are passed to the track callback, so their owner book can follow their changes.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, track: Callable[[str, Record], None]):
+        self.connection = connection
+        self.__track_record = track
+        self.fts: bool = has_fts(connection)
+        self.__cache: weakref.WeakValueDictionary[str, Record] = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM contacts").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return (row[0] for row in self.connection.execute("SELECT name FROM contacts ORDER BY name"))
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__cache or self.connection.execute(
+            "SELECT 1 FROM contacts WHERE name = ?", (str(key),)
+        ).fetchone() is not None
+
+    def __getitem__(self, key: str) -> Record:
+        if (record := self.__cache.get(key)) is not None:
+            return record
+        rows = self.select("WHERE c.name = ?", (str(key),))
+        if not rows:
+            raise KeyError(key)
+        return rows[0]
+
+    def __setitem__(self, key: str, record: Record) -> None:
+        with self.connection:
+            self.__add_tree_words(self.__write(key, record))
+        self.__track(key, record)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        with self.connection:
+            self.__delete(key)
+        if (record := self.__cache.pop(key, None)) is not None:
+            record.unsubscribe(self.__write_back)
+
+    def insert(self, records: Iterable[Record]) -> None:
+        """Inserts many new contact records in one transaction"""
+        with self.connection:
+            words: set[str] = set()
+            for record in records:
+                words |= self.__write(record.name, record)
+            self.__add_tree_words(words)
+
+    def items(self) -> ItemsView:
+        return _ContactsItemsView(self)
+
+    def values(self) -> ValuesView:
+        return _ContactsValuesView(self)
+
+    def select(self, where: str = "", params: tuple = ()) -> list[Record]:
+        """Hydrates the contact records selected by the SQL condition, ordered by name"""
+        return [self.__hydrate(row) for row in self.connection.execute(f"{SELECT_CONTACTS} {where} ORDER BY c.name", params)]
+
+    def stream(self) -> Iterator[Record]:
+        """Hydrates all contact records one by one, ordered by name"""
+        return (self.__hydrate(row) for row in self.connection.execute(f"{SELECT_CONTACTS} ORDER BY c.name"))
+
+    def search(self, keyword: str, fields: tuple[str, ...]) -> list[Record]:
+        """Selects the contact records that contain the keyword search key in any of the fields.
+        The candidates come from the trigram index when possible, the final check is done by the caller.
+        """
+        return self.match([(keyword, fields)])
+
+    def match(
+            self,
+            keywords: Iterable[tuple[str, tuple[str, ...]]],
+            conditions: Iterable[tuple[str, tuple]] = (),
+    ) -> list[Record]:
+        """Selects the contact records that contain every keyword search key in any of its fields
+        and meet all SQL conditions, in one query. The keywords of three characters or more are looked up together
+        in the trigram index, which intersects their postings, SQLite starts from the postings or from the index
+        of a condition and checks the rest only for the rows found. The final check is done by the caller.
+        """
+        where: list[str] = []
+        params: list = []
+        phrases: list[str] = []
+        for keyword, fields in keywords:
+            if self.fts and len(keyword) >= 3:
+                phrases.append("{{{}}} : \"{}\"".format(" ".join(fields), keyword.replace('"', '""')))
+            else:
+                where.append("(" + " OR ".join(f"instr({SEARCH_FIELDS[field]}, ?) > 0" for field in fields) + ")")
+                params.extend((keyword,) * len(fields))
+        if phrases:
+            where.insert(0, "c.rowid IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?)")
+            params.insert(0, " AND ".join(phrases))
+        for condition, condition_params in conditions:
+            where.append(f"({condition})")
+            params.extend(condition_params)
+        return self.select("WHERE " + " AND ".join(where) if where else "", tuple(params))
+
+    def fuzzy_keys(self, word: str, max_distance: int) -> dict[str, int]:
+        """Returns the smallest edit distances by the names of the contacts with a name word within the edit distance
+        from the word. The stored BK-tree is walked level by level, one query reads the children of the level nodes,
+        and only the children at the distances close to their parent distance are visited
+        """
+        distances: dict[str, int] = {}
+        level: list[str] = [
+            row[0] for row in self.connection.execute("SELECT word FROM word_tree WHERE parent IS NULL")
+        ]
+        while level:
+            ranges: dict[str, tuple[int, int]] = {}
+            for node_word in level:
+                distance = BKTree.distance(word, node_word)
+                if distance <= max_distance:
+                    distances[node_word] = distance
+                ranges[node_word] = (distance - max_distance, distance + max_distance)
+            level = [
+                child for chunk in self.__chunks(list(ranges))
+                for child, parent, distance in self.connection.execute(
+                    f"SELECT word, parent, distance FROM word_tree WHERE parent IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                if ranges[parent][0] <= distance <= ranges[parent][1]
+            ]
+        found: dict[str, int] = {}
+        # The words of the removed names are kept in the tree, but have no contacts
+        for chunk in self.__chunks(list(distances)):
+            for name_word, key in self.connection.execute(
+                    f"SELECT word, contact FROM name_words WHERE word IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                if distances[name_word] < found.get(key, max_distance + 1):
+                    found[key] = distances[name_word]
+        return found
+
+    @staticmethod
+    def __chunks(values: list) -> Iterator[list]:
+        """Private method for splitting the query parameters to stay within the SQLite host parameters limit"""
+        return (values[i:i + 500] for i in range(0, len(values), 500))
+
+    def __hydrate(self, row: tuple) -> Record:
+        """Private method for building (or taking from the cache) the contact record from the table row"""
+        name, address, birthday, phones, emails = row
+        if (record := self.__cache.get(name)) is not None:
+            return record
+        record = Record(
+            name,
+            address=address,
+            birthday=birthday,
+            phones=phones.split("\n") if phones else None,
+            emails=emails.split("\n") if emails else None,
+        )
+        self.__track(name, record)
+        self.__track_record(name, record)
+        return record
+
+    def __track(self, key: str, record: Record) -> None:
+        """Private method for caching the record and writing its changes back"""
+        record.unsubscribe(self.__write_back)
+        record.subscribe(self.__write_back, key)
+        self.__cache[key] = record
+
+    def __write_back(self, key: str, event: str, *args) -> None:
+        """Private observer that stores the changed contact record.
+        The renamed record is moved under the new name by the owner book, after checking that the name is free.
+        """
+        record = self.__cache.get(key)
+        if record is None or record.name != key:
+            return
+        with self.connection:
+            self.__delete(key)
+            self.__write(key, record)
+
+    def __write(self, key: str, record: Record) -> set[str]:
+        """Private method for inserting the contact record rows, returns the name words to be added to the tree"""
+        keys = record.search_keys
+        birthday: Optional[datetime.date] = record.birthday.value if record.birthday is not None else None
+        cursor = self.connection.execute(
+            "INSERT INTO contacts (name, address, birthday, birthday_md, name_folded, address_folded, emails_folded, "
+            "name_normalized) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                record.address or None,
+                str(record.birthday) if birthday else None,
+                birthday.month * 100 + birthday.day if birthday else None,
+                keys.name,
+                keys.address,
+                emails_folded := search_key("\n".join(record.emails)),
+                normalize_name(key),
+            ),
+        )
+        self.connection.executemany(
+            "INSERT INTO phones (contact, position, phone) VALUES (?, ?, ?)",
+            [(key, position, phone) for position, phone in enumerate(record.phones)],
+        )
+        self.connection.executemany(
+            "INSERT INTO emails (contact, position, email, email_folded, domain, local_part) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (key, position, email, email.lower(), email_part(email, 2), email_part(email, 0))
+                for position, email in enumerate(record.emails)
+            ],
+        )
+        words = set(normalize_name(key).split())
+        self.connection.executemany(
+            "INSERT INTO name_words (word, contact) VALUES (?, ?)", [(word, key) for word in words]
+        )
+        if self.fts:
+            self.connection.execute(
+                "INSERT INTO contacts_fts (rowid, name, address, phones, emails) VALUES (?, ?, ?, ?, ?)",
+                (
+                    cursor.lastrowid,
+                    keys.name,
+                    keys.address,
+                    "\n".join(record.phones),
+                    emails_folded,
+                ),
+            )
+        return words
+
+    def __add_tree_words(self, words: set[str]) -> None:
+        """Private method for adding the name words missing in the stored BK-tree, like BKTree.add.
+        The tree is walked by a query per visited node, a large batch reads all nodes at once instead
+        """
+        children: Optional[dict[tuple[Optional[str], int], str]] = None
+        if len(words) > 100:
+            children = {
+                (parent, distance): word
+                for word, parent, distance in self.connection.execute("SELECT word, parent, distance FROM word_tree")
+            }
+            words = words.difference(children.values())
+        else:
+            words = words.difference(
+                row[0] for chunk in self.__chunks(list(words)) for row in self.connection.execute(
+                    f"SELECT word FROM word_tree WHERE word IN ({', '.join('?' * len(chunk))})", chunk
+                )
+            )
+        for word in words:
+            # The root node has no parent and the distance 0
+            parent, distance = None, 0
+            while (node := self.__tree_child(children, parent, distance)) is not None:
+                parent, distance = node, BKTree.distance(word, node)
+            self.connection.execute(
+                "INSERT INTO word_tree (word, parent, distance) VALUES (?, ?, ?)", (word, parent, distance)
+            )
+            if children is not None:
+                children[parent, distance] = word
+
+    def __tree_child(
+            self, children: Optional[dict[tuple[Optional[str], int], str]], parent: Optional[str], distance: int
+    ) -> Optional[str]:
+        """Private method for getting the child node word of the stored BK-tree at the distance from the parent,
+        from the read nodes, if they have been read
+        """
+        if children is not None:
+            return children.get((parent, distance))
+        row = self.connection.execute(
+            "SELECT word FROM word_tree WHERE parent IS ? AND distance = ?", (parent, distance)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def __delete(self, key: str) -> None:
+        """Private method for deleting the contact record rows"""
+        if self.fts:
+            self.connection.execute(
+                "DELETE FROM contacts_fts WHERE rowid IN (SELECT rowid FROM contacts WHERE name = ?)", (key,)
+            )
+        self.connection.execute("DELETE FROM phones WHERE contact = ?", (key,))
+        self.connection.execute("DELETE FROM emails WHERE contact = ?", (key,))
+        self.connection.execute("DELETE FROM name_words WHERE contact = ?", (key,))
+        self.connection.execute("DELETE FROM contacts WHERE name = ?", (key,))
+
+
+class _ContactsItemsView(ItemsView):
+    def __iter__(self):
+        return ((record.name, record) for record in self._mapping.stream())
+
+
+class _ContactsValuesView(ValuesView):
+    def __iter__(self):
+        return self._mapping.stream()
+
+
+class SQLiteAddressBook(AddressBook):
+    """Address book that keeps the contact records in the SQLite database"""
+
+    def __init__(self, connection: sqlite3.Connection, upcoming_birthdays_period: int = 7):
+        super().__init__(upcoming_birthdays_period=upcoming_birthdays_period)
+        self.data: SQLiteRecords = SQLiteRecords(connection, self._track)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def items(self) -> ItemsView:
+        return self.data.items()
+
+    def values(self) -> ValuesView:
+        return self.data.values()
+
+    def add_records(self, contacts: Iterable[Record]) -> list[Record]:
+        added: list[Record] = []
+        skipped: list[Record] = []
+        names: set[str] = set()
+        for contact in contacts:
+            if contact.name in names or contact.name in self.data:
+                skipped.append(contact)
+                continue
+            names.add(contact.name)
+            added.append(contact)
+        # One transaction for the whole batch
+        self.data.insert(added)
+        self._forget_indexes()
+        if added:
+            self._notify('add_records', added)
+        return skipped
+
+    def range(self, start: Optional[str] = None, stop: Optional[str] = None) -> list[Record]:
+        # The range of the names primary key index is selected instead of sorting all names
+        where: list[str] = []
+        params: list[str] = []
+        if start is not None:
+            where.append("c.name >= ?")
+            params.append(start)
+        if stop is not None:
+            where.append("c.name < ?")
+            params.append(stop)
+        return self.data.select("WHERE " + " AND ".join(where) if where else "", tuple(params))
+
+    def prefix(self, prefix: str) -> list[Record]:
+        return self.range(prefix, prefix_stop(prefix))
+
+    def _keys_by_name_prefix(self, prefix: str, limit: int) -> list[str]:
+        stop = prefix_stop(prefix)
+        return [row[0] for row in self.data.connection.execute(
+            "SELECT name FROM contacts WHERE name_normalized > ?"
+            + (" AND name_normalized < ?" if stop is not None else "")
+            + " ORDER BY name_normalized, name LIMIT ?",
+            (prefix, stop, limit) if stop is not None else (prefix, limit),
+        )]
+
+    def _keys_by_normalized_name(self, normalized: str) -> set[str]:
+        return {row[0] for row in self.data.connection.execute(
+            "SELECT name FROM contacts WHERE name_normalized = ?", (normalized,)
+        )}
+
+    def _fuzzy_candidates(self, word: str, max_distance: int) -> dict[str, int]:
+        # The name words are looked up in the tree stored in the database, so the tree is not built in every session
+        return self.data.fuzzy_keys(word, max_distance)
+
+    def _birthday_candidates(self, today: datetime.date, upcoming_birthdays_period: int) -> Iterator[Record]:
+        month_days = self._birthday_month_days(today, upcoming_birthdays_period)
+        placeholders = ", ".join("?" * len(month_days))
+        return iter(self.data.select(f"WHERE c.birthday_md IN ({placeholders})", tuple(month_days)))
+
+    def _records_by_phones(self, phones: Iterable[str]) -> dict[str, list[Record]]:
+        phones = list(phones)
+        found: dict[str, list[Record]] = defaultdict(list)
+        # Chunked to stay within the SQLite host parameters limit
+        for i in range(0, len(phones), 500):
+            chunk = phones[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for record in self.data.select(
+                    f"WHERE c.name IN (SELECT contact FROM phones WHERE phone IN ({placeholders}))", tuple(chunk)
+            ):
+                for phone in set(record.phones).intersection(chunk):
+                    found[phone].append(record)
+        return dict(found)
+
+    def _records_by_email(self, email: str) -> list[Record]:
+        return self.data.select("WHERE c.name IN (SELECT contact FROM emails WHERE email_folded = ?)", (email,))
+
+    def _records_by_domain(self, domain: str) -> list[Record]:
+        return self.data.select("WHERE c.name IN (SELECT contact FROM emails WHERE domain = ?)", (domain,))
+
+    def _records_by_local_part(self, local_part: str) -> list[Record]:
+        return self.data.select("WHERE c.name IN (SELECT contact FROM emails WHERE local_part = ?)", (local_part,))
+
+    def _email_domains(self) -> dict[str, int]:
+        return dict(self.data.connection.execute(
+            "SELECT domain, COUNT(DISTINCT contact) FROM emails GROUP BY domain"
+        ))
+
+    def _query_candidates(self, terms: list[QueryTerm]) -> Optional[Iterable[Record]]:
+        # All terms are selected by one query, so only the records matching all of them are hydrated,
+        # the negated terms are checked by the caller
+        if not terms:
+            return None
+        keywords: list[tuple[str, tuple[str, ...]]] = []
+        conditions: list[tuple[str, tuple]] = []
+        for term in terms:
+            if term.field == "birthday":
+                first, last = term.value
+                condition = "BETWEEN ? AND ?" if first <= last else ">= ? OR c.birthday_md <= ?"
+                conditions.append((f"c.birthday_md {condition}", (first, last)))
+            elif (domain := term.domain) is not None:
+                conditions.append(("c.name IN (SELECT contact FROM emails WHERE domain = ?)", (domain,)))
+            else:
+                keywords.append((term.value, QUERY_FIELDS[term.field]))
+        return self.data.match(keywords, conditions)
+
+    def __search(self, keyword: str, *fields: str) -> list[Record]:
+        """Private method for the indexed search with the check of the candidates cached search keys"""
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        found: list[Record] = []
+        for record in self.data.search(keyword, fields):
+            keys = record.search_keys
+            if (
+                    "name" in fields and keyword in keys.name
+                    or "address" in fields and keyword in keys.address
+                    or "phones" in fields and keyword in keys.phones
+                    or "emails" in fields and keyword in keys.emails
+            ):
+                found.append(record)
+        return found
+
+    def search_by_name(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name")
+
+    def search_by_address(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "address")
+
+    def search_by_phone(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "phones")
+
+    def search_by_email(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "emails")
+
+    def search(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name", "address", "phones", "emails")
+
+
+class SQLiteNotes(MutableMapping):
+    """Note records mapping (index -> Note) backed by the SQLite tables, hydrated on access"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.__cache: weakref.WeakValueDictionary[int, Note] = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return (row[0] for row in self.connection.execute("SELECT id FROM notes ORDER BY id"))
+
+    def __contains__(self, key: Any) -> bool:
+        return self.connection.execute("SELECT 1 FROM notes WHERE id = ?", (key,)).fetchone() is not None
+
+    def __getitem__(self, key: int) -> Note:
+        if (note := self.__cache.get(key)) is not None:
+            return note
+        rows = self.select("WHERE n.id = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return rows[0][1]
+
+    def __setitem__(self, key: int, note: Note) -> None:
+        with self.connection:
+            self.__write(key, note)
+        self.__track(key, note)
+
+    def __delitem__(self, key: int) -> None:
+        if key not in self:
+            raise KeyError(key)
+        with self.connection:
+            self.__delete(key)
+        if (note := self.__cache.pop(key, None)) is not None:
+            note.unsubscribe(self.__write_back)
+
+    def insert(self, notes: Iterable[tuple[int, Note]]) -> None:
+        """Inserts many new notes with their indices in one transaction"""
+        with self.connection:
+            for index, note in notes:
+                self.__write(index, note)
+
+    def __reversed__(self) -> Iterator[int]:
+        return (row[0] for row in self.connection.execute("SELECT id FROM notes ORDER BY id DESC"))
+
+    def items(self) -> ItemsView:
+        return _NotesItemsView(self)
+
+    def values(self) -> ValuesView:
+        return _NotesValuesView(self)
+
+    def select(self, where: str = "", params: tuple = ()) -> list[tuple[int, Note]]:
+        """Hydrates the notes selected by the SQL condition, ordered by index"""
+        return [self.__hydrate(row) for row in self.connection.execute(f"{SELECT_NOTES} {where} ORDER BY n.id", params)]
+
+    def stream(self) -> Iterator[tuple[int, Note]]:
+        """Hydrates all notes one by one, ordered by index"""
+        return (self.__hydrate(row) for row in self.connection.execute(f"{SELECT_NOTES} ORDER BY n.id"))
+
+    def __hydrate(self, row: tuple) -> tuple[int, Note]:
+        """Private method for building (or taking from the cache) the note from the table row"""
+        index, title, text, tags = row
+        if (note := self.__cache.get(index)) is None:
+            note = Note(title, text, tags=tags.split("\n") if tags else None, hashtags=False)
+            self.__track(index, note)
+        return index, note
+
+    def __track(self, key: int, note: Note) -> None:
+        """Private method for caching the note and writing its changes back"""
+        note.unsubscribe(self.__write_back)
+        note.subscribe(self.__write_back, key)
+        self.__cache[key] = note
+
+    def __write_back(self, key: int, event: str, *args) -> None:
+        """Private observer that stores the changed note"""
+        if (note := self.__cache.get(key)) is not None:
+            with self.connection:
+                self.__delete(key)
+                self.__write(key, note)
+
+    def __write(self, key: int, note: Note) -> None:
+        """Private method for inserting the note rows"""
+        self.connection.execute(
+            "INSERT INTO notes (id, title, text, tags, title_folded, text_folded, tags_folded) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, note.title, note.text, note.tags, *note.search_keys),
+        )
+        self.connection.executemany(
+            "INSERT INTO note_tags (note, tag) VALUES (?, ?)", [(key, tag) for tag in note.tags_list]
+        )
+
+    def __delete(self, key: int) -> None:
+        """Private method for deleting the note rows"""
+        self.connection.execute("DELETE FROM note_tags WHERE note = ?", (key,))
+        self.connection.execute("DELETE FROM notes WHERE id = ?", (key,))
+
+
+class _NotesItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.stream()
+
+
+class _NotesValuesView(ValuesView):
+    def __iter__(self):
+        return (note for _, note in self._mapping.stream())
+
+
+class SQLiteNoteBook(NoteBook):
+    """Note book that keeps the notes in the SQLite database"""
+
+    def __init__(self, connection: sqlite3.Connection, unique_titles: bool = False):
+        super().__init__(unique_titles=unique_titles)
+        self.data: SQLiteNotes = SQLiteNotes(connection)
+
+    def keys(self):
+        return self.data.keys()
+
+    def items(self) -> ItemsView:
+        return self.data.items()
+
+    def values(self) -> ValuesView:
+        return self.data.values()
+
+    def __search(self, keyword: str, *columns: str) -> list[tuple[int, Note]]:
+        """Private method for the search of the keyword search key in the note columns"""
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        condition = " OR ".join(f"instr(n.{column}, ?) > 0" for column in columns)
+        return self.data.select(f"WHERE {condition}", (keyword,) * len(columns))
+
+    def search_by_title(self, keyword: str) -> list[tuple[int, Note]]:
+        return self.__search(keyword, "title_folded")
+
+    def search_by_text(self, keyword: str) -> list[tuple[int, Note]]:
+        return self.__search(keyword, "text_folded")
+
+    def search_by_tag(self, keyword: str) -> list[tuple[int, Note]]:
+        return self.__search(keyword, "tags_folded")
+
+    def search(self, keyword: str) -> list[tuple[int, Note]]:
+        return self.__search(keyword, "title_folded", "text_folded", "tags_folded")
+
+
+@contextmanager
+def open_books(path: Path) -> Iterator[tuple[SQLiteAddressBook, SQLiteNoteBook]]:
+    """Context manager for the address book and note book stored in the SQLite database file"""
+    connection = connect(path)
+    try:
+        yield SQLiteAddressBook(connection), SQLiteNoteBook(connection)
+    finally:
+        connection.close()
@@ -1,26 +1,1600 @@
+import abc
+import gc
+import os
+import sys
+import mmap
+import heapq
+import bisect
 import pickle
+import stat
+import struct
+import datetime
+import tempfile
+import threading
+import time
+import weakref
+from array import array
+from itertools import groupby
 from pathlib import Path
+from operator import itemgetter
 from contextlib import contextmanager
-from books import AddressBook
-from books import NoteBook
+from typing import Any, Callable, Optional
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, MutableMapping, ItemsView, ValuesView
+from books import AddressBook, Record
+from books.commons import TrigramIndex, BucketIndex, BKTree, search_key
+from books.address_book import ColumnarAddressBook, QueryTerm
+from books.address_book.query import QUERY_FIELDS
+from books import NoteBook, Note
+import sqlite_storage
 
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
-DATA_FILE = Path("data.pkl")
 
+DATA_FILE = Path("data.snapshot")
+# The pickle data file of the previous versions, converted into the snapshot on the first load
+LEGACY_DATA_FILE = Path("data.pkl")
+JOURNAL_FILE = Path("data.journal")
+SQLITE_FILE = Path("data.sqlite3")
+# Advisory lock shared by the assistant processes using the same data files
+LOCK_FILE = Path("data.lock")
 
-def save_data(address_book: AddressBook, note_book: NoteBook):
-    """Serializes and saves the address book and note book to a file."""
-    with open(DATA_FILE, "wb") as f:
-        pickle.dump({"contacts": address_book, "notes": note_book}, f)
+# Storage backend: "file" (binary snapshot with the change journal) or "sqlite" (records loaded on demand)
+STORAGE_BACKEND = os.environ.get("ASSISTANT_STORAGE", "file")
 
+# The journal is folded into a fresh snapshot when it grows over the threshold (bytes)
+COMPACTION_THRESHOLD = 1024 * 1024
+COMPACTION_INTERVAL = 30.0
 
-def load_data() -> tuple[AddressBook, NoteBook]:
-    """Loads address book and note book or creates new ones"""
+# Snapshot loading: "lazy" maps the snapshot file into memory and builds the records on access,
+# "eager" reads the whole books, "columnar" reads the contacts into the columns of the ColumnarAddressBook.
+# Windows does not allow replacing a mapped file, so it loads eagerly
+SNAPSHOT_LOADING = os.environ.get("ASSISTANT_SNAPSHOT_LOADING", "lazy" if os.name == "posix" else "eager")
+
+# The changes are made durable a few seconds after the last mutation, but not later than the maximum delay
+AUTOSAVE_DELAY = 3.0
+AUTOSAVE_MAX_DELAY = 15.0
+
+
+def _fsync_directory(path: Path) -> None:
+    """Makes the created, renamed or removed directory entries durable, where the platform supports it"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _apply_change(book: AddressBook | NoteBook, event: str, args: tuple) -> None:
+    """Applies one logged change to the book by calling the same mutator again.
+    A change made by another process to its outdated copy of the book may conflict with the changes
+    logged before it (e.g. an edit of a deleted contact), such a change is skipped.
+    """
+    try:
+        if event in ("record", "note"):
+            key, item_event, *item_args = args
+            getattr(book.data[key], item_event)(*item_args)
+        else:
+            getattr(book, event)(*args)
+    except (KeyError, ValueError):
+        pass
+
+
+def _lock_file(fd: int, exclusive: bool) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return
+    # Windows has no shared locks, the readers take the exclusive one too.
+    # The locked byte is past the lock state, which stays readable for the other processes
+    os.lseek(fd, DataLock.STATE.size, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after 10 seconds
+            continue
+
+
+def _unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    os.lseek(fd, DataLock.STATE.size, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class DataLock:
+    """Advisory lock of the data files shared by the assistant processes: many readers or one writer.
+
+    The lock file also keeps the generation counter, incremented by every journal write, and the number
+    of the current journal segment. A running session compares the counter with the one it has seen
+    to find out cheaply whether the other processes have changed anything.
+    The lock is reentrant within the process, but the shared lock can not be upgraded to the exclusive one.
+    """
+
+    # generation counter, current journal segment
+    STATE = struct.Struct("<QQ")
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or LOCK_FILE
+        self.__mutex = threading.RLock()
+        self.__fd: Optional[int] = None
+        self.__depth = 0
+        self.__exclusive = False
+
+    @contextmanager
+    def __hold(self, exclusive: bool) -> Iterator[None]:
+        """Private context manager that takes the lock, the lock file is open while the lock is held"""
+        with self.__mutex:
+            if self.__depth and exclusive and not self.__exclusive:
+                raise RuntimeError("The shared data lock can not be upgraded to the exclusive one")
+            if not self.__depth:
+                self.__fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+                try:
+                    _lock_file(self.__fd, exclusive)
+                except BaseException:
+                    os.close(self.__fd)
+                    raise
+                self.__exclusive = exclusive
+            self.__depth += 1
+            try:
+                yield
+            finally:
+                self.__depth -= 1
+                if not self.__depth:
+                    _unlock_file(self.__fd)
+                    os.close(self.__fd)
+                    self.__fd = None
+
+    def shared(self):
+        """Context manager for reading the data files"""
+        return self.__hold(False)
+
+    def exclusive(self):
+        """Context manager for changing the data files"""
+        return self.__hold(True)
+
+    def read(self) -> tuple[int, int]:
+        """Returns the generation counter and the current journal segment number"""
+        with self.__mutex:
+            if self.__fd is not None:
+                os.lseek(self.__fd, 0, os.SEEK_SET)
+                data = os.read(self.__fd, self.STATE.size)
+            else:
+                try:
+                    with open(self.path, "rb") as f:
+                        data = f.read(self.STATE.size)
+                except FileNotFoundError:
+                    data = b""
+        return self.STATE.unpack(data) if len(data) == self.STATE.size else (0, 0)
+
+    def write(self, generation: int, journal_seq: int) -> None:
+        """Stores the generation counter and the current journal segment number, the exclusive lock must be held"""
+        with self.__mutex:
+            if not self.__depth or not self.__exclusive:
+                raise RuntimeError("The data lock state is changed without the exclusive lock")
+            os.lseek(self.__fd, 0, os.SEEK_SET)
+            os.write(self.__fd, self.STATE.pack(generation, journal_seq))
+
+
+class Journal:
+    """Append-only log of the books changes, replayed on top of the last saved snapshot.
+
+    Every change is written as one small pickled entry (book, event, args), so the cost of
+    persisting an edit does not depend on the book size. The log is split into numbered segments
+    (data.journal.1, data.journal.2, ...): the snapshot remembers the last segment folded into it,
+    and the compaction freezes the current segment while the new changes go to the next one.
+
+    Several processes may share the journal: the writes are serialized by the data lock, and every
+    process follows the entries appended by the others from the position it has applied so far.
+    """
+
+    def __init__(self, path: Optional[Path] = None, lock: Optional[DataLock] = None):
+        self.path = path or JOURNAL_FILE
+        self.lock = lock or DataLock()
+        self.seq: int = max((seq for seq, _ in self.segments()), default=0)
+        # The end of the journal part applied to the books, and the lock generation it corresponds to
+        self.position: tuple[int, int] = (self.seq, 0)
+        self.generation: int = 0
+        # Own entries written after the changes of the other processes, skipped when following the journal
+        self.__own: set[tuple[int, int]] = set()
+
+    def segment(self, seq: int) -> Path:
+        """Returns the file path of the journal segment"""
+        return self.path.with_name(f"{self.path.name}.{seq}")
+
+    def segments(self) -> list[tuple[int, Path]]:
+        """Returns the existing journal segments ordered by their numbers"""
+        segments = []
+        for path in self.path.parent.glob(f"{self.path.name}.*"):
+            suffix = path.name[len(self.path.name) + 1:]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return sorted(segments)
+
+    def size(self) -> int:
+        """Returns the total size of the journal segments in bytes"""
+        return sum(path.stat().st_size for _, path in self.segments())
+
+    def attach(self, address_book: AddressBook, note_book: NoteBook) -> None:
+        """Starts logging the changes of the books"""
+        address_book.subscribe(self.append, "contacts")
+        note_book.subscribe(self.append, "notes")
+
+    def detach(self, address_book: AddressBook, note_book: NoteBook) -> None:
+        """Stops logging the changes of the books"""
+        address_book.unsubscribe(self.append)
+        note_book.unsubscribe(self.append)
+
+    def __segment_size(self, seq: int) -> int:
+        try:
+            return self.segment(seq).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, book: str, event: str, *args: Any) -> None:
+        """Appends one change entry to the current segment and flushes it to the operating system"""
+        entry = pickle.dumps((book, event, args), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock.exclusive():
+            generation, seq = self.lock.read()
+            # Another process may have started the next segment
+            self.seq = max(self.seq, seq)
+            with open(self.segment(self.seq), "ab") as f:
+                offset = f.tell()
+                f.write(entry)
+            self.lock.write(generation + 1, self.seq)
+            if generation == self.generation and self.position == (self.seq, offset):
+                self.generation = generation + 1
+                self.position = (self.seq, offset + len(entry))
+            else:
+                self.__own.add((self.seq, offset))
+
+    def sync(self) -> None:
+        """Forces the written journal segments to the disk"""
+        for _, path in self.segments():
+            try:
+                with open(path, "r+b") as f:
+                    os.fsync(f.fileno())
+            except FileNotFoundError:
+                # The segment has just been folded into the snapshot
+                continue
+        _fsync_directory(self.path.parent)
+
+    def rotate(self) -> int:
+        """Freezes the current segment and starts the next one
+
+        :return: the number of the frozen segment (int)
+        """
+        with self.lock.exclusive():
+            generation, seq = self.lock.read()
+            frozen = max(self.seq, seq)
+            self.seq = frozen + 1
+            self.lock.write(generation + 1, self.seq)
+            if generation == self.generation and self.position == (frozen, self.__segment_size(frozen)):
+                self.generation = generation + 1
+                self.position = (self.seq, 0)
+            return frozen
+
+    def synced(self, last: int, snapshot_seq: int) -> None:
+        """Marks the whole journal as applied to the books after loading them, the data lock must be held
+
+        :param last: the number of the last applied segment (int, mandatory)
+        :param snapshot_seq: the number of the last segment folded into the snapshot (int, mandatory)
+        """
+        generation, seq = self.lock.read()
+        self.seq = max(last, snapshot_seq + 1, seq)
+        self.position = (self.seq, self.__segment_size(self.seq))
+        self.generation = generation
+        self.__own.clear()
+
+    def changed(self) -> bool:
+        """Returns whether the other processes have changed the journal since the last synchronization"""
+        return self.lock.read()[0] != self.generation
+
+    def follow(self, address_book: AddressBook, note_book: NoteBook) -> bool:
+        """Applies the entries appended by the other processes after the synchronized position to the books,
+        the data lock must be held and the journal detached from the books
+
+        :return: False if the unread entries have already been folded into the snapshot (bool)
+        """
+        generation, current = self.lock.read()
+        seq, offset = self.position
+        if not self.segment(seq).exists() and _snapshot_seq() >= seq:
+            return False
+        books = {"contacts": address_book, "notes": note_book}
+        for segment_seq, path in self.segments():
+            if segment_seq < seq:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset if segment_seq == seq else 0)
+                while True:
+                    entry_offset = f.tell()
+                    try:
+                        book, event, args = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError):
+                        break
+                    if (segment_seq, entry_offset) in self.__own:
+                        self.__own.discard((segment_seq, entry_offset))
+                        continue
+                    _apply_change(books[book], event, args)
+            self.position = (segment_seq, entry_offset)
+        if self.position[0] < current:
+            self.position = (current, 0)
+        self.seq = max(self.seq, current)
+        self.generation = generation
+        return True
+
+    def replay(self, address_book: AddressBook, note_book: NoteBook, after: int = -1, upto: Optional[int] = None) -> int:
+        """Applies the logged changes of the segments after (and up to) the given numbers to the books.
+        A torn entry at the end of a segment (interrupted write) is cut off.
+
+        :return: the number of the last applied segment, or after if there were none (int)
+        """
+        books = {"contacts": address_book, "notes": note_book}
+        last = after
+        for seq, path in self.segments():
+            if seq <= after or upto is not None and seq > upto:
+                continue
+            with open(path, "r+b") as f:
+                while True:
+                    offset = f.tell()
+                    try:
+                        book, event, args = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError):
+                        f.truncate(offset)
+                        break
+                    _apply_change(books[book], event, args)
+            last = seq
+        return last
+
+    def remove(self, upto: int) -> None:
+        """Removes the segments that have been folded into the snapshot"""
+        for seq, path in self.segments():
+            if seq <= upto:
+                path.unlink(missing_ok=True)
+
+
+class SnapshotFormatError(ValueError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+# Binary snapshot layout (little-endian):
+#   header:    magic, format version, number of sections, last journal segment folded into the snapshot
+#   sections:  (tag, offset, length) for each section, followed by the section data
+#   META:      address book and note book settings
+#   STRS:      interned string table, the (count + 1) string end offsets followed by the UTF-8 data
+#   CONT:      contact rows sorted by key: key, name and address string ids, birthday day ordinal (0 if none),
+#              first position and count of the phones and of the emails
+#   PHON/MAIL: string ids of the E.164 phone numbers and of the emails, referenced by the contact rows
+#   NOTE:      note rows sorted by index: index, title and text string ids, first position and count of the tags
+#   NTAG:      string ids of the note tags, referenced by the note rows
+#   FOLD:      string id of the search key (see search_key) of every string of the contact rows, SNAPSHOT_NONE
+#              for the other strings, the keys are interned in the string table too. Optional, the snapshots
+#              of the previous versions have none, then the keys are computed by the search
+#   TRGM:      trigram rows sorted by the trigram: its three code points, first position and count of the contact rows
+#              containing it (see TrigramIndex), the search index of the contact rows. Optional, like FOLD
+#   TPOS:      numbers of the contact rows of the trigrams, ascending for every trigram, referenced by the trigram rows
+#   WORD:      BK-tree nodes of the normalized contact name words (see BKTree) in the breadth-first order: word
+#              string id, distance from the parent word, first child node and number of the children, first position
+#              and count of the contact rows with the word (none for the removed words kept for the tree shape).
+#              Optional, like FOLD
+#   WPOS:      numbers of the contact rows of the name words, ascending for every word, referenced by the word nodes
+#   PIDX:      (phone number string id, contact row) pairs sorted by the phone number and the row, the contact rows
+#              with a phone number are found by the binary search. Optional, like FOLD
+#   EIDX/DIDX/LIDX: (string id, contact row) pairs of the lower-cased emails, of the email domains and of the email
+#              local parts, sorted like PIDX. Optional, like FOLD
+SNAPSHOT_MAGIC = b"PABOOKS\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHHq")
+SNAPSHOT_SECTION = struct.Struct("<4sQQ")
+SNAPSHOT_META = struct.Struct("<IB")
+SNAPSHOT_CONTACT = struct.Struct("<IIIiIHIH")
+SNAPSHOT_NOTE = struct.Struct("<IIIIH")
+SNAPSHOT_TRIGRAM = struct.Struct("<IIIII")
+SNAPSHOT_WORD = struct.Struct("<IIIIII")
+SNAPSHOT_POSTING = struct.Struct("<II")
+SNAPSHOT_NONE = 0xFFFFFFFF
+
+
+def _pack_ids(ids: array) -> bytes:
+    """Packs the array of unsigned 32-bit ids in the little-endian order"""
+    if sys.byteorder == "big":
+        ids = array("I", ids)
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def _unpack_ids(data: bytes) -> array:
+    """Unpacks the array of unsigned 32-bit ids in the little-endian order"""
+    ids = array("I")
+    ids.frombytes(data)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids
+
+
+class _StringTable:
+    """Interned string table of the snapshot, every distinct string is stored once"""
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.offsets: array = array("I", [0])
+        self.data = bytearray()
+        self.folds: dict[int, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return SNAPSHOT_NONE
+        if (string_id := self.ids.get(value)) is None:
+            string_id = self.ids[value] = len(self.ids)
+            self.data += value.encode("utf-8", "surrogatepass")
+            self.offsets.append(len(self.data))
+        return string_id
+
+    def add_searched(self, value: Optional[str]) -> int:
+        """Adds the searched string together with its search key"""
+        string_id = self.add(value)
+        if value is not None and string_id not in self.folds:
+            self.folds[string_id] = self.add(search_key(value))
+        return string_id
+
+    def pack(self) -> bytes:
+        return struct.pack("<I", len(self.ids)) + _pack_ids(self.offsets) + bytes(self.data)
+
+    def pack_folds(self) -> bytes:
+        return _pack_ids(array("I", (self.folds.get(i, SNAPSHOT_NONE) for i in range(len(self.ids)))))
+
+
+def _ids_view(data: memoryview) -> array | memoryview:
+    """Returns the sequence of the unsigned 32-bit ids of the section, without copying it if the byte order allows"""
+    return data.cast("I") if sys.byteorder == "little" and array("I").itemsize == 4 else _unpack_ids(data)
+
+
+def _unpack_strings(data: memoryview) -> list[str]:
+    """Decodes the whole string table of the snapshot"""
+    count, = struct.unpack_from("<I", data)
+    offsets = _unpack_ids(data[4:4 + (count + 1) * 4])
+    blob = bytes(data[4 + (count + 1) * 4:])
+    return [blob[start:end].decode("utf-8", "surrogatepass") for start, end in zip(offsets, offsets[1:])]
+
+
+def _pack_postings(strings: _StringTable, postings: list[tuple[str, int]]) -> bytes:
+    """Packs the (value, contact row) postings sorted by the value, for the binary search of the value"""
+    return b"".join(SNAPSHOT_POSTING.pack(strings.add(value), row) for value, row in sorted(postings))
+
+
+def pack_snapshot(address_book: AddressBook, note_book: NoteBook, journal_seq: int) -> bytes:
+    """Serializes the books into the binary snapshot"""
+    strings = _StringTable()
+
+    contacts = bytearray()
+    phones, emails = array("I"), array("I")
+    postings: defaultdict[str, array] = defaultdict(lambda: array("I"))
+    name_words: defaultdict[str, array] = defaultdict(lambda: array("I"))
+    phone_postings: list[tuple[str, int]] = []
+    email_postings: list[tuple[str, int]] = []
+    domain_postings: list[tuple[str, int]] = []
+    local_part_postings: list[tuple[str, int]] = []
+    for row, key in enumerate(sorted(address_book.data)):
+        record = address_book.data[key]
+        for trigram in TrigramIndex.trigrams(record.name, record.address, *record.phones, *record.emails):
+            postings[trigram].append(row)
+        for word in set(address_book._normalize_name(key).split()):
+            name_words[word].append(row)
+        phone_postings.extend((phone, row) for phone in set(record.phones))
+        folded_emails = {email.lower() for email in record.emails}
+        email_postings.extend((email, row) for email in folded_emails)
+        domain_postings.extend((domain, row) for domain in {email.rpartition("@")[2] for email in folded_emails})
+        local_part_postings.extend((part, row) for part in {email.rpartition("@")[0] for email in folded_emails})
+        birthday: Optional[datetime.date] = record.birthday.value if record.birthday is not None else None
+        contacts += SNAPSHOT_CONTACT.pack(
+            strings.add(key),
+            strings.add_searched(record.name),
+            strings.add_searched(record.address or None),
+            birthday.toordinal() if birthday else 0,
+            len(phones),
+            len(record.phones),
+            len(emails),
+            len(record.emails),
+        )
+        phones.extend(strings.add_searched(phone) for phone in record.phones)
+        emails.extend(strings.add_searched(email) for email in record.emails)
+
+    trigrams = bytearray()
+    positions = array("I")
+    for trigram in sorted(postings):
+        trigrams += SNAPSHOT_TRIGRAM.pack(*map(ord, trigram), len(positions), len(postings[trigram]))
+        positions.extend(postings[trigram])
+
+    # The book tree is kept in sync with the records, only the tree restored from the previous snapshot
+    # by the lazy book misses the words changed since then
+    tree = address_book._fuzzy_tree()
+    for word in name_words:
+        tree.add(word)
+    for word in [word for word in tree if word not in name_words]:
+        tree.discard(word)
+    words = bytearray()
+    word_positions = array("I")
+    for word, _, distance, first, children in tree.nodes():
+        rows = name_words.get(word, ())
+        words += SNAPSHOT_WORD.pack(strings.add(word), distance, first, children, len(word_positions), len(rows))
+        word_positions.extend(rows)
+
+    # The postings intern the lower-cased emails and their parts, so they are packed before the string table
+    lookup_postings = [
+        (tag, _pack_postings(strings, values))
+        for tag, values in (
+            (b"PIDX", phone_postings),
+            (b"EIDX", email_postings),
+            (b"DIDX", domain_postings),
+            (b"LIDX", local_part_postings),
+        )
+    ]
+
+    notes = bytearray()
+    tags = array("I")
+    for index in sorted(note_book.data):
+        note = note_book.data[index]
+        notes += SNAPSHOT_NOTE.pack(index, strings.add(note.title), strings.add(note.text), len(tags), note.tags_number)
+        tags.extend(strings.add(tag) for tag in note.tags_list)
+
+    sections = [
+        (b"META", SNAPSHOT_META.pack(address_book.upcoming_birthdays_period, note_book.unique_titles)),
+        (b"STRS", strings.pack()),
+        (b"CONT", bytes(contacts)),
+        (b"PHON", _pack_ids(phones)),
+        (b"MAIL", _pack_ids(emails)),
+        (b"NOTE", bytes(notes)),
+        (b"NTAG", _pack_ids(tags)),
+        (b"FOLD", strings.pack_folds()),
+        (b"TRGM", bytes(trigrams)),
+        (b"TPOS", _pack_ids(positions)),
+        (b"WORD", bytes(words)),
+        (b"WPOS", _pack_ids(word_positions)),
+        *lookup_postings,
+    ]
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections), journal_seq)
+    offset = len(header) + SNAPSHOT_SECTION.size * len(sections)
+    directory = bytearray()
+    for tag, data in sections:
+        directory += SNAPSHOT_SECTION.pack(tag, offset, len(data))
+        offset += len(data)
+    return b"".join([header, bytes(directory), *(data for _, data in sections)])
+
+
+def unpack_sections(data: bytes | memoryview) -> tuple[int, dict[bytes, memoryview]]:
+    """Checks the snapshot header and returns the journal segment number and the sections by their tags"""
+    data = memoryview(data)
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise SnapshotFormatError("The snapshot file is truncated")
+    magic, version, count, journal_seq = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotFormatError("The file is not a books snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotFormatError(f"Unsupported snapshot version {version}")
+    sections = {}
+    for i in range(count):
+        tag, offset, length = SNAPSHOT_SECTION.unpack_from(data, SNAPSHOT_HEADER.size + i * SNAPSHOT_SECTION.size)
+        if offset + length > len(data):
+            raise SnapshotFormatError("The snapshot file is truncated")
+        sections[tag] = data[offset:offset + length]
+    return journal_seq, sections
+
+
+def unpack_snapshot(
+        data: bytes,
+        address_book_class: type[AddressBook] = AddressBook,
+) -> tuple[AddressBook, NoteBook, int]:
+    """Deserializes the books from the binary snapshot, the address book of the given class"""
+    # The restored objects are never garbage, the collection passes triggered by millions of allocations
+    # would only slow the loading down
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _unpack_snapshot(data, address_book_class)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _unpack_snapshot(data: bytes, address_book_class: type[AddressBook]) -> tuple[AddressBook, NoteBook, int]:
+    journal_seq, sections = unpack_sections(data)
+    upcoming_birthdays_period, unique_titles = SNAPSHOT_META.unpack(sections[b"META"])
+    strings = _unpack_strings(sections[b"STRS"])
+    phones = [strings[i] for i in _unpack_ids(sections[b"PHON"])]
+    emails = [strings[i] for i in _unpack_ids(sections[b"MAIL"])]
+    tags = [strings[i] for i in _unpack_ids(sections[b"NTAG"])]
+
+    address_book = address_book_class.restore(
+        (
+            (
+                strings[key],
+                Record.restore(
+                    strings[name],
+                    address=strings[address] if address != SNAPSHOT_NONE else None,
+                    birthday=datetime.date.fromordinal(birthday) if birthday else None,
+                    phones=phones[phones_start:phones_start + phones_count],
+                    emails=emails[emails_start:emails_start + emails_count],
+                ),
+            )
+            for key, name, address, birthday, phones_start, phones_count, emails_start, emails_count
+            in SNAPSHOT_CONTACT.iter_unpack(sections[b"CONT"])
+        ),
+        upcoming_birthdays_period=upcoming_birthdays_period,
+    )
+    keys = [strings[row[0]] for row in SNAPSHOT_CONTACT.iter_unpack(sections[b"CONT"])]
+    if b"TRGM" in sections and not issubclass(address_book_class, ColumnarAddressBook):
+        # The columnar book scans its columns instead of the search index
+        positions = memoryview(_unpack_ids(sections[b"TPOS"]))
+        address_book._restore_search_index(TrigramIndex.restore(
+            (chr(first) + chr(second) + chr(third), map(keys.__getitem__, positions[start:start + count]))
+            for first, second, third, start, count in SNAPSHOT_TRIGRAM.iter_unpack(sections[b"TRGM"])
+        ))
+    if b"WORD" in sections:
+        words = [(strings[word], *node) for word, *node in SNAPSHOT_WORD.iter_unpack(sections[b"WORD"])]
+        positions = memoryview(_unpack_ids(sections[b"WPOS"]))
+        address_book._restore_fuzzy_index(
+            BKTree.restore(
+                (word, count > 0, distance, first, children) for word, distance, first, children, _, count in words
+            ),
+            BucketIndex.restore(
+                (word, map(keys.__getitem__, positions[start:start + count]))
+                for word, _, _, _, start, count in words if count
+            ),
+        )
+    note_book = NoteBook.restore(
+        (
+            (index, Note.restore(strings[title], strings[text], tags[tags_start:tags_start + tags_count]))
+            for index, title, text, tags_start, tags_count in SNAPSHOT_NOTE.iter_unpack(sections[b"NOTE"])
+        ),
+        unique_titles=bool(unique_titles),
+    )
+    return address_book, note_book, journal_seq
+
+
+SNAPSHOT_STRING_SPAN = struct.Struct("<II")
+SNAPSHOT_ID = struct.Struct("<I")
+
+
+class SnapshotReader:
+    """Random access to the snapshot file mapped into memory.
+
+    The contact and note rows have a fixed size and are sorted by their keys, so the row tables are
+    the offset index themselves: a row is found by the binary search, and only the strings it references
+    are decoded. Opening the reader does not depend on the size of the books.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotFormatError("The snapshot file is truncated")
+        self.journal_seq, sections = unpack_sections(self.mmap)
+        self.upcoming_birthdays_period, unique_titles = SNAPSHOT_META.unpack(sections[b"META"])
+        self.unique_titles = bool(unique_titles)
+        strings = sections[b"STRS"]
+        self.strings_count, = SNAPSHOT_ID.unpack_from(strings)
+        self.__string_offsets = strings[4:4 + (self.strings_count + 1) * 4]
+        self.__string_data = strings[4 + (self.strings_count + 1) * 4:]
+        self.__contacts = sections[b"CONT"]
+        self.__phones = sections[b"PHON"]
+        self.__emails = sections[b"MAIL"]
+        self.__notes = sections[b"NOTE"]
+        self.__tags = sections[b"NTAG"]
+        self.__folds = sections.get(b"FOLD")
+        self.__search_key_ids: Optional[list[int]] = None
+        self.__trigrams = sections.get(b"TRGM")
+        self.__trigram_positions = _ids_view(sections[b"TPOS"]) if b"TPOS" in sections else None
+        self.trigrams_count = len(self.__trigrams) // SNAPSHOT_TRIGRAM.size if self.__trigrams is not None else 0
+        self.__words = sections.get(b"WORD")
+        self.__word_positions = _ids_view(sections[b"WPOS"]) if b"WPOS" in sections else None
+        self.words_count = len(self.__words) // SNAPSHOT_WORD.size if self.__words is not None else 0
+        self.__phone_postings = sections.get(b"PIDX")
+        self.__email_postings = sections.get(b"EIDX")
+        self.__domain_postings = sections.get(b"DIDX")
+        self.__local_part_postings = sections.get(b"LIDX")
+        self.contacts_count = len(self.__contacts) // SNAPSHOT_CONTACT.size
+        self.notes_count = len(self.__notes) // SNAPSHOT_NOTE.size
+
+    def string(self, string_id: int) -> Optional[str]:
+        """Decodes one string of the string table"""
+        if string_id == SNAPSHOT_NONE:
+            return None
+        start, end = SNAPSHOT_STRING_SPAN.unpack_from(self.__string_offsets, string_id * 4)
+        return str(self.__string_data[start:end], "utf-8", "surrogatepass")
+
+    def __strings(self, section: memoryview, start: int, count: int) -> list[str]:
+        """Private method for decoding the strings referenced by the ids of the section"""
+        return [self.string(i) for i in struct.unpack_from(f"<{count}I", section, start * 4)]
+
+    def contact_key(self, row: int) -> str:
+        return self.string(SNAPSHOT_ID.unpack_from(self.__contacts, row * SNAPSHOT_CONTACT.size)[0])
+
+    def contact_keys(self) -> Iterator[str]:
+        """Decodes the keys of all contact rows in the key order"""
+        return (self.string(row[0]) for row in SNAPSHOT_CONTACT.iter_unpack(self.__contacts))
+
+    def find_contact(self, key: str) -> Optional[int]:
+        """Returns the number of the contact row with the key, if any"""
+        row = bisect.bisect_left(range(self.contacts_count), key, key=self.contact_key)
+        return row if row < self.contacts_count and self.contact_key(row) == key else None
+
+    def contact(self, row: int) -> Record:
+        """Builds the contact record of the row"""
+        _, name, address, birthday, phones_start, phones_count, emails_start, emails_count = \
+            SNAPSHOT_CONTACT.unpack_from(self.__contacts, row * SNAPSHOT_CONTACT.size)
+        return Record.restore(
+            self.string(name),
+            address=self.string(address),
+            birthday=datetime.date.fromordinal(birthday) if birthday else None,
+            phones=self.__strings(self.__phones, phones_start, phones_count),
+            emails=self.__strings(self.__emails, emails_start, emails_count),
+        )
+
+    def birthday_rows(self, month_days: set[int]) -> Iterator[int]:
+        """Yields the numbers of the contact rows with the birthday month * 100 + day in the given set"""
+        ordinals: dict[int, bool] = {0: False}
+        for row, (_, _, _, birthday, *_) in enumerate(SNAPSHOT_CONTACT.iter_unpack(self.__contacts)):
+            if (matched := ordinals.get(birthday)) is None:
+                day = datetime.date.fromordinal(birthday)
+                matched = ordinals[birthday] = day.month * 100 + day.day in month_days
+            if matched:
+                yield row
+
+    def __matched_strings(self, keyword: str) -> set[int]:
+        """Private method for the ids of the strings whose search keys contain the keyword search key,
+        only the stored search keys are scanned
+        """
+        offsets = _unpack_ids(self.__string_offsets)
+        data = self.__string_data
+        if self.__folds is None:
+            return {
+                string_id for string_id, (start, end) in enumerate(zip(offsets, offsets[1:]))
+                if keyword in search_key(str(data[start:end], "utf-8", "surrogatepass"))
+            }
+        folds = _unpack_ids(self.__folds)
+        if self.__search_key_ids is None:
+            self.__search_key_ids = sorted(set(folds) - {SNAPSHOT_NONE})
+        matched_keys = {
+            key_id for key_id in self.__search_key_ids
+            if keyword in str(data[offsets[key_id]:offsets[key_id + 1]], "utf-8", "surrogatepass")
+        }
+        if not matched_keys:
+            return set()
+        return {string_id for string_id, key_id in enumerate(folds) if key_id in matched_keys}
+
+    def __trigram(self, row: int) -> tuple[int, int, int, int, int]:
+        """Private method for unpacking the trigram row: the trigram code points, first position and count"""
+        return SNAPSHOT_TRIGRAM.unpack_from(self.__trigrams, row * SNAPSHOT_TRIGRAM.size)
+
+    def trigram_rows(self, keyword: str) -> Optional[set[int]]:
+        """Returns the numbers of the contact rows that may contain the keyword search key, the intersection
+        of the trigram index postings of its trigrams, the smallest first. None if the keyword is too short
+        or the snapshot has no trigram index, then the string table has to be scanned.
+        """
+        if self.__trigrams is None or len(keyword) < TrigramIndex.size:
+            return None
+        postings = []
+        for trigram in TrigramIndex.trigrams(keyword):
+            code_points = tuple(map(ord, trigram))
+            row = bisect.bisect_left(range(self.trigrams_count), code_points, key=lambda i: self.__trigram(i)[:3])
+            if row == self.trigrams_count or (found := self.__trigram(row))[:3] != code_points:
+                return set()
+            postings.append(self.__trigram_positions[found[3]:found[3] + found[4]])
+        postings.sort(key=len)
+        rows = set(postings[0])
+        for posting in postings[1:]:
+            if not rows:
+                break
+            rows = {row for row in rows if (i := bisect.bisect_left(posting, row)) < len(posting) and posting[i] == row}
+        return rows
+
+    def search_rows(self, keyword: str, fields: tuple[str, ...]) -> Iterator[int]:
+        """Yields the numbers of the contact rows whose search keys (see search_key) contain the keyword search key
+        in any of the fields ("name", "address", "phones", "emails"). The rows for the keywords of three characters
+        or more are taken from the trigram index and may not contain the keyword, the final check is done
+        by the caller. Otherwise only the string table is scanned, no records are built.
+        """
+        if (rows := self.trigram_rows(keyword)) is not None:
+            yield from sorted(rows)
+            return
+        matched = self.__matched_strings(keyword)
+        if not matched:
+            return
+        phones = _unpack_ids(self.__phones) if "phones" in fields else ()
+        emails = _unpack_ids(self.__emails) if "emails" in fields else ()
+        for row, (_, name, address, _, phones_start, phones_count, emails_start, emails_count) in enumerate(
+                SNAPSHOT_CONTACT.iter_unpack(self.__contacts)
+        ):
+            if (
+                    name in matched and "name" in fields
+                    or address in matched and "address" in fields
+                    or phones and not matched.isdisjoint(phones[phones_start:phones_start + phones_count])
+                    or emails and not matched.isdisjoint(emails[emails_start:emails_start + emails_count])
+            ):
+                yield row
+
+    def __word(self, node: int) -> tuple[int, int, int, int, int, int]:
+        """Private method for unpacking the name word node: the word string id, distance from the parent word,
+        first child node, number of the children, first position and count of the contact rows
+        """
+        return SNAPSHOT_WORD.unpack_from(self.__words, node * SNAPSHOT_WORD.size)
+
+    def fuzzy_rows(self, word: str, max_distance: int) -> Optional[set[int]]:
+        """Returns the numbers of the contact rows with a name word within the edit distance from the word,
+        looked up in the BK-tree of the name words, so only a small part of the words is decoded and compared.
+        None if the snapshot has no tree, then the name words have to be indexed by the caller.
+        """
+        if self.__words is None:
+            return None
+        rows: set[int] = set()
+        nodes = [0] if self.words_count else []
+        while nodes:
+            name_word, _, first, children, start, count = self.__word(nodes.pop())
+            distance = BKTree.distance(word, self.string(name_word))
+            if count and distance <= max_distance:
+                rows.update(self.__word_positions[start:start + count])
+            nodes.extend(
+                child for child in range(first, first + children)
+                if distance - max_distance <= self.__word(child)[1] <= distance + max_distance
+            )
+        return rows
+
+    def word_tree(self) -> Optional[BKTree]:
+        """Restores the BK-tree of the contact name words, if the snapshot has one"""
+        if self.__words is None:
+            return None
+        return BKTree.restore(
+            (self.string(word), count > 0, distance, first, children)
+            for word, distance, first, children, _, count in SNAPSHOT_WORD.iter_unpack(self.__words)
+        )
+
+    def __posting_rows(self, postings: memoryview, value: str) -> list[int]:
+        """Private method for the numbers of the contact rows with the value, found by the binary search
+        in the sorted postings, the equal values share the string id
+        """
+        count = len(postings) // SNAPSHOT_POSTING.size
+        first = bisect.bisect_left(
+            range(count), value,
+            key=lambda i: self.string(SNAPSHOT_ID.unpack_from(postings, i * SNAPSHOT_POSTING.size)[0]),
+        )
+        rows: list[int] = []
+        value_id: Optional[int] = None
+        for string_id, row in SNAPSHOT_POSTING.iter_unpack(postings[first * SNAPSHOT_POSTING.size:]):
+            if value_id is None:
+                if self.string(string_id) != value:
+                    break
+                value_id = string_id
+            elif string_id != value_id:
+                break
+            rows.append(row)
+        return rows
+
+    def phone_rows(self, phones: Iterable[str]) -> Optional[dict[str, list[int]]]:
+        """Returns the numbers of the contact rows by the E.164 phone numbers, looked up in the phone postings.
+        None if the snapshot has no phone postings, then the records have to be indexed by the caller.
+        """
+        if self.__phone_postings is None:
+            return None
+        return {phone: self.__posting_rows(self.__phone_postings, phone) for phone in phones}
+
+    def email_rows(self, emails: Iterable[str]) -> Optional[dict[str, list[int]]]:
+        """Returns the numbers of the contact rows by the lower-cased emails, like phone_rows"""
+        if self.__email_postings is None:
+            return None
+        return {email: self.__posting_rows(self.__email_postings, email) for email in emails}
+
+    def domain_rows(self, domains: Iterable[str]) -> Optional[dict[str, list[int]]]:
+        """Returns the numbers of the contact rows by the lower-cased email domains, like phone_rows"""
+        if self.__domain_postings is None:
+            return None
+        return {domain: self.__posting_rows(self.__domain_postings, domain) for domain in domains}
+
+    def local_part_rows(self, local_parts: Iterable[str]) -> Optional[dict[str, list[int]]]:
+        """Returns the numbers of the contact rows by the lower-cased email local parts, like phone_rows"""
+        if self.__local_part_postings is None:
+            return None
+        return {part: self.__posting_rows(self.__local_part_postings, part) for part in local_parts}
+
+    def domains(self) -> Optional[Iterator[tuple[str, list[int]]]]:
+        """Yields the lower-cased email domains with the numbers of their contact rows, None if the snapshot
+        has no domain postings
+        """
+        if self.__domain_postings is None:
+            return None
+        return (
+            (self.string(string_id), [row for _, row in postings])
+            for string_id, postings in groupby(SNAPSHOT_POSTING.iter_unpack(self.__domain_postings), itemgetter(0))
+        )
+
+    def note_index(self, row: int) -> int:
+        return SNAPSHOT_ID.unpack_from(self.__notes, row * SNAPSHOT_NOTE.size)[0]
+
+    def note_indexes(self) -> Iterator[int]:
+        """Returns the indexes of all note rows in the index order"""
+        return (row[0] for row in SNAPSHOT_NOTE.iter_unpack(self.__notes))
+
+    def find_note(self, index: int) -> Optional[int]:
+        """Returns the number of the note row with the index, if any"""
+        row = bisect.bisect_left(range(self.notes_count), index, key=self.note_index)
+        return row if row < self.notes_count and self.note_index(row) == index else None
+
+    def note(self, row: int) -> Note:
+        """Builds the note of the row"""
+        _, title, text, tags_start, tags_count = SNAPSHOT_NOTE.unpack_from(self.__notes, row * SNAPSHOT_NOTE.size)
+        return Note.restore(self.string(title), self.string(text), self.__strings(self.__tags, tags_start, tags_count))
+
+
+class _SnapshotMapping(MutableMapping, abc.ABC):
+    """Mapping over the rows of the mapped snapshot.
+
+    The items are built on the first access and kept, the added and deleted items are kept in memory
+    on top of the snapshot rows, so the session never changes the snapshot file.
+    The loaded items are passed to the track callback, so their owner book can follow their changes.
+    """
+
+    def __init__(self, reader: SnapshotReader, track: Callable[[Any, Any], None]):
+        self.reader = reader
+        self.__track = track
+        self.__loaded: dict = {}
+        self.__added: set = set()
+        self.__deleted: set = set()
+
+    @property
+    @abc.abstractmethod
+    def _count(self) -> int:
+        """Number of the snapshot rows"""
+
+    @abc.abstractmethod
+    def _find(self, key: Any) -> Optional[int]:
+        """Returns the number of the snapshot row with the key, if any"""
+
+    @abc.abstractmethod
+    def _key(self, row: int) -> Any:
+        """Returns the key of the snapshot row"""
+
+    @abc.abstractmethod
+    def _keys(self) -> Iterator:
+        """Yields the keys of the snapshot rows in order"""
+
+    @abc.abstractmethod
+    def _build(self, row: int) -> Any:
+        """Builds the item of the snapshot row"""
+
+    def __len__(self) -> int:
+        return self._count - len(self.__deleted) + len(self.__added)
+
+    def __iter__(self) -> Iterator:
+        return heapq.merge((key for key in self._keys() if key not in self.__deleted), sorted(self.__added))
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__loaded or key not in self.__deleted and self._find(key) is not None
+
+    def __getitem__(self, key: Any) -> Any:
+        if (value := self.__loaded.get(key)) is not None:
+            return value
+        if key in self.__deleted or (row := self._find(key)) is None:
+            raise KeyError(key)
+        return self.__load(key, row)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if self._find(key) is None:
+            self.__added.add(key)
+        else:
+            self.__deleted.discard(key)
+        self.__loaded[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.__loaded.pop(key, None)
+        if key in self.__added:
+            self.__added.discard(key)
+        else:
+            self.__deleted.add(key)
+
+    def __load(self, key: Any, row: int) -> Any:
+        """Private method for building the item of the snapshot row and keeping it"""
+        value = self.__loaded[key] = self._build(row)
+        self.__track(key, value)
+        return value
+
+    def items(self) -> ItemsView:
+        return _SnapshotItemsView(self)
+
+    def values(self) -> ValuesView:
+        return _SnapshotValuesView(self)
+
+    def stream(self) -> Iterator[tuple[Any, Any]]:
+        """Yields all items in the key order, building the snapshot rows one by one"""
+        loaded = self.__loaded
+        snapshot = (
+            (key, value if (value := loaded.get(key)) is not None else self.__load(key, row))
+            for row, key in enumerate(self._keys()) if key not in self.__deleted
+        )
+        added = ((key, loaded[key]) for key in sorted(self.__added))
+        return heapq.merge(snapshot, added, key=itemgetter(0))
+
+    def unchanged(self, rows: Iterable[int]) -> Iterator[int]:
+        """Yields the snapshot rows whose items have been neither loaded nor deleted, so the rows are current"""
+        for row in rows:
+            key = self._key(row)
+            if key not in self.__loaded and key not in self.__deleted:
+                yield row
+
+    def select(self, rows: Iterable[int]) -> list:
+        """Returns the values of the selected snapshot rows together with all loaded values,
+        which may have been changed since the snapshot, the final check is done by the caller
+        """
+        found = list(self.__loaded.values())
+        for row in rows:
+            key = self._key(row)
+            if key not in self.__loaded and key not in self.__deleted:
+                found.append(self.__load(key, row))
+        return found
+
+
+class _SnapshotItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.stream()
+
+
+class _SnapshotValuesView(ValuesView):
+    def __iter__(self):
+        return (value for _, value in self._mapping.stream())
+
+
+class SnapshotRecords(_SnapshotMapping):
+    """Contact records mapping (key -> Record) over the mapped snapshot"""
+
+    @property
+    def _count(self) -> int:
+        return self.reader.contacts_count
+
+    def _find(self, key: Any) -> Optional[int]:
+        return self.reader.find_contact(key) if isinstance(key, str) else None
+
+    def _key(self, row: int) -> str:
+        return self.reader.contact_key(row)
+
+    def _keys(self) -> Iterator[str]:
+        return self.reader.contact_keys()
+
+    def _build(self, row: int) -> Record:
+        return self.reader.contact(row)
+
+
+class SnapshotNotes(_SnapshotMapping):
+    """Notes mapping (index -> Note) over the mapped snapshot"""
+
+    @property
+    def _count(self) -> int:
+        return self.reader.notes_count
+
+    def _find(self, key: Any) -> Optional[int]:
+        return self.reader.find_note(key) if isinstance(key, int) else None
+
+    def _key(self, row: int) -> int:
+        return self.reader.note_index(row)
+
+    def _keys(self) -> Iterator[int]:
+        return self.reader.note_indexes()
+
+    def _build(self, row: int) -> Note:
+        return self.reader.note(row)
+
+
+class SnapshotAddressBook(AddressBook):
+    """Address book that reads the contact records from the mapped snapshot on access"""
+
+    def __init__(self, reader: SnapshotReader):
+        super().__init__(upcoming_birthdays_period=reader.upcoming_birthdays_period)
+        self.data: SnapshotRecords = SnapshotRecords(reader, self._track)
+
+    def _reopen(self, reader: SnapshotReader) -> None:
+        """Replaces all contact records with the records of another snapshot"""
+        self.data = SnapshotRecords(reader, self._track)
+        self._forget_indexes()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def items(self) -> ItemsView:
+        return self.data.items()
+
+    def values(self) -> ValuesView:
+        return self.data.values()
+
+    def _birthday_candidates(self, today: datetime.date, upcoming_birthdays_period: int) -> Iterator[Record]:
+        month_days = self._birthday_month_days(today, upcoming_birthdays_period)
+        return iter(self.data.select(self.data.reader.birthday_rows(month_days)))
+
+    def _query_candidates(self, terms: list[QueryTerm]) -> Optional[Iterable[Record]]:
+        # The rows of the indexed terms (the birthday range, the email domain and the keywords in the trigram index)
+        # are intersected, the smallest first, and only the rows left are built. The string table is scanned
+        # for the first term only if no term has an index, the other terms are checked by the caller
+        reader = self.data.reader
+        postings: list[set[int]] = []
+        for term in terms:
+            if term.field == "birthday":
+                postings.append(set(reader.birthday_rows(set(term.month_days()))))
+            elif term.domain is not None and (domain_rows := reader.domain_rows([term.domain])) is not None:
+                postings.append(set(domain_rows[term.domain]))
+            elif (rows := reader.trigram_rows(term.value)) is not None:
+                postings.append(rows)
+        if not postings:
+            for term in terms:
+                return self.data.select(reader.search_rows(term.value, QUERY_FIELDS[term.field]))
+            return None
+        postings.sort(key=len)
+        rows = postings[0]
+        for posting in postings[1:]:
+            if not rows:
+                break
+            rows &= posting
+        return self.data.select(sorted(rows))
+
+    def _records_by_phones(self, phones: Iterable[str]) -> dict[str, list[Record]]:
+        # The rows found in the phone postings of the snapshot, the loaded records are checked directly
+        phones = set(phones)
+        if (phone_rows := self.data.reader.phone_rows(phones)) is None:
+            return super()._records_by_phones(phones)
+        found: defaultdict[str, list[Record]] = defaultdict(list)
+        for record in self.data.select(sorted({row for rows in phone_rows.values() for row in rows})):
+            for phone in phones.intersection(record.phones):
+                found[phone].append(record)
+        return {phone: sorted(records, key=lambda record: record.name) for phone, records in found.items()}
+
+    def __records_by_email_part(self, rows: list[int], value: str, part: Callable[[str], str]) -> list[Record]:
+        """Private method for building the records of the posting rows, the loaded ones are checked directly"""
+        return sorted(
+            (record for record in self.data.select(rows) if value in (part(email.lower()) for email in record.emails)),
+            key=lambda record: record.name,
+        )
+
+    def _records_by_email(self, email: str) -> list[Record]:
+        if (email_rows := self.data.reader.email_rows([email])) is None:
+            return super()._records_by_email(email)
+        return self.__records_by_email_part(email_rows[email], email, lambda folded: folded)
+
+    def _records_by_domain(self, domain: str) -> list[Record]:
+        if (domain_rows := self.data.reader.domain_rows([domain])) is None:
+            return super()._records_by_domain(domain)
+        return self.__records_by_email_part(domain_rows[domain], domain, lambda folded: folded.rpartition("@")[2])
+
+    def _records_by_local_part(self, local_part: str) -> list[Record]:
+        if (part_rows := self.data.reader.local_part_rows([local_part])) is None:
+            return super()._records_by_local_part(local_part)
+        return self.__records_by_email_part(
+            part_rows[local_part], local_part, lambda folded: folded.rpartition("@")[0]
+        )
+
+    def _email_domains(self) -> dict[str, int]:
+        # The rows of the domain postings are counted without building the records, but the loaded ones,
+        # which may have been changed since the snapshot, are counted by their emails
+        if (domains := self.data.reader.domains()) is None:
+            return super()._email_domains()
+        counts: defaultdict[str, int] = defaultdict(int)
+        for domain, rows in domains:
+            if count := sum(1 for _ in self.data.unchanged(rows)):
+                counts[domain] += count
+        for record in self.data.select(()):
+            for domain in {email.rpartition("@")[2].lower() for email in record.emails}:
+                counts[domain] += 1
+        return dict(counts)
+
+    def _fuzzy_candidates(self, word: str, max_distance: int) -> dict[str, int]:
+        # The rows with the name words found in the stored tree, the loaded records are compared directly
+        if (rows := self.data.reader.fuzzy_rows(word, max_distance)) is None:
+            return super()._fuzzy_candidates(word, max_distance)
+        found: dict[str, int] = {}
+        for record in self.data.select(rows):
+            distance = min(
+                (BKTree.distance(word, name_word) for name_word in self._normalize_name(record.name).split()),
+                default=max_distance + 1,
+            )
+            if distance <= max_distance:
+                found[record.name] = distance
+        return found
+
+    def _fuzzy_tree(self) -> BKTree:
+        # The stored tree misses the session changes, they are applied by the snapshot packing
+        tree = self.data.reader.word_tree()
+        return tree if tree is not None else super()._fuzzy_tree()
+
+    def __search(self, keyword: str, *fields: str) -> list[Record]:
+        """Private method for the search in the string table with the check of the candidates cached search keys"""
+        keyword = search_key(keyword)
+        if not keyword:
+            return []
+        found: list[Record] = []
+        for record in self.data.select(self.data.reader.search_rows(keyword, fields)):
+            keys = record.search_keys
+            if (
+                    "name" in fields and keyword in keys.name
+                    or "address" in fields and keyword in keys.address
+                    or "phones" in fields and keyword in keys.phones
+                    or "emails" in fields and keyword in keys.emails
+            ):
+                found.append(record)
+        return sorted(found, key=lambda record: record.name)
+
+    def search_by_name(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name")
+
+    def search_by_address(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "address")
+
+    def search_by_phone(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "phones")
+
+    def search_by_email(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "emails")
+
+    def search(self, keyword: str) -> list[Record]:
+        return self.__search(keyword, "name", "address", "phones", "emails")
+
+
+class SnapshotNoteBook(NoteBook):
+    """Note book that reads the notes from the mapped snapshot on access"""
+
+    def __init__(self, reader: SnapshotReader):
+        super().__init__(unique_titles=reader.unique_titles)
+        self.data: SnapshotNotes = SnapshotNotes(reader, self._track)
+
+    def _reopen(self, reader: SnapshotReader) -> None:
+        """Replaces all notes with the notes of another snapshot"""
+        self.data = SnapshotNotes(reader, self._track)
+
+    def keys(self):
+        return self.data.keys()
+
+    def items(self) -> ItemsView:
+        return self.data.items()
+
+    def values(self) -> ValuesView:
+        return self.data.values()
+
+
+def open_snapshot(path: Path) -> tuple[AddressBook, NoteBook, int]:
+    """Opens the books over the mapped snapshot file, the records are built only when they are accessed"""
+    reader = SnapshotReader(path)
+    return SnapshotAddressBook(reader), SnapshotNoteBook(reader), reader.journal_seq
+
+
+def _load_snapshot(lazy: bool = False, columnar: bool = False) -> tuple[AddressBook, NoteBook, int]:
+    """Loads the books from the snapshot file and the number of the last journal segment folded into it.
+    The lazy books read the records from the mapped snapshot file on access,
+    the columnar address book keeps only the values of the contact records.
+    """
+    address_book_class = ColumnarAddressBook if columnar else AddressBook
     if DATA_FILE.exists():
-        with open(DATA_FILE, "rb") as f:
+        if lazy:
+            return open_snapshot(DATA_FILE)
+        return unpack_snapshot(DATA_FILE.read_bytes(), address_book_class)
+    if LEGACY_DATA_FILE.exists():
+        with open(LEGACY_DATA_FILE, "rb") as f:
             data = pickle.load(f)
-            return data.get("contacts", AddressBook()), data.get("notes", NoteBook())
-    return AddressBook(), NoteBook()
+            address_book = data.get("contacts", AddressBook())
+            if columnar:
+                address_book = ColumnarAddressBook.restore(
+                    address_book.data.items(), upcoming_birthdays_period=address_book.upcoming_birthdays_period
+                )
+            return address_book, data.get("notes", NoteBook()), data.get("journal_seq", -1)
+    return address_book_class(), NoteBook(), -1
+
+
+def _snapshot_seq() -> int:
+    """Returns the number of the last journal segment folded into the snapshot file, reading only its header"""
+    try:
+        with open(DATA_FILE, "rb") as f:
+            magic, _, _, journal_seq = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return -1
+    return journal_seq if magic == SNAPSHOT_MAGIC else -1
+
+
+def _snapshot_mode() -> int:
+    """Returns the permissions of the snapshot file: the ones of the current file, if any, otherwise the default
+    ones of the new files, like the lock and journal files get (the temporary files are private to the owner)
+    """
+    try:
+        return stat.S_IMODE(os.stat(DATA_FILE).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _write_snapshot(address_book: AddressBook, note_book: NoteBook, journal_seq: int) -> None:
+    """Writes the snapshot to a temporary file and atomically swaps it with the current one"""
+    data = pack_snapshot(address_book, note_book, journal_seq)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{DATA_FILE.name}.", dir=DATA_FILE.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _snapshot_mode())
+        os.replace(tmp_path, DATA_FILE)
+        _fsync_directory(DATA_FILE.parent)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def migrate_legacy_data() -> None:
+    """Converts the pickle data file of the previous versions into the binary snapshot.
+    The pickle file is kept as a backup with the .bak suffix.
+    """
+    if DATA_FILE.exists() or not LEGACY_DATA_FILE.exists():
+        return
+    _write_snapshot(*_load_snapshot())
+    LEGACY_DATA_FILE.replace(LEGACY_DATA_FILE.with_name(LEGACY_DATA_FILE.name + ".bak"))
+
+
+def checkpoint(journal: Journal, upto: int) -> None:
+    """Folds the journal segments up to the given number into a fresh snapshot.
+
+    The books are rebuilt from the files (the last snapshot and the frozen segments), which never
+    change, so the checkpoint does not touch the books used by the running session, and the other
+    processes are blocked only while the new snapshot is swapped in.
+    """
+    address_book, note_book, snapshot_seq = _load_snapshot()
+    if snapshot_seq >= upto:
+        return
+    try:
+        journal.replay(address_book, note_book, after=snapshot_seq, upto=upto)
+    except FileNotFoundError:
+        # Another process has folded the segments meanwhile
+        return
+    with journal.lock.exclusive():
+        if _snapshot_seq() != snapshot_seq:
+            return
+        _write_snapshot(address_book, note_book, upto)
+        journal.remove(upto)
+
+
+class Compactor(threading.Thread):
+    """Background thread that periodically folds the grown journal into a fresh snapshot"""
+
+    def __init__(
+            self,
+            journal: Journal,
+            interval: float = COMPACTION_INTERVAL,
+            threshold: int = COMPACTION_THRESHOLD,
+    ):
+        super().__init__(name="journal-compactor", daemon=True)
+        self.journal = journal
+        self.interval = interval
+        self.threshold = threshold
+        self.__stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            if self.journal.size() >= self.threshold:
+                self.compact()
+
+    def compact(self) -> None:
+        """Freezes the current journal segment and folds all frozen segments into the snapshot"""
+        checkpoint(self.journal, self.journal.rotate())
+
+    def stop(self) -> None:
+        """Stops the thread, waiting for the running compaction to finish"""
+        self.__stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+class Autosave(threading.Thread):
+    """Background thread that flushes the changes a few seconds after the last mutation.
+    The thread is subscribed to the books, so a burst of edits results in one flush.
+    """
+
+    def __init__(
+            self,
+            flush: Callable[[], None],
+            delay: float = AUTOSAVE_DELAY,
+            max_delay: float = AUTOSAVE_MAX_DELAY,
+    ):
+        super().__init__(name="autosave", daemon=True)
+        self.flush = flush
+        self.delay = delay
+        self.max_delay = max_delay
+        self.__changed = threading.Event()
+        self.__stopped = threading.Event()
+
+    def touch(self, *args: Any) -> None:
+        """Books observer that postpones the flush"""
+        self.__changed.set()
+
+    def run(self) -> None:
+        while True:
+            self.__changed.wait()
+            if self.__stopped.is_set():
+                return
+            # Wait until there were no changes for the whole delay, the continuous changes are flushed anyway
+            deadline = time.monotonic() + self.max_delay
+            while self.__changed.is_set() and time.monotonic() < deadline:
+                self.__changed.clear()
+                if self.__stopped.wait(min(self.delay, max(deadline - time.monotonic(), 0))):
+                    return
+            self.__changed.clear()
+            self.flush()
+
+    def stop(self) -> None:
+        """Stops the thread without flushing the pending changes"""
+        self.__stopped.set()
+        self.__changed.set()
+        if self.is_alive():
+            self.join()
+
+
+def flush_data(address_book: AddressBook, note_book: NoteBook, journal: Journal) -> None:
+    """Makes the journaled changes of the books durable and marks the books as saved"""
+    # The books are marked first, so a change made during the flush keeps them changed
+    address_book.mark_clean()
+    note_book.mark_clean()
+    journal.sync()
+
+
+class _PendingChanges:
+    """Changes of the books loaded without a journal, kept in memory as the journal entries until they are saved"""
+
+    def __init__(self):
+        self.entries: list[bytes] = []
+
+    def append(self, book: str, event: str, *args: Any) -> None:
+        self.entries.append(pickle.dumps((book, event, args), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def apply(self, address_book: AddressBook, note_book: NoteBook) -> None:
+        """Applies the changes to other copies of the books"""
+        books = {"contacts": address_book, "notes": note_book}
+        for entry in self.entries:
+            book, event, args = pickle.loads(entry)
+            _apply_change(books[book], event, args)
+
+
+# The pending changes of the books loaded by load_data without a journal, by the address book id
+_pending: dict[int, _PendingChanges] = {}
+
+
+def _record_changes(address_book: AddressBook, note_book: NoteBook) -> None:
+    """Starts keeping the changes of the loaded books for save_data, until the books are garbage collected"""
+    pending = _pending[id(address_book)] = _PendingChanges()
+    address_book.subscribe(pending.append, "contacts")
+    note_book.subscribe(pending.append, "notes")
+    weakref.finalize(address_book, _pending.pop, id(address_book), None)
+
+
+def save_data(address_book: AddressBook, note_book: NoteBook, journal: Optional[Journal] = None):
+    """Serializes and saves the address book and note book to a file and clears the change journal.
+    The unchanged books are not rewritten.
+
+    The books loaded by load_data without a journal may miss the changes saved by the other processes since then,
+    so, like the checkpoint, the snapshot is built from the files, with the changes of the books applied on top.
+    The other books replace the saved data.
+    """
+    if DATA_FILE.exists() and not address_book.dirty and not note_book.dirty:
+        return
+    journal = journal or Journal()
+    pending = _pending.get(id(address_book))
+    with journal.lock.exclusive():
+        upto = journal.rotate()
+        if pending is None:
+            _write_snapshot(address_book, note_book, upto)
+        else:
+            contacts, notes, snapshot_seq = _load_snapshot()
+            journal.replay(contacts, notes, after=snapshot_seq, upto=upto)
+            pending.apply(contacts, notes)
+            _write_snapshot(contacts, notes, upto)
+            pending.entries.clear()
+        journal.remove(upto)
+    address_book.mark_clean()
+    note_book.mark_clean()
+
+
+def load_data(
+        journal: Optional[Journal] = None,
+        lazy: bool = False,
+        columnar: bool = False,
+) -> tuple[AddressBook, NoteBook]:
+    """Loads address book and note book or creates new ones, then replays the change journal.
+    The lazy books read the records from the mapped snapshot file on access,
+    the columnar address book keeps the contact records in the columns.
+    The changes of the books loaded without a journal are kept for save_data.
+    """
+    if journal is None:
+        address_book, note_book = load_data(Journal(), lazy, columnar)
+        _record_changes(address_book, note_book)
+        return address_book, note_book
+    if LEGACY_DATA_FILE.exists():
+        with journal.lock.exclusive():
+            migrate_legacy_data()
+    with journal.lock.shared():
+        address_book, note_book, snapshot_seq = _load_snapshot(lazy, columnar)
+        last = journal.replay(address_book, note_book, after=snapshot_seq)
+        journal.synced(last, snapshot_seq)
+    if any(seq <= snapshot_seq for seq, _ in journal.segments()):
+        # Segments left behind by an interrupted checkpoint are already in the snapshot
+        with journal.lock.exclusive():
+            journal.remove(snapshot_seq)
+    address_book.mark_clean()
+    note_book.mark_clean()
+    return address_book, note_book
+
+
+def _reload_books(address_book: AddressBook, note_book: NoteBook, journal: Journal) -> None:
+    """Loads the books of the running session from the files again, keeping the book objects.
+    The data lock must be held and the journal detached from the books.
+    """
+    if isinstance(address_book, SnapshotAddressBook) and DATA_FILE.exists():
+        reader = SnapshotReader(DATA_FILE)
+        address_book._reopen(reader)
+        note_book._reopen(reader)
+        snapshot_seq = reader.journal_seq
+    else:
+        contacts, notes, snapshot_seq = _load_snapshot()
+        address_book._replace(contacts.data.items())
+        note_book._replace(notes.data.items())
+    journal.synced(journal.replay(address_book, note_book, after=snapshot_seq), snapshot_seq)
+
+
+def sync_books(address_book: AddressBook, note_book: NoteBook, journal: Journal) -> bool:
+    """Applies the changes saved by the other assistant processes since the last synchronization to the books.
+    When nothing has changed, it costs one read of the lock file.
+
+    :return: whether there were any changes (bool)
+    """
+    if not journal.changed():
+        return False
+    with journal.lock.shared():
+        # The changes of the other processes are already in the journal
+        journal.detach(address_book, note_book)
+        try:
+            if not journal.follow(address_book, note_book):
+                # The unread changes have been folded into a new snapshot by another process
+                _reload_books(address_book, note_book, journal)
+        finally:
+            journal.attach(address_book, note_book)
+    return True
+
+
+# The books of the running file backend session, synchronized by refresh_data
+_session: Optional[tuple[AddressBook, NoteBook, Journal]] = None
+
+
+def refresh_data() -> bool:
+    """Applies the changes saved by the other assistant processes to the books of the running session,
+    the CLI calls it before every command
+
+    :return: whether there were any changes (bool)
+    """
+    return sync_books(*_session) if _session is not None else False
+
+
+def migrate_to_sqlite(address_book: AddressBook, note_book: NoteBook):
+    """Copies the books saved by the file backend into the empty SQLite books"""
+    if len(address_book) or len(note_book) or not (
+            DATA_FILE.exists() or LEGACY_DATA_FILE.exists() or Journal().segments()
+    ):
+        return
+    contacts, notes = load_data()
+    address_book.data.insert(contacts.data.values())
+    note_book.data.insert(notes.data.items())
 
 
 @contextmanager
@@ -28,10 +1602,38 @@ def init_books_data():
     """Context manager for cli data (address book and note book)
     """
 
+    if STORAGE_BACKEND == "sqlite":
+        with sqlite_storage.open_books(SQLITE_FILE) as (address_book, note_book):
+            migrate_to_sqlite(address_book, note_book)
+            yield address_book, note_book
+        return
+
     # Access the address book and notebook from files, or create a new one if the files do not exist
-    address_book, note_book = load_data()
+    journal = Journal()
+    address_book, note_book = load_data(
+        journal, lazy=SNAPSHOT_LOADING == "lazy", columnar=SNAPSHOT_LOADING == "columnar"
+    )
+    # Every change is appended to the journal as it happens, so nothing has to be rewritten on exit,
+    # the autosave makes the changes durable shortly after they stop,
+    # and the compactor keeps the journal short in the background
+    journal.attach(address_book, note_book)
+    autosave = Autosave(lambda: flush_data(address_book, note_book, journal))
+    address_book.subscribe(autosave.touch)
+    note_book.subscribe(autosave.touch)
+    autosave.start()
+    compactor = Compactor(journal)
+    compactor.start()
+    global _session
+    _session = address_book, note_book, journal
     try:
         yield address_book, note_book
     finally:
-        # Write the address book and notebook to files
-        save_data(address_book, note_book)
+        _session = None
+        journal.detach(address_book, note_book)
+        address_book.unsubscribe(autosave.touch)
+        note_book.unsubscribe(autosave.touch)
+        autosave.stop()
+        compactor.stop()
+        # Read-only sessions end without any disk writes
+        if address_book.dirty or note_book.dirty:
+            flush_data(address_book, note_book, journal)
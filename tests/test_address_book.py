@@ -0,0 +1,367 @@
+import unittest
+import sys
+import os
+import datetime
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from books import AddressBook, Record, address_book_errors
+from books.address_book import ColumnarAddressBook, QueryTerm
+from books.address_book.dedupe import find_duplicates, name_key
+from books.address_book.birthday_engine import numpy
+from books.address_book.record.record import Name, Phone, Email, Address, Birthday
+
+
+class TestAddressBookSearch(unittest.TestCase):
+    """Test cases for the address book search through the trigram index"""
+
+    def setUp(self):
+        self.book = AddressBook(
+            Record('Ivan Petrenko', phones=['+380501234567'], emails=['ivan@example.com'], address='Kyiv, Khreshchatyk 1'),
+            Record('Olena Ivanenko', phones=['+380671112233'], emails=['olena@mail.com'], address='Lviv, Rynok 5'),
+            Record('Petro', emails=['petro@example.com']),
+        )
+
+    def names(self, records):
+        return [i.name for i in records]
+
+    def test_search_fields(self):
+        """Test that the search matches the substrings of every field, case-insensitively, sorted by the name"""
+        self.assertEqual(self.names(self.book.search('IVAN')), ['Ivan Petrenko', 'Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.search_by_name('petr')), ['Ivan Petrenko', 'Petro'])
+        self.assertEqual(self.names(self.book.search_by_address('rynok')), ['Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.search_by_phone('1112')), ['Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.search_by_email('example.com')), ['Ivan Petrenko', 'Petro'])
+        self.assertEqual(self.names(self.book.search_by_email('kyiv')), [])
+        self.assertEqual(self.names(self.book.search('o')), ['Ivan Petrenko', 'Olena Ivanenko', 'Petro'])
+        self.assertEqual(self.book.search(''), [])
+
+    def test_index_follows_changes(self):
+        """Test that the search sees the added, edited and deleted contact records after the index is built"""
+        self.assertEqual(self.names(self.book.search('lviv')), ['Olena Ivanenko'])
+        self.book.add_record(Record('Taras', address='Lviv, Svobody 2'))
+        self.book['Olena Ivanenko'].edit_address('Odesa, Deribasivska 3')
+        self.book['Petro'].add_phone('+380931234567')
+        self.book.delete_record('Ivan Petrenko')
+        self.assertEqual(self.names(self.book.search('lviv')), ['Taras'])
+        self.assertEqual(self.names(self.book.search('odesa')), ['Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.search_by_phone('1234567')), ['Petro'])
+        self.assertEqual(self.names(self.book.search('khreshchatyk')), [])
+
+    def test_find(self):
+        """Test that find returns the exact name first, then the only name equal ignoring case and whitespace"""
+        self.assertEqual(self.book.find('Petro').name, 'Petro')
+        self.assertEqual(self.book.find('  ivan   PETRENKO ').name, 'Ivan Petrenko')
+        self.assertRaises(address_book_errors.ContactNotFound, self.book.find, 'ivan petrenko', ignore_case=False)
+        self.assertRaises(address_book_errors.ContactNotFound, self.book.find, 'Ivan')
+        self.book.add_record(Record('PETRO'))
+        self.assertEqual(self.book.find('PETRO').name, 'PETRO')
+        self.assertRaises(address_book_errors.ContactNotFound, self.book.find, 'petro')
+        self.book.delete_record('Petro')
+        self.assertEqual(self.book.find('petro').name, 'PETRO')
+
+    def test_sorted_browsing(self):
+        """Test that the iteration, range and prefix follow the added and deleted names in the sorted order"""
+        self.assertEqual(list(self.book), ['Ivan Petrenko', 'Olena Ivanenko', 'Petro'])
+        self.book.add_record(Record('Oksana'))
+        self.book.add_records([Record('Andrii'), Record('Pavlo')])
+        self.book.delete_record('Petro')
+        self.assertEqual(list(self.book), ['Andrii', 'Ivan Petrenko', 'Oksana', 'Olena Ivanenko', 'Pavlo'])
+        self.assertEqual(self.names(self.book.range('B', 'Ol')), ['Ivan Petrenko', 'Oksana'])
+        self.assertEqual(self.names(self.book.range('Olena Ivanenko')), ['Olena Ivanenko', 'Pavlo'])
+        self.assertEqual(self.names(self.book.prefix('O')), ['Oksana', 'Olena Ivanenko'])
+        self.assertEqual(self.book.prefix('Z'), [])
+
+    def test_find_by_phone(self):
+        """Test that the phone numbers are resolved to the contacts after the phone numbers are changed"""
+        self.assertEqual(self.names(self.book.find_by_phone('+380 (50) 123-45-67')), ['Ivan Petrenko'])
+        self.book['Petro'].add_phone('+380501234567')
+        self.book['Ivan Petrenko'].edit_phone('+380501234567', '+380931234567')
+        self.book['Olena Ivanenko'].remove_phone('+380671112233')
+        found = self.book.find_by_phones(['380501234567', '+380931234567', '+380671112233', 'bad'])
+        self.assertEqual(
+            {phone: self.names(records) for phone, records in found.items()},
+            {'380501234567': ['Petro'], '+380931234567': ['Ivan Petrenko'], '+380671112233': [], 'bad': []},
+        )
+        self.assertRaises(address_book_errors.ContactPhoneValueError, self.book.find_by_phone, 'bad')
+        self.book.delete_record('Petro')
+        self.assertEqual(self.book.find_by_phone('+380501234567'), [])
+
+    def test_email_indexes(self):
+        """Test that the emails and the domains are resolved to the contacts after the emails are changed"""
+        self.assertEqual(self.book.email_domains(), {'example.com': 2, 'mail.com': 1})
+        self.book['Petro'].edit_email('petro@example.com', 'petro@mail.com')
+        self.book['Olena Ivanenko'].add_email('Olena@Example.com')
+        self.book['Olena Ivanenko'].remove_email('olena@mail.com')
+        self.assertEqual(self.names(self.book.contacts_by_domain('@EXAMPLE.com')), ['Ivan Petrenko', 'Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.find_by_email(' olena@example.com')), ['Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.contacts_by_local_part('OLENA@')), ['Olena Ivanenko'])
+        self.assertEqual(self.names(self.book.contacts_by_local_part('petro')), ['Petro'])
+        self.book.delete_record('Ivan Petrenko')
+        self.assertEqual(self.book.email_domains(), {'example.com': 1, 'mail.com': 1})
+        self.assertRaises(address_book_errors.ContactEmailValueError, self.book.find_by_email, 'olena')
+
+    def test_search_top(self):
+        """Test that the ranked search returns the exact name, then the name prefix, name, address and email matches"""
+        self.book.add_records([Record('Ivan'), Record('ivanka'), Record('Taras', address='Ivano-Frankivsk')])
+        self.assertEqual(
+            self.names(self.book.search_top('IVAN', 10)),
+            ['Ivan', 'Ivan Petrenko', 'ivanka', 'Olena Ivanenko', 'Taras'],
+        )
+        self.assertEqual(self.names(self.book.search_top('ivan', 2)), ['Ivan', 'Ivan Petrenko'])
+        self.assertEqual(self.names(self.book.search_top('example.com', 5)), ['Ivan Petrenko', 'Petro'])
+        self.book.delete_record('Ivan')
+        self.book['ivanka'].edit_name('Ivanna')
+        self.assertEqual(self.names(self.book.search_top('ivan', 3)), ['Ivan Petrenko', 'Ivanna', 'Olena Ivanenko'])
+        self.assertEqual(self.book.search_top(' ', 3), [])
+
+    def test_search_fuzzy(self):
+        """Test that the misspelled name words are found within the edit distance after the names are changed"""
+        self.assertEqual(self.names(self.book.search_fuzzy('Petrneko')), ['Ivan Petrenko'])
+        self.assertEqual(self.names(self.book.search_fuzzy('ivam petrenk')), ['Ivan Petrenko'])
+        self.assertEqual(self.names(self.book.search_fuzzy('ivam petrenk', 1)), [])
+        self.assertEqual(self.names(self.book.search_fuzzy('petr')), ['Petro'])
+        self.book.add_record(Record('Petra'))
+        self.book['Petro'].edit_name('Pavlo')
+        self.book.delete_record('Ivan Petrenko')
+        self.assertEqual(self.names(self.book.search_fuzzy('petr')), ['Petra'])
+        self.assertEqual(self.names(self.book.search_fuzzy('pavel')), ['Pavlo'])
+        self.assertEqual(self.book.search_fuzzy('petrenko'), [])
+
+    def test_query(self):
+        """Test that the query terms are all matched, using the indexes for the candidates where they exist"""
+        self.book['Petro'].add_birthday('15.03.1990')
+        self.book['Olena Ivanenko'].add_birthday('31.12.1985')
+        query = lambda *terms: self.names(self.book.query([QueryTerm(*term) for term in terms]))
+        self.assertEqual(query(('name', 'ivan'), ('phone', '+380')), ['Ivan Petrenko', 'Olena Ivanenko'])
+        self.assertEqual(query(('name', 'ivan'), ('address', 'LVIV', True)), ['Ivan Petrenko'])
+        self.assertEqual(query(('birthday', (1201, 331))), ['Olena Ivanenko', 'Petro'])
+        self.assertEqual(query(('email', '@Example.com'), ('birthday', (301, 531), True)), ['Ivan Petrenko'])
+        self.assertEqual(query((None, 'petr'), ('email', 'petro@')), ['Petro'])
+        self.assertEqual(query(('name', 'ol', True)), ['Ivan Petrenko', 'Petro'])
+        self.assertEqual(query(('address', 'rynok'), ('name', 'ivan', True)), [])
+        self.assertIsNone(self.book._query_candidates([QueryTerm('name', 'o', True), QueryTerm('name', 'iv')]))
+        candidates = self.book._query_candidates([QueryTerm('name', 'ivan'), QueryTerm('birthday', (101, 1231))])
+        self.assertEqual(self.names(candidates), ['Olena Ivanenko'])
+        self.assertRaises(ValueError, QueryTerm, 'city', 'Kyiv')
+
+    def test_renamed_record_is_moved(self):
+        """Test that the renamed record is moved under the new name and the indexes follow it"""
+        self.assertEqual(self.names(self.book.search('petr')), ['Ivan Petrenko', 'Petro'])
+        self.assertEqual(self.names(self.book.find_by_phone('+380501234567')), ['Ivan Petrenko'])
+        record = self.book['Ivan Petrenko']
+        record.edit_name('Ivan Bondar')
+        self.assertIs(self.book.find('ivan bondar'), record)
+        self.assertNotIn('Ivan Petrenko', self.book)
+        self.assertEqual(list(self.book), ['Ivan Bondar', 'Olena Ivanenko', 'Petro'])
+        self.assertEqual(self.names(self.book.search('petr')), ['Petro'])
+        self.assertEqual(self.names(self.book.search('bondar')), ['Ivan Bondar'])
+        self.assertEqual(self.names(self.book.find_by_phone('+380501234567')), ['Ivan Bondar'])
+        self.assertRaises(address_book_errors.ContactAlreadyExist, record.edit_name, 'Petro')
+        self.assertEqual(record.name, 'Ivan Bondar')
+        record.add_phone('+380931234567')
+        self.assertEqual(self.names(self.book.search('0931')), ['Ivan Bondar'])
+
+
+class TestRecord(unittest.TestCase):
+    """Test cases for the compact contact record"""
+
+    def test_slots_and_pickle(self):
+        """Test that the record and the fields have no instance dictionary and are pickled with their values"""
+        record = Record('Ivan', address='Kyiv', birthday='01.02.1990', phones=['+380501234567'], emails=['i@example.com'])
+        self.assertFalse(hasattr(record, '__dict__') or hasattr(record.birthday, '__dict__'))
+        self.assertRaises(AttributeError, setattr, record.find_phone('+380501234567'), 'value', '1')
+        self.assertEqual(hash(Phone('+380501234567')), hash(record.find_phone('+380501234567')))
+        restored = pickle.loads(pickle.dumps(record))
+        self.assertEqual(str(restored), str(record))
+        restored.add_phone('+380671234567')
+        self.assertEqual(restored.phones, ['+380501234567', '+380671234567'])
+
+    def test_search_keys(self):
+        """Test that the cached search keys are case-folded and NFKC normalized, and dropped by the changes"""
+        book = AddressBook(Record('Straße', address='Ｋｙｉｖ'))
+        record = book.find('Straße')
+        self.assertIs(record.search_keys, record.search_keys)
+        self.assertEqual((record.search_keys.name, record.search_keys.address), ('strasse', 'kyiv'))
+        self.assertEqual([r.name for r in book.search('STRASSE')], ['Straße'])
+        self.assertEqual([r.name for r in book.search_by_address('KY')], ['Straße'])
+        record.edit_address('Lviv')
+        record.add_email('Info@Example.com')
+        self.assertEqual(book.search_by_address('ky'), [])
+        self.assertEqual([r.name for r in book.search_by_email('info@')], ['Straße'])
+
+    def test_legacy_state(self):
+        """Test that the record pickled with the fields in the instance dictionary is restored"""
+        record = Record.__new__(Record)
+        record.__setstate__({
+            '_Record__name': Name('Ivan'),
+            '_Record__address': Address('Kyiv'),
+            '_Record__birthday': Birthday('01.02.1990'),
+            '_Record__phones': [Phone('+380501234567')],
+            '_Record__emails': [Email('i@example.com')],
+        })
+        self.assertEqual((record.name, record.address, str(record.birthday)), ('Ivan', 'Kyiv', '01.02.1990'))
+        self.assertEqual((record.phones, record.emails), (['+380501234567'], ['i@example.com']))
+        record.remove_email('i@example.com')
+        self.assertEqual(record.emails, [])
+
+
+class TestColumnarAddressBook(unittest.TestCase):
+    """Test cases for the address book keeping the contact records in the columns"""
+
+    def build(self, book):
+        book.add_record(Record(
+            'Ivan Petrenko', address='Kyiv', birthday='20.10.1990', phones=['+380501234567'], emails=['ivan@Example.com']
+        ))
+        book.add_record(Record('Olena', phones=['+380671112233', '+380931112233'], emails=['o@mail.com']))
+        book.add_record(Record('Petro', birthday='29.02.2000'))
+        record = book.find('olena')
+        record.edit_phone('+380671112233', '+380671112234')
+        record.add_phone('+380501234567')
+        record.edit_name('Olena K')
+        book.find('Petro').add_email('p@Example.com')
+        book.delete_record('Ivan Petrenko')
+        book.add_record(Record('Anna', phones=['+380501234567']))
+        return book
+
+    def test_matches_address_book(self):
+        """Test that the changes of the facade records are written back, and the lookups match the address book"""
+        memory_book, book = self.build(AddressBook()), self.build(ColumnarAddressBook())
+        names = lambda records: [record.name for record in records]
+        self.assertEqual(list(book), list(memory_book))
+        self.assertEqual([str(record) for record in book.values()], [str(record) for record in memory_book.values()])
+        for keyword in ('380', '0501', 'example', 'olena', 'ky', 'zzz'):
+            with self.subTest(keyword=keyword):
+                self.assertEqual(names(book.search(keyword)), names(memory_book.search(keyword)))
+                self.assertEqual(names(book.search_by_email(keyword)), names(memory_book.search_by_email(keyword)))
+                self.assertEqual(names(book.search_top(keyword, 2)), names(memory_book.search_top(keyword, 2)))
+        phones = ['+380501234567', '+380671112234', '+380671112233']
+        self.assertEqual(
+            {k: names(v) for k, v in book.find_by_phones(phones).items()},
+            {k: names(v) for k, v in memory_book.find_by_phones(phones).items()},
+        )
+        self.assertEqual(names(book.contacts_by_domain('EXAMPLE.com')), ['Petro'])
+        self.assertEqual(names(book.contacts_by_local_part('P')), ['Petro'])
+        for terms in (
+            [QueryTerm('phone', '0501'), QueryTerm('name', 'anna', True)],
+            [QueryTerm('email', '@example.com'), QueryTerm('birthday', (201, 331))],
+            [QueryTerm(None, 'o'), QueryTerm('birthday', (1001, 1231), True)],
+        ):
+            with self.subTest(terms=terms):
+                self.assertEqual(names(book.query(terms)), names(memory_book.query(terms)))
+        self.assertEqual(book.email_domains(), memory_book.email_domains())
+        self.assertEqual(
+            [(r.name, date) for r, date in book.upcoming_birthdays(365, datetime.date(2023, 2, 20))],
+            [(r.name, date) for r, date in memory_book.upcoming_birthdays(365, datetime.date(2023, 2, 20))],
+        )
+        self.assertEqual(str(pickle.loads(pickle.dumps(book)).find('Olena K')), str(memory_book.find('Olena K')))
+
+    def test_compaction(self):
+        """Test that the rows are kept after the deleted ones are dropped from the columns"""
+        book = ColumnarAddressBook(*(Record(f'Contact {i}', phones=[f'+38050{1000000 + i}']) for i in range(3000)))
+        for i in range(0, 3000, 2):
+            book.delete_record(f'Contact {i}')
+        self.assertEqual(len(book), 1500)
+        self.assertEqual(book.find('Contact 2999').phones, ['+380501002999'])
+        self.assertEqual([record.name for record in book.find_by_phone('+380501001001')], ['Contact 1001'])
+
+
+class TestDuplicates(unittest.TestCase):
+    """Test cases for the duplicate contact records detection and merge"""
+
+    def setUp(self):
+        self.book = AddressBook(
+            Record('Ivan Petrenko', phones=['+380501234567'], emails=['ivan@example.com']),
+            Record('Petrenko Ivan', address='Kyiv', birthday='01.02.1990', emails=['IVAN@example.com']),
+            Record('Ivan Petrneko', phones=['+380 50 123 45 67']),
+            Record('Olena', phones=['+380501234567']),
+            Record('Taras Shevchenko'),
+        )
+
+    def test_find_duplicates(self):
+        """Test that only the records sharing a blocking key are scored, the highest score first"""
+        self.assertEqual(name_key('Ivan Petrneko'), name_key('petrenko  IVAN'))
+        self.assertEqual(
+            [(i.first, i.second, i.reasons) for i in self.book.find_duplicates()],
+            [
+                ('Ivan Petrenko', 'Ivan Petrneko', ('name', 'phone')),
+                ('Ivan Petrenko', 'Petrenko Ivan', ('name', 'email')),
+            ],
+        )
+        self.assertEqual(
+            [(i.first, i.second, i.score) for i in self.book.find_duplicates(min_score=0.3)][2:],
+            [('Ivan Petrneko', 'Petrenko Ivan', 0.423), ('Ivan Petrenko', 'Olena', 0.377), ('Ivan Petrneko', 'Olena', 0.377)],
+        )
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(
+                find_duplicates(self.book, 0.3, executor, chunk_size=1), self.book.find_duplicates(min_score=0.3)
+            )
+
+    def test_merge_records(self):
+        """Test that the duplicate values missing in the kept record are added to it, and the duplicate deleted"""
+        record = self.book.merge_records('ivan petrenko', 'Petrenko Ivan')
+        self.assertEqual(str(record), str(Record(
+            'Ivan Petrenko', address='Kyiv', birthday='01.02.1990',
+            phones=['+380501234567'], emails=['ivan@example.com']
+        )))
+        self.assertNotIn('Petrenko Ivan', self.book)
+        self.assertEqual([i.name for i in self.book.search('kyiv')], ['Ivan Petrenko'])
+        self.assertRaises(address_book_errors.ContactNotFound, self.book.merge_records, 'Ivan Petrenko', 'Nobody')
+
+
+class TestUpcomingBirthdays(unittest.TestCase):
+    """Test cases for the upcoming birthdays through the birthday index"""
+
+    @staticmethod
+    def birthday(days):
+        day = datetime.date.today() + datetime.timedelta(days=days)
+        return day.replace(year=1990 if (day.month, day.day) != (2, 29) else 1992).strftime('%d.%m.%Y')
+
+    def names(self, book, period=7):
+        return sorted(i.contact.name for i in book.upcoming_birthdays(period))
+
+    def test_index_follows_changes(self):
+        """Test that the birthdays within the period are found after the birthdays are added, edited and deleted"""
+        book = AddressBook(
+            Record('Ivan', birthday=self.birthday(2)),
+            Record('Olena', birthday=self.birthday(30)),
+            Record('Petro'),
+        )
+        self.assertEqual(self.names(book), ['Ivan'])
+        book['Olena'].edit_birthday(self.birthday(5))
+        book['Petro'].add_birthday(self.birthday(0))
+        book['Ivan'].delete_birthday()
+        book.add_record(Record('Taras', birthday=self.birthday(7)))
+        self.assertEqual(self.names(book), ['Olena', 'Petro', 'Taras'])
+        book.delete_record('Olena')
+        self.assertEqual(self.names(book, 3), ['Petro'])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorized_engine(self):
+        """Test that the vectorized engine returns the same dates and contacts as the per record computation"""
+        book = AddressBook.restore(
+            (name, Record.restore(name, birthday=birthday)) for name, birthday in [
+                ('Leap', datetime.date(1992, 2, 29)),
+                ('March', datetime.date(1990, 3, 1)),
+                ('Saturday', datetime.date(1985, 1, 4)),
+                ('New Year', datetime.date(2000, 1, 1)),
+                ('December', datetime.date(1979, 12, 30)),
+                ('No birthday', None),
+            ]
+        )
+        for today in [datetime.date(2023, 2, 26), datetime.date(2024, 2, 26), datetime.date(2025, 12, 28)]:
+            for period in [0, 3, 7, 30]:
+                with self.subTest(today=today, period=period):
+                    self.assertEqual(
+                        book.upcoming_birthdays_by_days(period, today=today, vectorized=True),
+                        book.upcoming_birthdays_by_days(period, today=today),
+                    )
+        book['Leap'].delete_birthday()
+        self.assertNotIn(book['Leap'], sum(book.upcoming_birthdays_by_days(7, datetime.date(2023, 2, 26), True).values(), []))
+
+
+if __name__ == '__main__':
+    unittest.main()
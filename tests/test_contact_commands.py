@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contact_commands
+from books import AddressBook, Record
+from books.address_book import QueryTerm
+
+
+class TestSearchQuery(unittest.TestCase):
+    """Test cases for the contact search query parsing"""
+
+    def test_split_query(self):
+        """Test that only the paired double quotes group the words"""
+        self.assertEqual(contact_commands._split_query("Мар'яна  Kyiv "), ["Мар'яна", "Kyiv"])
+        self.assertEqual(
+            contact_commands._split_query('name:"Ivan Petrenko" -phone:067'), ["name:Ivan Petrenko", "-phone:067"]
+        )
+        self.assertEqual(contact_commands._split_query('"O Neil" O"Neil'), ["O Neil", 'O"Neil'])
+
+    def test_parse_query(self):
+        """Test that the words are parsed into the query terms"""
+        self.assertEqual(
+            contact_commands._parse_query('"Ivan Petrenko" -address:Lviv birthday:20.12..10.01'),
+            [
+                QueryTerm(None, "Ivan Petrenko"),
+                QueryTerm("address", "Lviv", True),
+                QueryTerm("birthday", (1220, 110)),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            contact_commands._parse_query('name:""')
+
+    def test_search_by_quoted_phrase(self):
+        """Test that the ranked search looks up the phrase without the quotes"""
+        book = AddressBook(Record("Ivan Petrenko"), Record("Мар'яна"), Record("Petro"))
+        for query, name in (('"Ivan Petrenko"', "Ivan Petrenko"), ("Мар'яна", "Мар'яна")):
+            with self.subTest(query=query), patch.object(contact_commands, "_print_contacts_table") as table:
+                contact_commands.handle_contact_command(f"search contact {query}", book)
+                self.assertEqual([r.name for r in table.call_args.args[0]], [name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import io
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contact_import
+from books import AddressBook, Record
+from books.address_book.record import Phone
+
+
+class TestReaders(unittest.TestCase):
+    """Test cases for the CSV and vCard readers"""
+
+    def test_read_csv(self):
+        """Test that the known columns are read and the lists are split"""
+        rows = list(contact_import.read_csv(io.StringIO(
+            "Name,Phones,Email,Address,Birthday,Notes\n"
+            "Ivan,+380501234567; +380671234567,ivan@example.com,\"Kyiv, Khreshchatyk 1\",01.01.1990,friend\n"
+            ",,,,,\n"
+            "Олена,,,,,\n"
+        )))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].name, "Ivan")
+        self.assertEqual(rows[0].phones, ["+380501234567", "+380671234567"])
+        self.assertEqual(rows[0].emails, ["ivan@example.com"])
+        self.assertEqual(rows[0].address, "Kyiv, Khreshchatyk 1")
+        self.assertEqual(rows[0].birthday, "01.01.1990")
+        self.assertEqual((rows[1].line, rows[1].name, rows[1].phones, rows[1].address), (4, "Олена", [], None))
+
+    def test_read_csv_without_name_column(self):
+        """Test that a CSV file without the name column is rejected"""
+        with self.assertRaises(ValueError):
+            list(contact_import.read_csv(io.StringIO("phone\n+380501234567\n")))
+
+    def test_read_vcard(self):
+        """Test that the vCard properties, folded lines and escapes are read"""
+        rows = list(contact_import.read_vcard(io.StringIO(
+            "BEGIN:VCARD\r\n"
+            "VERSION:3.0\r\n"
+            "N:Petrenko;Ivan;;;\r\n"
+            "item1.TEL;TYPE=CELL:+380 50 123 45 67\r\n"
+            "EMAIL;TYPE=INTERNET:ivan@example.com\r\n"
+            "ADR;TYPE=HOME:;;Khreshchatyk 1\\, apt 2;Kyiv;;01001;\r\n"
+            " Ukraine\r\n"
+            "BDAY:1990-01-31\r\n"
+            "END:VCARD\r\n"
+            "BEGIN:VCARD\r\n"
+            "FN:Олена\r\n"
+            "END:VCARD\r\n"
+        )))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].name, "Ivan Petrenko")
+        self.assertEqual(rows[0].phones, ["+380 50 123 45 67"])
+        self.assertEqual(rows[0].emails, ["ivan@example.com"])
+        self.assertEqual(rows[0].address, "Khreshchatyk 1, apt 2, Kyiv, 01001, Ukraine")
+        self.assertEqual(rows[0].birthday, "31.01.1990")
+        self.assertEqual((rows[1].line, rows[1].name), (10, "Олена"))
+
+
+class TestPhoneBatchValidation(unittest.TestCase):
+    """Test cases for the batched phone numbers normalization"""
+
+    def test_prepare_many(self):
+        """Test that the batch keeps the order and marks the invalid numbers, with and without the process pool"""
+        phones = ["+380 50 123 45 67", "12", "", "+1 (202) 555-0143"] * 5
+        expected = ["+380501234567", None, None, "+12025550143"] * 5
+        self.assertEqual(Phone.prepare_many(phones, chunk_size=3), expected)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(Phone.prepare_many(phones, executor, chunk_size=3), expected)
+
+    def test_record_takes_validated_phones(self):
+        """Test that the Phone fields are added to the record without normalizing them again"""
+        with patch.object(Phone, "prepare", wraps=Phone.prepare) as prepare:
+            record = Record("Ivan", phones=[Phone.restore("+380501234567"), Phone.restore("+380501234567")])
+            record.add_phone(Phone.restore("+380671234567"))
+            prepare.assert_not_called()
+            record.add_phone("+380 93 123 45 67")
+            self.assertEqual(prepare.call_count, 1)
+        self.assertEqual(record.phones, ["+380501234567", "+380671234567", "+380931234567"])
+
+
+class TestImportContacts(unittest.TestCase):
+    """Test cases for the bulk import into the address book"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = Path(self.tmp_dir.name) / "contacts.csv"
+        self.rejected_path = Path(self.tmp_dir.name) / "contacts.csv.rejected.csv"
+
+    def test_import_in_batches_with_rejected_rows(self):
+        """Test that the valid rows are added in batches, and the invalid ones and duplicates are reported"""
+        lines = ["name,phones,emails,birthday"]
+        lines += [f"Contact {i},+38050{i:07d},c{i}@example.com," for i in range(25)]
+        lines += ["Bad phone,123,,", "Bad email,,not an email,", "Bad birthday,,,31.02.1990", ",+380501234567,,"]
+        lines += ["Contact 3,,,", "Existing,,,"]
+        self.path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        book = AddressBook(Record("Existing"))
+        events = []
+        book.subscribe(lambda event, *args: events.append(event))
+        report = contact_import.import_contacts(book, self.path, rejected_path=self.rejected_path, chunk_size=10)
+
+        self.assertEqual(report.imported, 25)
+        self.assertEqual(len(book), 26)
+        self.assertEqual(book.find("Contact 7").phones, ["+380500000007"])
+        self.assertEqual(events, ["add_records"] * 3)
+        self.assertEqual(report.rejected_count, 6)
+        self.assertEqual(report.rejected["ContactPhoneValueError"], 1)
+        self.assertEqual(report.rejected["ContactEmailValueError"], 1)
+        self.assertEqual(report.rejected["ContactBirthdayValueError"], 1)
+        self.assertEqual(report.rejected["ContactNameMandatory"], 1)
+        self.assertEqual(report.rejected["ContactAlreadyExist"], 2)
+        rejected = self.rejected_path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(rejected[0], "line,name,error")
+        self.assertEqual([i.split(",")[0] for i in rejected[1:]], ["27", "28", "29", "30", "31", "32"])
+
+    def test_import_with_process_pool(self):
+        """Test that the phone numbers normalized by the worker processes give the same result"""
+        self.path.write_text("name,phones\nIvan,+380 50 123 45 67\nPetro,12\nOlena,+380671234567;+380 67 123 45 67\n")
+        book = AddressBook()
+        report = contact_import.import_contacts(book, self.path, workers=2)
+        self.assertEqual((report.imported, report.rejected_count), (2, 1))
+        self.assertEqual(book.find("Ivan").phones, ["+380501234567"])
+        self.assertEqual(book.find("Olena").phones, ["+380671234567"])
+
+    def test_add_records_skips_duplicates(self):
+        """Test that the batch insert skips the existing names and the repeated ones"""
+        book = AddressBook(Record("Ivan"))
+        duplicates = [Record("Ivan"), Record("Petro")]
+        skipped = book.add_records([Record("Petro"), *duplicates])
+        self.assertEqual(list(book), ["Ivan", "Petro"])
+        self.assertEqual([id(i) for i in skipped], [id(i) for i in duplicates])
+
+
+if __name__ == '__main__':
+    unittest.main()
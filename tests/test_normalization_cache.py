@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from books import Record
+from books.address_book.record import Phone
+from books.address_book.record import record as record_module
+from books.address_book.error import ContactPhoneValueError
+from books.commons import NormalizationCache
+
+
+class TestNormalizationCache(unittest.TestCase):
+    """Test cases for the bounded LRU cache of the normalized values"""
+
+    def test_least_recently_used_evicted(self):
+        """Test that the cache keeps at most maxsize entries, evicting the least recently used"""
+        cache = NormalizationCache(2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 0)
+        cache.get('c', lambda: 3)
+        self.assertEqual(cache.get('a', lambda: 0), 1)
+        self.assertEqual(cache.get('b', lambda: 0), 0)
+        self.assertEqual(cache.info(), (2, 4, 2, 2))
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+
+    def test_failures_not_cached(self):
+        """Test that the normalization errors are raised every time"""
+        cache = NormalizationCache()
+
+        def fail():
+            raise ValueError()
+
+        for _ in range(2):
+            self.assertRaises(ValueError, cache.get, 'x', fail)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 2, 0))
+
+
+class TestFieldsNormalization(unittest.TestCase):
+    """Test cases for the phones and emails normalization through the shared cache"""
+
+    def setUp(self):
+        patcher = patch.object(record_module, 'normalization_cache', NormalizationCache(16))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_lookups_hit_cache(self):
+        """Test that the phone lookups and the email edits of a contact reuse the normalized values"""
+        record = Record('Ivan', phones=['+380 50 123 45 67'], emails=['ivan@example.com'])
+        misses = self.cache.misses
+        for _ in range(3):
+            self.assertIsNotNone(record.find_phone('+380 50 123 45 67'))
+        record.edit_email('ivan@example.com', ' ivan@example.com')
+        self.assertEqual(self.cache.misses, misses + 1)
+        self.assertGreaterEqual(self.cache.hits, 4)
+
+    def test_strict_flag_respected(self):
+        """Test that the cached possible number is still rejected in the strict mode"""
+        possible = '+380 00 123 45 67'
+        self.assertEqual(Phone.prepare(possible), '+380001234567')
+        with patch.object(Phone, 'strict', True):
+            self.assertRaises(ContactPhoneValueError, Phone.prepare, possible)
+        self.assertEqual(Phone.prepare(possible), '+380001234567')
+
+
+if __name__ == '__main__':
+    unittest.main()
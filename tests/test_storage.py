@@ -0,0 +1,815 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import multiprocessing
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+import sqlite_storage
+from books import AddressBook, Record, NoteBook, Note
+from books.address_book import QueryTerm
+from books.address_book.error import ContactAlreadyExist
+from books.commons import TrigramIndex, BKTree
+
+
+def add_contact_in_session(name: str, compact: bool) -> None:
+    """Adds the contact in the file backend session of another process, folding the journal if asked"""
+    with storage.init_books_data() as (address_book, _):
+        address_book.add_record(Record(name))
+    if compact:
+        storage.Compactor(storage.Journal()).compact()
+
+
+class StorageTestCase(unittest.TestCase):
+    """Base test case that keeps the data files in a temporary directory"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        tmp_path = Path(self.tmp_dir.name)
+        for name, value in (
+                ("DATA_FILE", tmp_path / "data.snapshot"),
+                ("LEGACY_DATA_FILE", tmp_path / "data.pkl"),
+                ("JOURNAL_FILE", tmp_path / "data.journal"),
+                ("SQLITE_FILE", tmp_path / "data.sqlite3"),
+                ("LOCK_FILE", tmp_path / "data.lock"),
+        ):
+            patcher = patch.object(storage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestJournal(StorageTestCase):
+    """Test cases for the append-only change journal"""
+
+    def test_changes_are_replayed_on_load(self):
+        """Test that the changes made in a session are restored without a full save"""
+        with storage.init_books_data() as (address_book, note_book):
+            address_book.add_record(Record("Ivan", phones=["+380501234567"]))
+            address_book.add_record(Record("Petro"))
+            address_book.find("Ivan").edit_phone("+380501234567", "+380671234567")
+            address_book.find("Ivan").add_email("ivan@example.com")
+            address_book.delete_record("Petro")
+            address_book.add_record(Record("Olena"))
+            address_book.find("Olena").edit_name("Olena Petrenko")
+            index = note_book.add_note(Note("Plan", "Buy #milk"))
+            note_book.get_note(index)[1].replace_tags("food")
+
+        self.assertFalse(storage.DATA_FILE.exists())
+        address_book, note_book = storage.load_data()
+        self.assertEqual(list(address_book), ["Ivan", "Olena Petrenko"])
+        self.assertEqual(address_book.find("Ivan").phones, ["+380671234567"])
+        self.assertEqual(address_book.find("Ivan").emails, ["ivan@example.com"])
+        self.assertEqual(note_book.get_note(1)[1].tags_list, ["food"])
+
+    def test_replay_on_top_of_snapshot(self):
+        """Test that the journal is applied on top of the saved snapshot"""
+        storage.save_data(AddressBook(Record("Ivan")), NoteBook())
+        with storage.init_books_data() as (address_book, _):
+            address_book.find("Ivan").edit_address("Kyiv")
+
+        address_book, _ = storage.load_data()
+        self.assertEqual(address_book.find("Ivan").address, "Kyiv")
+
+    def test_read_only_session_writes_nothing(self):
+        """Test that a session without changes does not create any files"""
+        with storage.init_books_data() as (address_book, _):
+            list(address_book.items())
+        self.assertEqual(storage.Journal().segments(), [])
+        self.assertFalse(storage.DATA_FILE.exists())
+
+    def test_torn_tail_is_dropped(self):
+        """Test that an interrupted journal write does not break the loading"""
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_record(Record("Ivan"))
+        with open(storage.Journal().segments()[-1][1], "ab") as f:
+            f.write(b"\x80\x05\x95")
+
+        address_book, _ = storage.load_data()
+        self.assertEqual(list(address_book), ["Ivan"])
+
+    def test_save_data_clears_journal(self):
+        """Test that a full save folds the journal into the snapshot"""
+        with storage.init_books_data() as (address_book, note_book):
+            address_book.add_record(Record("Ivan"))
+        storage.save_data(*storage.load_data())
+        self.assertEqual(storage.Journal().segments(), [])
+        self.assertEqual(list(storage.load_data()[0]), ["Ivan"])
+
+
+class TestSnapshot(StorageTestCase):
+    """Test cases for the binary snapshot format"""
+
+    def test_round_trip(self):
+        """Test that the snapshot restores the same books"""
+        address_book = AddressBook(
+            Record("Ivan", address="Kyiv", birthday="29.02.2000", phones=["+380501234567", "+380671234567"],
+                   emails=["ivan@example.com"]),
+            Record("Олена"),
+            upcoming_birthdays_period=10,
+        )
+        note_book = NoteBook(Note("Plan", "Buy #milk", tags=["food"]), Note("Todo", "Call Ivan"), unique_titles=True)
+        note_book.delete_note(1)
+
+        restored_book, restored_notes, journal_seq = storage.unpack_snapshot(
+            storage.pack_snapshot(address_book, note_book, 5)
+        )
+        self.assertEqual(journal_seq, 5)
+        self.assertEqual(list(restored_book), ["Ivan", "Олена"])
+        self.assertEqual(str(restored_book["Ivan"]), str(address_book["Ivan"]))
+        self.assertEqual(str(restored_book["Олена"]), str(address_book["Олена"]))
+        self.assertEqual(restored_book.upcoming_birthdays_period, 10)
+        self.assertTrue(restored_notes.unique_titles)
+        self.assertEqual([(i, str(n)) for i, n in restored_notes.notes()], [(2, str(note_book.get_note(2)[1]))])
+        self.assertFalse(restored_book.dirty)
+
+        restored_book["Ivan"].add_email("ivan@work.com")
+        self.assertTrue(restored_book.dirty)
+
+    def test_invalid_snapshot(self):
+        """Test that a foreign or truncated file is rejected"""
+        data = storage.pack_snapshot(AddressBook(Record("Ivan")), NoteBook(), 0)
+        with self.assertRaises(storage.SnapshotFormatError):
+            storage.unpack_snapshot(b"not a snapshot" + data)
+        with self.assertRaises(storage.SnapshotFormatError):
+            storage.unpack_snapshot(data[:-5])
+
+    def test_search_index_is_restored(self):
+        """Test that the search index is loaded with the snapshot and follows the changes, instead of being built
+        by the first search
+        """
+        address_book = AddressBook(Record("Ivan Petrenko", address="Kyiv"), Record("Straße", emails=["info@ex.com"]))
+        restored_book, _, _ = storage.unpack_snapshot(storage.pack_snapshot(address_book, NoteBook(), 0))
+        with patch.object(TrigramIndex, "trigrams", wraps=TrigramIndex.trigrams) as trigrams:
+            self.assertEqual([r.name for r in restored_book.search("STRASSE")], ["Straße"])
+            self.assertEqual([r.name for r in restored_book.search("petr")], ["Ivan Petrenko"])
+            self.assertEqual(trigrams.call_count, 2)
+        restored_book.find("Ivan Petrenko").edit_address("Lviv")
+        restored_book.add_record(Record("Petro"))
+        self.assertEqual([r.name for r in restored_book.search("kyiv")], [])
+        self.assertEqual([r.name for r in restored_book.search("petr")], ["Ivan Petrenko", "Petro"])
+        self.assertEqual([r.name for r in restored_book.search_by_address("lvi")], ["Ivan Petrenko"])
+
+    def test_fuzzy_index_is_restored(self):
+        """Test that the name words tree is loaded with the snapshot and follows the changes, instead of being built
+        by the first fuzzy search
+        """
+        address_book = AddressBook(Record("Ivan Petrenko"), Record("Petro"), Record("Olena"))
+        address_book.delete_record("Olena")
+        restored_book, _, _ = storage.unpack_snapshot(storage.pack_snapshot(address_book, NoteBook(), 0))
+        with patch.object(BKTree, "add", wraps=BKTree.add) as add:
+            self.assertEqual([r.name for r in restored_book.search_fuzzy("Petrneko")], ["Ivan Petrenko"])
+            self.assertEqual([r.name for r in restored_book.search_fuzzy("olen")], [])
+            self.assertEqual(add.call_count, 0)
+        restored_book.find("Petro").edit_name("Olena")
+        restored_book.add_record(Record("Pavlo"))
+        self.assertEqual([r.name for r in restored_book.search_fuzzy("olen")], ["Olena"])
+        self.assertEqual([r.name for r in restored_book.search_fuzzy("petr")], [])
+        self.assertEqual([r.name for r in restored_book.search_fuzzy("pavel")], ["Pavlo"])
+
+    def test_legacy_pickle_migration(self):
+        """Test that the pickle data file is converted into the snapshot and kept as a backup"""
+        with open(storage.LEGACY_DATA_FILE, "wb") as f:
+            pickle.dump({"contacts": AddressBook(Record("Ivan", phones=["+380501234567"])), "notes": NoteBook()}, f)
+
+        address_book, _ = storage.load_data()
+        self.assertEqual(address_book["Ivan"].phones, ["+380501234567"])
+        self.assertTrue(storage.DATA_FILE.exists())
+        self.assertFalse(storage.LEGACY_DATA_FILE.exists())
+        self.assertTrue(storage.LEGACY_DATA_FILE.with_name("data.pkl.bak").exists())
+
+    @unittest.skipIf(os.name == "nt", "POSIX file permissions")
+    def test_snapshot_file_permissions(self):
+        """Test that the snapshot file gets the default permissions, and keeps the ones set by the user"""
+        umask = os.umask(0o022)
+        self.addCleanup(os.umask, umask)
+        storage._write_snapshot(AddressBook(Record("Ivan")), NoteBook(), 0)
+        self.assertEqual(storage.DATA_FILE.stat().st_mode & 0o777, 0o644)
+
+        storage.DATA_FILE.chmod(0o640)
+        storage._write_snapshot(AddressBook(Record("Ivan")), NoteBook(), 1)
+        self.assertEqual(storage.DATA_FILE.stat().st_mode & 0o777, 0o640)
+
+
+class TestCompactor(StorageTestCase):
+    """Test cases for the background journal compaction"""
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        """Test that the compaction leaves only the changes made after it in the journal"""
+        journal = storage.Journal()
+        address_book, note_book = storage.load_data(journal)
+        journal.attach(address_book, note_book)
+        for i in range(10):
+            address_book.add_record(Record(f"Contact {i}"))
+
+        compactor = storage.Compactor(journal)
+        compactor.compact()
+        address_book.delete_record("Contact 0")
+        note_book.add_note(Note("Plan", "Buy milk"))
+        journal.detach(address_book, note_book)
+
+        self.assertEqual(len(journal.segments()), 1)
+        snapshot, _, _ = storage._load_snapshot()
+        self.assertEqual(len(snapshot), 10)
+
+        address_book, note_book = storage.load_data()
+        self.assertEqual(list(address_book), [f"Contact {i}" for i in range(1, 10)])
+        self.assertEqual(note_book.get_note(1)[1].title, "Plan")
+
+    def test_interrupted_checkpoint_is_not_replayed_twice(self):
+        """Test that the segments already folded into the snapshot are skipped on load"""
+        with storage.init_books_data() as (address_book, note_book):
+            index = note_book.add_note(Note("Plan", "Buy milk"))
+            note_book.get_note(index)[1].add_tags("food")
+        journal = storage.Journal()
+        frozen = journal.rotate()
+        segment = journal.segment(frozen).read_bytes()
+        storage.checkpoint(journal, frozen)
+        # The crash between the snapshot swap and the segments removal
+        journal.segment(frozen).write_bytes(segment)
+
+        _, note_book = storage.load_data()
+        self.assertEqual(len(note_book), 1)
+        self.assertEqual(storage.Journal().segments(), [])
+
+    def test_background_thread_compacts_grown_journal(self):
+        """Test that the compactor thread folds the journal over the threshold"""
+        journal = storage.Journal()
+        address_book, note_book = storage.load_data(journal)
+        journal.attach(address_book, note_book)
+        address_book.add_record(Record("Ivan"))
+
+        compactor = storage.Compactor(journal, interval=0.01, threshold=1)
+        compactor.start()
+        for _ in range(500):
+            if storage.DATA_FILE.exists():
+                break
+            compactor.join(0.01)
+        compactor.stop()
+
+        self.assertEqual(journal.segments(), [])
+        self.assertEqual(list(storage.load_data()[0]), ["Ivan"])
+
+
+class TestDirtyTrackingAndAutosave(StorageTestCase):
+    """Test cases for the books dirty tracking and the debounced autosave"""
+
+    def test_books_track_changes(self):
+        """Test that the book and record changes mark the book as changed"""
+        address_book, note_book = storage.load_data()
+        self.assertFalse(address_book.dirty)
+        address_book.add_record(Record("Ivan"))
+        self.assertTrue(address_book.dirty)
+        address_book.mark_clean()
+        address_book.find("Ivan").add_phone("+380501234567")
+        self.assertTrue(address_book.dirty)
+        self.assertFalse(note_book.dirty)
+
+    def test_unchanged_books_are_not_rewritten(self):
+        """Test that saving the unchanged books does not touch the snapshot"""
+        storage.save_data(AddressBook(Record("Ivan")), NoteBook())
+        mtime = storage.DATA_FILE.stat().st_mtime_ns
+        address_book, note_book = storage.load_data()
+        with patch.object(storage, "_write_snapshot") as write_snapshot:
+            storage.save_data(address_book, note_book)
+        write_snapshot.assert_not_called()
+        self.assertEqual(storage.DATA_FILE.stat().st_mtime_ns, mtime)
+
+    def test_autosave_is_debounced(self):
+        """Test that a burst of changes results in one flush after the delay"""
+        flushes = []
+        autosave = storage.Autosave(lambda: flushes.append(True), delay=0.05)
+        autosave.start()
+        for _ in range(5):
+            autosave.touch("record")
+        for _ in range(100):
+            if flushes:
+                break
+            autosave.join(0.01)
+        autosave.stop()
+        self.assertEqual(flushes, [True])
+
+    def test_session_flushes_changes(self):
+        """Test that the session makes the changes durable and leaves the books saved"""
+        with patch.object(storage.Journal, "sync") as sync:
+            with storage.init_books_data() as (address_book, _):
+                address_book.add_record(Record("Ivan"))
+            sync.assert_called_once()
+        self.assertFalse(address_book.dirty)
+
+
+class TestLazySnapshot(StorageTestCase):
+    """Test cases for the books read from the memory-mapped snapshot"""
+
+    def setUp(self):
+        super().setUp()
+        self.records = [
+            ("Ivan Petrenko", "Kyiv, Khreshchatyk 1", ["+380501234567"], ["ivan@example.com"], "01.01.1990"),
+            ("Олена Іваненко", "Львів, Straße 5", ["+380671112233"], [], None),
+            ("Petro", None, [], ["PETRO@mail.com"], None),
+        ]
+        self.memory_book = AddressBook(*(
+            Record(name, address=address, phones=phones, emails=emails, birthday=birthday)
+            for name, address, phones, emails, birthday in self.records
+        ))
+        storage.save_data(self.memory_book, NoteBook(Note("Plan", "Buy #milk"), Note("Call", "Mom")))
+
+    def test_records_are_built_on_access(self):
+        """Test that opening the books builds no records, and the lookups build only the found ones"""
+        address_book, note_book = storage.load_data(lazy=True)
+        self.assertIsInstance(address_book, storage.SnapshotAddressBook)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            self.assertEqual(len(address_book), 3)
+            self.assertEqual(list(address_book), sorted(name for name, *_ in self.records))
+            self.assertIn("Petro", address_book)
+            self.assertNotIn("Pet", address_book)
+            record = address_book.find("Petro")
+            self.assertIs(record, address_book.find("Petro"))
+            self.assertEqual(record.emails, ["PETRO@mail.com"])
+            with self.assertRaises(KeyError):
+                address_book.find("Pet")
+            self.assertEqual(contact.call_count, 1)
+        self.assertEqual(note_book.get_note(2)[1].title, "Call")
+        self.assertEqual(note_book.get_note(1)[1].tags_list, ["milk"])
+
+    def test_search_and_birthdays_match_in_memory_book(self):
+        """Test that the search over the mapped snapshot returns the same records as the in-memory address book"""
+        address_book, _ = storage.load_data(lazy=True)
+        address_book.find("Petro").edit_address("Одеса")
+        self.memory_book.find("Petro").edit_address("Одеса")
+        for keyword in (
+                "iv", "ivan", "ІВАН", "львів", "одеса", "strasse", "SS", "+38067", "0501", "mail.com", "petr", "zzz",
+        ):
+            with self.subTest(keyword=keyword):
+                self.assertEqual(
+                    [r.name for r in address_book.search(keyword)],
+                    [r.name for r in self.memory_book.search(keyword)],
+                )
+                self.assertEqual(
+                    [r.name for r in address_book.search_by_address(keyword)],
+                    [r.name for r in self.memory_book.search_by_address(keyword)],
+                )
+        for terms in (
+            [QueryTerm("name", "іван"), QueryTerm("address", "kyiv", True)],
+            [QueryTerm("birthday", (1201, 131))],
+            [QueryTerm("email", "@mail.com"), QueryTerm("address", "одеса")],
+            [QueryTerm("address", "strasse")],
+        ):
+            with self.subTest(terms=terms):
+                self.assertEqual(
+                    [r.name for r in address_book.query(terms)],
+                    [r.name for r in self.memory_book.query(terms)],
+                )
+        for period in (7, 365):
+            with self.subTest(period=period):
+                self.assertEqual(
+                    [r.name for r, _ in address_book.upcoming_birthdays(period)],
+                    [r.name for r, _ in self.memory_book.upcoming_birthdays(period)],
+                )
+
+    def test_search_uses_trigram_index(self):
+        """Test that the search of the longer keywords looks the rows up in the trigram index of the snapshot"""
+        address_book, _ = storage.load_data(lazy=True)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            self.assertEqual([r.name for r in address_book.search("іваненко")], ["Олена Іваненко"])
+            self.assertEqual(reader.trigram_rows("іваненко"), {2})
+            self.assertEqual(reader.trigram_rows("zzz"), set())
+            self.assertIsNone(reader.trigram_rows("iv"))
+            self.assertEqual(contact.call_count, 1)
+
+    def test_phone_lookup_uses_phone_postings(self):
+        """Test that the phone numbers are looked up in the snapshot, building only the records having them"""
+        address_book, _ = storage.load_data(lazy=True)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            self.assertEqual([r.name for r in address_book.find_by_phone("+380 67 111 22 33")], ["Олена Іваненко"])
+            self.assertEqual(reader.phone_rows(["+380501234567", "+380000000000"]), {
+                "+380501234567": [0], "+380000000000": [],
+            })
+            self.assertEqual(contact.call_count, 1)
+        address_book.find("Petro").add_phone("+380501234567")
+        address_book.find("Олена Іваненко").remove_phone("+380671112233")
+        self.assertEqual(
+            {k: [r.name for r in v] for k, v in address_book.find_by_phones(["+380501234567", "+380671112233"]).items()},
+            {"+380501234567": ["Ivan Petrenko", "Petro"], "+380671112233": []},
+        )
+
+    def test_email_lookups_use_email_postings(self):
+        """Test that the emails and domains are looked up in the snapshot, building only the records having them"""
+        address_book, _ = storage.load_data(lazy=True)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            self.assertEqual([r.name for r in address_book.find_by_email("petro@MAIL.com")], ["Petro"])
+            self.assertEqual([r.name for r in address_book.contacts_by_domain("EXAMPLE.com")], ["Ivan Petrenko"])
+            self.assertEqual(address_book.email_domains(), {"example.com": 1, "mail.com": 1})
+            self.assertEqual(reader.domain_rows(["mail.com", "nowhere.org"]), {"mail.com": [1], "nowhere.org": []})
+            self.assertEqual([r.name for r in address_book.contacts_by_local_part("Petro")], ["Petro"])
+            self.assertEqual(contact.call_count, 2)
+        address_book.find("Олена Іваненко").add_email("olena@Mail.com")
+        address_book.find("Ivan Petrenko").remove_email("ivan@example.com")
+        self.assertEqual([r.name for r in address_book.contacts_by_domain("mail.com")], ["Petro", "Олена Іваненко"])
+        self.assertEqual([r.name for r in address_book.find_by_email("ivan@example.com")], [])
+        self.assertEqual(address_book.email_domains(), {"mail.com": 2})
+        self.assertEqual([r.name for r in address_book.contacts_by_local_part("olena")], ["Олена Іваненко"])
+
+    def test_query_builds_intersected_rows(self):
+        """Test that the query intersects the rows of its indexed terms before building the records"""
+        address_book, _ = storage.load_data(lazy=True)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            terms = [QueryTerm(None, "petr"), QueryTerm("phone", "+38050"), QueryTerm("name", "i")]
+            self.assertEqual([r.name for r in address_book.query(terms)], ["Ivan Petrenko"])
+            self.assertEqual(contact.call_count, 1)
+
+    def test_fuzzy_search_uses_name_words_tree(self):
+        """Test that the fuzzy search looks the name words up in the tree of the snapshot and sees the changes"""
+        address_book, note_book = storage.load_data(lazy=True)
+        reader = address_book.data.reader
+        with patch.object(reader, "contact", wraps=reader.contact) as contact:
+            self.assertEqual([r.name for r in address_book.search_fuzzy("Petrneko")], ["Ivan Petrenko"])
+            self.assertEqual(reader.fuzzy_rows("іваненко", 0), {2})
+            self.assertEqual(reader.fuzzy_rows("zzz", 1), set())
+            self.assertEqual(contact.call_count, 1)
+        address_book.find("Petro").edit_name("Pavlo")
+        address_book.delete_record("Ivan Petrenko")
+        self.assertEqual([r.name for r in address_book.search_fuzzy("pavel")], ["Pavlo"])
+        self.assertEqual([r.name for r in address_book.search_fuzzy("petr")], [])
+
+        storage.save_data(address_book, note_book)
+        address_book, _ = storage.load_data(lazy=True)
+        self.assertEqual(set(address_book.data.reader.word_tree()), {"pavlo", "олена", "іваненко"})
+        self.assertEqual([r.name for r in address_book.search_fuzzy("Олна Іваненко")], ["Олена Іваненко"])
+        self.assertEqual([r.name for r in address_book.search_fuzzy("pavel")], ["Pavlo"])
+
+    def test_changes_are_kept_on_top_of_snapshot(self):
+        """Test that the changes of the lazy books are journaled and visible in the session"""
+        with patch.object(storage, "SNAPSHOT_LOADING", "lazy"):
+            with storage.init_books_data() as (address_book, note_book):
+                self.assertIsInstance(address_book, storage.SnapshotAddressBook)
+                address_book.add_record(Record("Anna"))
+                address_book.delete_record("Petro")
+                address_book.find("Ivan Petrenko").add_email("ivan@work.com")
+                self.assertEqual(list(address_book), ["Anna", "Ivan Petrenko", "Олена Іваненко"])
+                self.assertEqual([key for key, _ in address_book.items()], list(address_book))
+                self.assertEqual(len(address_book), 3)
+                self.assertEqual(note_book.add_note(Note("Next", "Text")), 3)
+                note_book.delete_note(1)
+
+        address_book, note_book = storage.load_data()
+        self.assertEqual(list(address_book), ["Anna", "Ivan Petrenko", "Олена Іваненко"])
+        self.assertEqual(address_book.find("Ivan Petrenko").emails, ["ivan@example.com", "ivan@work.com"])
+        self.assertEqual([index for index, _ in note_book.notes()], [2, 3])
+
+
+    def test_columnar_session(self):
+        """Test that the snapshot is loaded into the columnar address book, and its changes are journaled"""
+        with patch.object(storage, "SNAPSHOT_LOADING", "columnar"):
+            with storage.init_books_data() as (address_book, _):
+                self.assertIsInstance(address_book, storage.ColumnarAddressBook)
+                self.assertEqual(list(address_book), sorted(name for name, *_ in self.records))
+                self.assertEqual([r.name for r in address_book.search("STRASSE")], ["Олена Іваненко"])
+                address_book.find("Petro").add_phone("+380931234567")
+                address_book.delete_record("Олена Іваненко")
+                self.assertEqual([r.name for r in address_book.search("0931")], ["Petro"])
+
+        address_book, _ = storage.load_data()
+        self.assertEqual(list(address_book), ["Ivan Petrenko", "Petro"])
+        self.assertEqual(address_book.find("Petro").phones, ["+380931234567"])
+
+class TestSharedDataFiles(StorageTestCase):
+    """Test cases for several processes sharing the data files, each session has its own lock file handle"""
+
+    def open_session(self) -> tuple[AddressBook, NoteBook, storage.Journal]:
+        journal = storage.Journal()
+        address_book, note_book = storage.load_data(journal, lazy=True)
+        journal.attach(address_book, note_book)
+        self.addCleanup(journal.detach, address_book, note_book)
+        return address_book, note_book, journal
+
+    def test_sessions_follow_each_other(self):
+        """Test that the sessions see the changes of each other without reloading the books"""
+        storage.save_data(AddressBook(Record("Anna")), NoteBook())
+        first, first_notes, first_journal = self.open_session()
+        second, second_notes, second_journal = self.open_session()
+
+        self.assertFalse(storage.sync_books(first, first_notes, first_journal))
+        first.add_record(Record("Ivan"))
+        second.add_record(Record("Petro"))
+        second_notes.add_note(Note("Plan", "Buy milk"))
+        self.assertTrue(first_journal.changed())
+
+        self.assertTrue(storage.sync_books(first, first_notes, first_journal))
+        self.assertTrue(storage.sync_books(second, second_notes, second_journal))
+        self.assertEqual(list(first), ["Anna", "Ivan", "Petro"])
+        self.assertEqual(list(second), ["Anna", "Ivan", "Petro"])
+        self.assertEqual(first_notes.get_note(1)[1].title, "Plan")
+
+        first.find("Petro").add_phone("+380501234567")
+        second.delete_record("Anna")
+        storage.sync_books(first, first_notes, first_journal)
+        storage.sync_books(second, second_notes, second_journal)
+        self.assertEqual(second.find("Petro").phones, ["+380501234567"])
+        self.assertEqual(list(first), ["Ivan", "Petro"])
+        self.assertFalse(storage.sync_books(first, first_notes, first_journal))
+
+        address_book, _ = storage.load_data()
+        self.assertEqual(list(address_book), ["Ivan", "Petro"])
+        self.assertEqual(address_book.find("Petro").phones, ["+380501234567"])
+
+    def test_conflicting_changes_are_skipped(self):
+        """Test that an edit of the contact deleted by another session does not break the loading"""
+        storage.save_data(AddressBook(Record("Ivan")), NoteBook())
+        first, first_notes, first_journal = self.open_session()
+        second, _, _ = self.open_session()
+        first.delete_record("Ivan")
+        second.find("Ivan").add_phone("+380501234567")
+
+        storage.sync_books(first, first_notes, first_journal)
+        self.assertEqual(list(first), [])
+        self.assertEqual(list(storage.load_data()[0]), [])
+
+    def test_folded_changes_are_reloaded(self):
+        """Test that the session reloads the books when the unread changes have been folded into the snapshot"""
+        first, first_notes, first_journal = self.open_session()
+        second, _, second_journal = self.open_session()
+        second.add_record(Record("Ivan"))
+        storage.Compactor(second_journal).compact()
+        second.add_record(Record("Petro"))
+        storage.Compactor(second_journal).compact()
+        self.assertEqual(first_journal.segments(), [])
+
+        self.assertTrue(storage.sync_books(first, first_notes, first_journal))
+        self.assertEqual(list(first), ["Ivan", "Petro"])
+        first.add_record(Record("Anna"))
+        self.assertEqual(list(storage.load_data()[0]), ["Anna", "Ivan", "Petro"])
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "The processes share the patched paths")
+    def test_saved_books_keep_changes_of_other_processes(self):
+        """Test that saving the books loaded earlier keeps the changes saved by other processes meanwhile,
+        also the ones already folded into the snapshot
+        """
+        storage.save_data(AddressBook(Record("Anna")), NoteBook())
+        address_book, note_book = storage.load_data()
+        for name, compact in (("FromB", True), ("FromC", False)):
+            process = multiprocessing.get_context("fork").Process(target=add_contact_in_session, args=(name, compact))
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        address_book.add_record(Record("FromA"))
+        address_book.delete_record("Anna")
+        storage.save_data(address_book, note_book)
+        self.assertEqual(list(storage.load_data()[0]), ["FromA", "FromB", "FromC"])
+        self.assertEqual(storage.Journal().segments(), [])
+
+    def test_writer_waits_for_readers(self):
+        """Test that the exclusive lock is taken only after the shared locks are released"""
+        reader = storage.DataLock()
+        writer = storage.DataLock()
+        acquired = threading.Event()
+
+        def write():
+            with writer.exclusive():
+                acquired.set()
+
+        with reader.shared(), storage.DataLock().shared():
+            thread = threading.Thread(target=write)
+            thread.start()
+            self.assertFalse(acquired.wait(0.1))
+        thread.join()
+        self.assertTrue(acquired.is_set())
+
+
+class TestSQLiteStorage(StorageTestCase):
+    """Test cases for the SQLite storage backend"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(storage, "STORAGE_BACKEND", "sqlite")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_are_persisted_and_hydrated_on_demand(self):
+        """Test that the added and edited records are available in the next session"""
+        with storage.init_books_data() as (address_book, note_book):
+            address_book.add_record(Record("Ivan", phones=["+380501234567"], birthday="01.01.1990"))
+            address_book.add_record(Record("Олена", address="Львів"))
+            record = address_book.find("Ivan")
+            record.add_email("Ivan@Example.com")
+            record.edit_phone("+380501234567", "+380671234567")
+            address_book.delete_record("Олена")
+            index = note_book.add_note(Note("Plan", "Buy #milk"))
+            note_book.get_note(index)[1].add_tags("food")
+
+        with storage.init_books_data() as (address_book, note_book):
+            self.assertIsInstance(address_book, sqlite_storage.SQLiteAddressBook)
+            self.assertEqual(list(address_book), ["Ivan"])
+            self.assertEqual(len(address_book), 1)
+            record = address_book.find("Ivan")
+            self.assertIs(record, address_book["Ivan"])
+            self.assertEqual(record.phones, ["+380671234567"])
+            self.assertEqual(record.emails, ["Ivan@Example.com"])
+            self.assertEqual(note_book.get_note(1)[1].tags_list, ["food", "milk"])
+            with self.assertRaises(KeyError):
+                address_book.find("Олена")
+
+    def test_names_are_found_ignoring_case_by_index(self):
+        """Test that the case-insensitive lookup queries the normalized names instead of reading all names"""
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_record(Record("Ivan  Petrenko"))
+            address_book.add_record(Record("Олена"))
+            address_book.add_record(Record("ОЛЕНА"))
+        with storage.init_books_data() as (address_book, _), \
+                patch.object(sqlite_storage.SQLiteRecords, "__iter__", side_effect=AssertionError):
+            self.assertEqual(address_book.find(" ivan PETRENKO ").name, "Ivan  Petrenko")
+            self.assertEqual(address_book.find("ОЛЕНА").name, "ОЛЕНА")
+            with self.assertRaises(KeyError):
+                address_book.find("олена")
+            with self.assertRaises(KeyError):
+                address_book.find("Ivan")
+
+    def test_name_prefixes_are_selected_by_range(self):
+        """Test that the alphabetical browsing and the ranked search select the name ranges instead of sorting
+        all names, in the same order as the in-memory address book
+        """
+        names = ["Ivan", "Ivanna", "IVAN  Petrenko", "Iryna", "Petro", "Олена", "Олег", "ivan"]
+        memory_book = AddressBook(*(Record(name) for name in names))
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_records(Record(name) for name in names)
+        with storage.init_books_data() as (address_book, _), \
+                patch.object(sqlite_storage.SQLiteRecords, "__iter__", side_effect=AssertionError):
+            for prefix in ("I", "Iva", "ivan", "Оле", "", "Z"):
+                with self.subTest(prefix=prefix):
+                    self.assertEqual(
+                        [r.name for r in address_book.prefix(prefix)], [r.name for r in memory_book.prefix(prefix)]
+                    )
+                    self.assertEqual(
+                        [r.name for r in address_book.search_top(prefix, 3)],
+                        [r.name for r in memory_book.search_top(prefix, 3)],
+                    )
+            self.assertEqual(
+                [r.name for r in address_book.range("Ivan", "Petro")],
+                [r.name for r in memory_book.range("Ivan", "Petro")],
+            )
+            self.assertEqual([r.name for r in address_book.range("P")], [r.name for r in memory_book.range("P")])
+
+    def test_fuzzy_search_walks_stored_words_tree(self):
+        """Test that the fuzzy search looks the name words up in the tree stored in the database,
+        without building the tree in the session, and sees the changes of the records
+        """
+        names = ["Ivan Petrenko", "Олена Іваненко", "Petro", "Pavlo Petrenko"]
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_records(Record(name) for name in names[:2])
+            for name in names[2:]:
+                address_book.add_record(Record(name))
+        with storage.init_books_data() as (address_book, _), \
+                patch("books.address_book.book.BKTree", side_effect=AssertionError):
+            self.assertEqual(
+                [r.name for r in address_book.search_fuzzy("Petrneko")], ["Ivan Petrenko", "Pavlo Petrenko"]
+            )
+            self.assertEqual([r.name for r in address_book.search_fuzzy("Олна Іваненко")], ["Олена Іваненко"])
+            self.assertEqual(address_book.data.fuzzy_keys("petr", 1), {"Petro": 1})
+            address_book.find("Petro").edit_name("Pavel")
+            address_book.delete_record("Ivan Petrenko")
+            self.assertEqual([r.name for r in address_book.search_fuzzy("pavel")], ["Pavel", "Pavlo Petrenko"])
+            self.assertEqual([r.name for r in address_book.search_fuzzy("ivan")], [])
+            self.assertEqual([r.name for r in address_book.search_fuzzy("petro")], [])
+
+    def test_renamed_records_are_moved_by_book(self):
+        """Test that the renamed record is moved under the new name, unless the name is taken"""
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_record(Record("Ivan", phones=["+380501234567"]))
+            address_book.add_record(Record("Petro"))
+            self.assertIs(address_book.find("ivan"), address_book["Ivan"])
+            self.assertEqual([r.name for r in address_book.search_fuzzy("Iavn")], ["Ivan"])
+
+            record = address_book.find("Ivan")
+            with self.assertRaises(ContactAlreadyExist):
+                record.edit_name("Petro")
+            self.assertEqual(record.name, "Ivan")
+            self.assertEqual(list(address_book), ["Ivan", "Petro"])
+
+            record.edit_name("Ivan Petrenko")
+            self.assertIs(address_book.find("ivan petrenko"), record)
+            with self.assertRaises(KeyError):
+                address_book.find("ivan")
+            self.assertEqual([r.name for r in address_book.search_fuzzy("Petrenk")], ["Ivan Petrenko"])
+            record.add_email("ivan@example.com")
+
+        with storage.init_books_data() as (address_book, _):
+            self.assertEqual(list(address_book), ["Ivan Petrenko", "Petro"])
+            self.assertEqual(address_book["Ivan Petrenko"].phones, ["+380501234567"])
+            self.assertEqual(address_book["Ivan Petrenko"].emails, ["ivan@example.com"])
+
+    def test_search_matches_in_memory_book(self):
+        """Test that the indexed search returns the same records as the in-memory address book"""
+        records = [
+            ("Ivan Petrenko", "Kyiv, Khreshchatyk 1", ["+380501234567"], ["ivan@example.com"]),
+            ("Олена Іваненко", "Львів, Straße 5", ["+380671112233"], []),
+            ("Petro", None, [], ["PETRO@mail.com"]),
+        ]
+        memory_book = AddressBook()
+        with storage.init_books_data() as (address_book, _):
+            for name, address, phones, emails in records:
+                address_book.add_record(Record(name, address=address, phones=phones, emails=emails))
+                memory_book.add_record(Record(name, address=address, phones=phones, emails=emails))
+
+            for keyword in ("iv", "ivan", "ІВАН", "львів", "strasse", "SS", "+38067", "0501", "mail.com", "petr", "zzz"):
+                with self.subTest(keyword=keyword):
+                    self.assertEqual(
+                        [r.name for r in address_book.search(keyword)],
+                        [r.name for r in memory_book.search(keyword)],
+                    )
+                    self.assertEqual(
+                        [r.name for r in address_book.search_by_name(keyword)],
+                        [r.name for r in memory_book.search_by_name(keyword)],
+                    )
+            for terms in (
+                [QueryTerm("name", "іван"), QueryTerm("phone", "+38067")],
+                [QueryTerm("email", "@MAIL.com")],
+                [QueryTerm(None, "iv"), QueryTerm("address", "kyiv", True)],
+                [QueryTerm("birthday", (1201, 131)), QueryTerm("name", "petr")],
+                [QueryTerm("address", "strasse")],
+            ):
+                with self.subTest(terms=terms):
+                    self.assertEqual(
+                        [r.name for r in address_book.query(terms)],
+                        [r.name for r in memory_book.query(terms)],
+                    )
+            phones = ["+380 67 111 22 33", "+380501234567", "+380931234567", "bad"]
+            self.assertEqual(
+                {k: [r.name for r in v] for k, v in address_book.find_by_phones(phones).items()},
+                {k: [r.name for r in v] for k, v in memory_book.find_by_phones(phones).items()},
+            )
+            for domain in ("example.com", "MAIL.com", "@mail.com", "_ail.com", "nowhere.org"):
+                with self.subTest(domain=domain):
+                    self.assertEqual(
+                        [r.name for r in address_book.contacts_by_domain(domain)],
+                        [r.name for r in memory_book.contacts_by_domain(domain)],
+                    )
+            self.assertEqual(address_book.email_domains(), memory_book.email_domains())
+            self.assertEqual([r.name for r in address_book.find_by_email("petro@MAIL.com")], ["Petro"])
+            self.assertEqual([r.name for r in address_book.contacts_by_local_part("PETRO")], ["Petro"])
+
+    def test_query_selects_records_matching_all_terms(self):
+        """Test that the query hydrates only the records matching all its terms"""
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_record(Record("Ivan Petrenko", phones=["+380501234567"], birthday="01.01.1990"))
+            address_book.add_record(Record("Petro", phones=["+380671112233"], birthday="02.01.1990"))
+            address_book.add_record(Record("Pavlo", birthday="01.01.1991"))
+            select = address_book.data.select
+            selected: list[list[Record]] = []
+
+            def select_records(*args) -> list[Record]:
+                selected.append(records := select(*args))
+                return records
+
+            with patch.object(address_book.data, "select", side_effect=select_records):
+                for terms, names in (
+                    ([QueryTerm(None, "petr"), QueryTerm("phone", "+38050")], ["Ivan Petrenko"]),
+                    ([QueryTerm("birthday", (1231, 101)), QueryTerm("name", "pa")], ["Pavlo"]),
+                ):
+                    with self.subTest(terms=terms):
+                        self.assertEqual([r.name for r in address_book.query(terms)], names)
+                        self.assertEqual([r.name for r in selected.pop()], names)
+
+    def test_schema_is_upgraded(self):
+        """Test that the new columns are filled in the database of the previous schema version"""
+        with storage.init_books_data() as (address_book, _):
+            address_book.add_record(Record("Ivan", emails=["Ivan@Example.com"]))
+        # The first version has no normalized name, email domain and local part columns and no name words tables
+        connection = sqlite3.connect(storage.SQLITE_FILE)
+        with connection:
+            for table, column in (("emails", "domain"), ("emails", "local_part"), ("contacts", "name_normalized")):
+                connection.execute(f"DROP INDEX {table}_{column}")
+                connection.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+            connection.execute("DROP TABLE name_words")
+            connection.execute("DROP TABLE word_tree")
+            connection.execute("PRAGMA user_version = 1")
+        connection.close()
+        with storage.init_books_data() as (address_book, _):
+            self.assertEqual([r.name for r in address_book.contacts_by_domain("example.com")], ["Ivan"])
+            self.assertEqual([r.name for r in address_book.contacts_by_local_part("ivan")], ["Ivan"])
+            self.assertEqual(address_book.email_domains(), {"example.com": 1})
+            self.assertEqual(address_book.find("IVAN").name, "Ivan")
+            self.assertEqual([r.name for r in address_book.search_fuzzy("Ivna")], ["Ivan"])
+
+    def test_migration_from_file_backend(self):
+        """Test that the pickle data file is copied into the new database"""
+        storage.save_data(AddressBook(Record("Ivan")), NoteBook(Note("Plan", "Buy milk")))
+        with storage.init_books_data() as (address_book, note_book):
+            self.assertEqual(list(address_book), ["Ivan"])
+            self.assertEqual(note_book.get_note(1)[1].title, "Plan")
+
+
+if __name__ == '__main__':
+    unittest.main()